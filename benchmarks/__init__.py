@@ -0,0 +1 @@
+"""Benchmarks for the download path of deethon."""
@@ -0,0 +1,348 @@
+"""
+Offline benchmarks for the download path of deethon.
+
+All data is synthetic and the download benchmarks run against the local
+stand-in of Deezer from `deethon.fakeserver`, so no network access is
+required.
+
+Run the benchmarks from the root of the repository and compare the
+results with those of a previous release:
+
+```sh
+python -m benchmarks.run --output results.json
+python -m benchmarks.run --compare results.json
+```
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import deethon
+from deethon import cache, consts, types, utils
+from deethon.client import HTTPClient
+from deethon.fakeserver import FakeDeezer, encrypt, make_flac, make_mp3
+
+MB = 1024 * 1024
+
+SIZES = {
+    "FLAC": 30 * MB,
+    "MP3_320": 8 * MB,
+    "MP3_128": 3 * MB,
+}
+"""Realistic file sizes of a track with a length of about 3.5 minutes."""
+
+COVER_SIZE = 250 * 1024
+"""The size of a 1000x1000 JPEG cover."""
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """Return the best time of `repeat` calls of `func` in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def result(name: str, value: float, unit: str, **extra) -> Dict[str, Any]:
+    return {"name": name, "value": round(value, 3), "unit": unit, **extra}
+
+
+def synthetic_track(server: FakeDeezer, track_id: int) -> types.Track:
+    """Create a track with all tags from the data of the stand-in server."""
+    server.add_album(track_id, [track_id])
+    track = types.Track.from_json(server.tracks[track_id])
+    track._parse_more_tags(server._page_track(track_id))
+    track.lyrics = "Lyrics\n" * 40
+    album = types.Album.from_json(server.albums[track_id])
+    cache.get_cover_cache().memory.put(album.cover_xl_link,
+                                       os.urandom(COVER_SIZE))
+    return track
+
+
+def bench_decrypt(repeat: int, scale: float) -> List[Dict[str, Any]]:
+    results = []
+    for bitrate, size in SIZES.items():
+        size = int(size * scale)
+        data = encrypt(os.urandom(size), 3135556)
+        chunks = [data[i:i + consts.CHUNK_SIZE]
+                  for i in range(0, len(data), consts.CHUNK_SIZE)]
+
+        def run():
+            for _ in utils.decrypt_file(iter(chunks), 3135556):
+                pass
+
+        seconds = measure(run, repeat)
+        results.append(result(f"decrypt_file[{bitrate}]", size / MB / seconds,
+                              "MB/s", bytes=size))
+    return results
+
+
+def bench_stream_url(server: FakeDeezer, repeat: int) -> List[Dict[str, Any]]:
+    track = synthetic_track(server, 1)
+    calls = 10000
+    seconds = measure(
+        lambda: [utils.get_stream_url(track, "9") for _ in range(calls)],
+        repeat)
+    return [result("get_stream_url", calls / seconds, "calls/s")]
+
+
+def bench_file_path(server: FakeDeezer, repeat: int) -> List[Dict[str, Any]]:
+    track = synthetic_track(server, 2)
+    calls = 2000
+    seconds = measure(
+        lambda: [utils.get_file_path(track, ".flac") for _ in range(calls)],
+        repeat)
+    return [result("get_file_path", calls / seconds, "calls/s")]
+
+
+def bench_tag(server: FakeDeezer, repeat: int,
+              scale: float) -> List[Dict[str, Any]]:
+    results = []
+    track = synthetic_track(server, 3)
+    for ext, make, size in ((".mp3", make_mp3, SIZES["MP3_320"]),
+                            (".flac", make_flac, SIZES["FLAC"])):
+        audio = make(int(size * scale))
+        path = Path(f"tag{ext}")
+
+        def run():
+            utils.tag(path, track)
+
+        seconds = 0.0
+        for _ in range(repeat):
+            path.write_bytes(audio)
+            seconds += measure(run, 1)
+        results.append(result(f"tag[{ext[1:]}]", seconds / repeat * 1000,
+                              "ms"))
+    return results
+
+
+class DictBased:
+    """
+    An instance that keeps its attributes in a `__dict__`, the layout of
+    the types before they used `__slots__`. It is the baseline of the
+    memory benchmark.
+    """
+
+    DERIVED = {types.Track: ("link", "replaygain_track_gain"),
+               types.Album: ("link",),
+               types.Playlist: ("link",)}
+    """The attributes that the types derive on access instead of storing."""
+
+    def __init__(self, instance: Any, r: Dict[str, Any]):
+        names = [name for cls in type(instance).__mro__
+                 for name in getattr(cls, "__slots__", ())
+                 if not name.startswith("_") and name != "track_ids"]
+        attributes = {name: getattr(instance, name)
+                      for name in names + list(self.DERIVED[type(instance)])
+                      if hasattr(instance, name)}
+        if "tracks" in r:
+            attributes["basic_tracks_data"] = r["tracks"]["data"]
+        # Copy the values without the interned strings and shared dates,
+        # as if each response was parsed on its own. The attributes are
+        # set one by one, so the instances share the keys of their dicts.
+        for name, value in pickle.loads(pickle.dumps(attributes)).items():
+            setattr(self, name, value)
+
+
+def bench_memory(server: FakeDeezer) -> List[Dict[str, Any]]:
+    """
+    Measure the memory that an instance keeps alive after parsing, and
+    that of a [DictBased][benchmarks.run.DictBased] baseline.
+    """
+    responses = {types.Track: [], types.Album: [], types.Playlist: []}
+    for i in range(10000, 11000):
+        server.add_track(i, 10000 + i % 100, qualities=())
+        responses[types.Track].append(json.dumps(server.tracks[i]))
+    for i in range(10000, 10100):
+        server.add_album(i, [])
+        server.albums[i]["tracks"]["data"] = [
+            {"id": track_id} for track_id in range(i * 20, i * 20 + 12)]
+        responses[types.Album].append(json.dumps(server.albums[i]))
+    for i in range(10000, 10020):
+        server.add_playlist(i, list(range(i * 500, i * 500 + 400)))
+        responses[types.Playlist].append(json.dumps(server.playlists[i]))
+
+    results = []
+    for cls, texts in responses.items():
+        tracemalloc.start()
+        instances = [cls.from_json(json.loads(text)) for text in texts]
+        size = tracemalloc.get_traced_memory()[0] / len(instances)
+        tracemalloc.stop()
+        tracemalloc.start()
+        baseline = [DictBased(instance, json.loads(text))
+                    for instance, text in zip(instances, texts)]
+        baseline_size = tracemalloc.get_traced_memory()[0] / len(baseline)
+        tracemalloc.stop()
+        results.append(result(f"memory[{cls.__name__}]", size, "bytes",
+                              saving=round(1 - size / baseline_size, 3)))
+        results.append(result(f"memory_dict[{cls.__name__}]", baseline_size,
+                              "bytes"))
+    return results
+
+
+def bench_download(server: FakeDeezer, repeat: int,
+                   scale: float) -> List[Dict[str, Any]]:
+    results = []
+    session = deethon.Session("arltoken")
+    for number, (bitrate, size) in enumerate(SIZES.items(), 4):
+        server.add_album(number, [number])
+        quality = utils.get_quality(bitrate)
+        server.audio = {key: value for key, value in server.audio.items()
+                        if key[0] != number or key[1] == quality}
+        make = make_flac if quality == "9" else make_mp3
+        server.audio[(number, quality)] = make(int(size * scale))
+        track = types.Track(number)
+        cache.get_cover_cache().memory.put(track.album.cover_xl_link,
+                                           os.urandom(COVER_SIZE))
+
+        session.download_track(track, bitrate)  # warm up the stand-in server
+        seconds = measure(lambda: session.download_track(track, bitrate),
+                          repeat)
+        results.append(result(f"download_track[{bitrate}]", seconds * 1000,
+                              "ms", bytes=int(size * scale)))
+    return results
+
+
+def bench_download_batch(server: FakeDeezer, repeat: int,
+                         scale: float) -> List[Dict[str, Any]]:
+    """Download a batch of tracks with and without a decrypt process pool."""
+    track_ids = list(range(100, 108))
+    server.add_album(99, track_ids)
+    size = int(SIZES["MP3_320"] * scale)
+    for track_id in track_ids:
+        server.audio = {key: value for key, value in server.audio.items()
+                        if key[0] != track_id or key[1] == "9"}
+        server.audio[(track_id, "9")] = make_flac(size)
+    tracks = [types.Track(track_id) for track_id in track_ids]
+    cache.get_cover_cache().memory.put(tracks[0].album.cover_xl_link,
+                                       os.urandom(COVER_SIZE))
+
+    results = []
+    with ProcessPoolExecutor() as executor:
+        for name, decrypt_executor in (("threads", None),
+                                       ("processes", executor)):
+            session = deethon.Session("arltoken",
+                                      decrypt_executor=decrypt_executor)
+            session.download_tracks(tracks, "FLAC", max_workers=4)
+            seconds = measure(lambda: session.download_tracks(
+                tracks, "FLAC", max_workers=4), repeat)
+            results.append(result(f"download_tracks[{name}]", seconds * 1000,
+                                  "ms", bytes=size * len(tracks)))
+    return results
+
+
+def bench_unreliable(repeat: int, scale: float) -> List[Dict[str, Any]]:
+    """
+    Download an album from a server with latency, a bandwidth limit and
+    random errors, with an increasing number of workers.
+    """
+    size = int(SIZES["MP3_128"] * scale)
+    results = []
+    with FakeDeezer(latency=0.02, bandwidth=4 * MB, error_rate=0.02,
+                    quota_rate=0.02, seed=1) as server, server.install():
+        server.add_album(98, list(range(200, 208)))
+        for track_id in range(200, 208):
+            server.audio[(track_id, "3")] = make_mp3(size)
+        album = types.Album(98)
+        for workers in (1, 4):
+            session = deethon.Session(
+                "arltoken", client=HTTPClient(backoff=0.05))
+            seconds = measure(lambda: session.download_album(
+                album, "MP3_320", max_workers=workers), repeat)
+            results.append(result(f"download_unreliable[{workers}]",
+                                  seconds * 1000, "ms",
+                                  bytes=size * len(album.track_ids)))
+    return results
+
+
+def bench_import(repeat: int) -> List[Dict[str, Any]]:
+    """Measure `import deethon` in a fresh interpreter."""
+    def cumulative_import_time() -> float:
+        err = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              "import deethon"], check=True,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True).stderr
+        # The last line belongs to the top-level import of deethon.
+        return int(err.splitlines()[-1].split("|")[1]) / 1e6
+
+    best = min(cumulative_import_time() for _ in range(max(repeat, 3)))
+    return [result("import", best * 1000, "ms")]
+
+
+def run(repeat: int, scale: float) -> Dict[str, Any]:
+    """Run all benchmarks in a temporary directory."""
+    results = bench_import(repeat)
+    results += bench_decrypt(repeat, scale)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, FakeDeezer() as server, \
+            server.install():
+        os.chdir(tmp)
+        try:
+            results += bench_stream_url(server, repeat)
+            results += bench_file_path(server, repeat)
+            results += bench_tag(server, repeat, scale)
+            results += bench_memory(server)
+            results += bench_download(server, repeat, scale)
+            results += bench_download_batch(server, repeat, scale)
+            results += bench_unreliable(repeat, scale)
+        finally:
+            os.chdir(cwd)
+    return {
+        "deethon": deethon.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "repeat": repeat,
+        "scale": scale,
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change of every result compared to a baseline."""
+    previous = {r["name"]: r for r in baseline["results"]}
+    for r in report["results"]:
+        line = f"{r['name']:<28} {r['value']:>12.3f} {r['unit']:<8}"
+        old = previous.get(r["name"])
+        if old and old["value"]:
+            change = (r["value"] / old["value"] - 1) * 100
+            line += f" {change:+7.1f}% (was {old['value']:.3f})"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", "-o", type=Path,
+                        help="write the results as JSON to this file")
+    parser.add_argument("--compare", "-c", type=Path,
+                        help="compare the results with a previous JSON file")
+    parser.add_argument("--repeat", "-r", type=int, default=3,
+                        help="number of runs per benchmark (default: 3)")
+    parser.add_argument("--scale", "-s", type=float, default=1.0,
+                        help="factor for the size of the synthetic tracks")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.scale)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,24 @@
 wrapper for the Deezer API with some extra features. 🎵
 """
 
-try:
-    from importlib import metadata
-except ImportError:  # for Python<3.8
-    import importlib_metadata as metadata
-
-__version__ = metadata.version(__name__)
-
 from . import types, utils, consts, errors, session
 from .session import Session
 from .types import Album, Track, Playlist
 
+
+def __getattr__(name: str) -> str:
+    # The version is read on first access, because importing the package
+    # metadata is slow.
+    if name == "__version__":
+        try:
+            from importlib import metadata
+        except ImportError:  # for Python<3.8
+            import importlib_metadata as metadata
+        version = metadata.version(__name__)
+        globals()["__version__"] = version
+        return version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = ["Session", "Album", "Track", "errors",
            "utils", "consts", "types", "session"]
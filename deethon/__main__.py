@@ -0,0 +1,4 @@
+"""Run the `deethon` command with `python -m deethon`."""
+from .cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,724 @@
+"""
+This module contains the AsyncSession class, an asyncio-based counterpart
+of the [Session][deethon.session.Session] class.
+
+!!! Info
+    The AsyncSession class requires [aiohttp](https://docs.aiohttp.org),
+    which can be installed with `pip install deethon[async]`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json as _json
+from pathlib import Path
+from typing import (Union, AsyncGenerator, Any, Tuple, Optional, Callable,
+                    Iterable, Dict, List, Awaitable, Sequence)
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is an optional dependency
+    aiohttp = None
+
+from . import errors, consts, metrics, utils, types
+from .cache import LRUCache, get_metadata_cache
+from .manifest import Manifest
+from .ratelimit import is_overloaded, limited_async
+from .session import (TokenManager, _CACHED_METHODS, _BULK_SIZE,
+                      _checked, _has_results, _is_gw_quota_error,
+                      _is_invalid_token, _raise_for_gw_error)
+
+
+class AsyncTokenManager(TokenManager):
+    """
+    Asynchronous version of [TokenManager][deethon.session.TokenManager]
+    whose `fetch` argument is a coroutine function.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[], Awaitable[str]],
+                 lifetime: float = 3600,
+                 margin: float = 300):
+        super().__init__(fetch, lifetime, margin)
+        self._task: Optional[asyncio.Future] = None
+
+    async def get(self) -> str:  # pylint: disable=invalid-overridden-method
+        """
+        Get a valid token and refresh it if required.
+
+        Returns:
+            The CSRF token.
+        """
+        token = self._fresh_token()
+        if token is not None:
+            return token
+        token = self._usable_token()
+        if token is not None:
+            if self._task is None:
+                self._start_refresh().add_done_callback(
+                    lambda task: task.cancelled() or task.exception())
+            return token
+        return await self.refresh()
+
+    async def refresh(self, stale: Optional[str] = None) -> str:  # pylint: disable=invalid-overridden-method
+        """
+        Refresh the token. If it is already being refreshed, wait for
+        the result instead.
+
+        Args:
+            stale: The token that was rejected by the API. If the token
+                was already refreshed since, the new token is returned
+                without another refresh.
+
+        Returns:
+            The new CSRF token.
+        """
+        if stale is not None and self._token != stale and \
+                self._usable_token() is not None:
+            return self._token
+        task = self._task or self._start_refresh()
+        return await asyncio.shield(task)
+
+    def _start_refresh(self) -> asyncio.Future:
+        async def refresh() -> str:
+            try:
+                token = await self._fetch()
+                self._set_token(token)
+                return token
+            finally:
+                self._task = None
+
+        self._task = asyncio.ensure_future(refresh())
+        return self._task
+
+
+class AsyncSession:
+    """
+    An asyncio-based session to connect to Deezer's unofficial API.
+
+    Attributes:
+        token_manager: The [AsyncTokenManager][deethon.aio.AsyncTokenManager]
+            of the CSRF token of this session.
+        availability_cache: The sizes of the available bitrates of each
+            track, by track ID and MD5 origin.
+        manifest: The [Manifest][deethon.manifest.Manifest] of the
+            downloaded tracks or `None`.
+
+    The session should be closed after use, either with
+    [close()][deethon.aio.AsyncSession.close] or by using it as an
+    asynchronous context manager:
+
+    ```python
+    async with AsyncSession(arl_token) as session:
+        await session.download("https://www.deezer.com/track/2104162")
+    ```
+    """
+
+    def __init__(self, arl_token: str, limit: int = 100,
+                 manifest: Optional[Manifest] = None):
+        """
+        Creates a new asynchronous Deezer session instance.
+
+        Args:
+            arl_token: The arl token is used to make API requests
+                on Deezer's unofficial API
+            limit: The maximum number of simultaneous connections.
+            manifest: A [Manifest][deethon.manifest.Manifest]. Tracks
+                that are in the manifest and did not change are not
+                downloaded again.
+
+        Raises:
+            ImportError: aiohttp is not installed.
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncSession requires aiohttp. "
+                              "Install it with `pip install deethon[async]`.")
+        self._arl_token: str = arl_token
+        self._limit = limit
+        self._req: Optional[aiohttp.ClientSession] = None
+        self.token_manager: AsyncTokenManager = \
+            AsyncTokenManager(self._fetch_token)
+        self.availability_cache: LRUCache = LRUCache(maxsize=4096, ttl=3600)
+        self.manifest: Optional[Manifest] = manifest
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the underlying connection pool."""
+        if self._req is not None:
+            await self._req.close()
+            self._req = None
+
+    @property
+    def _client(self) -> aiohttp.ClientSession:
+        # The client session must be created inside the running event loop.
+        if self._req is None:
+            self._req = aiohttp.ClientSession(
+                cookies={"arl": self._arl_token},
+                connector=aiohttp.TCPConnector(limit=self._limit)
+            )
+        return self._req
+
+    async def _fetch_token(self) -> str:
+        user = (await self._post(consts.METHOD_GET_USER, "null"))["results"]
+        if user["USER"]["USER_ID"] == 0:
+            raise errors.DeezerLoginError
+        return user["checkForm"]
+
+    async def get_api(self, method: str, json=None) -> dict:
+        """
+        Make a request to Deezer's unofficial API. The results of
+        `deezer.pageTrack` and `song.getLyrics` requests are stored in the
+        [metadata cache][deethon.cache.MetadataCache] if it is enabled.
+
+        If the API rejects the CSRF token, the token is refreshed and the
+        request is sent once more.
+
+        Args:
+            method: The API method, e.g. `deezer.pageTrack`.
+            json: The JSON body of the request.
+
+        Returns:
+            The `results` of the response.
+        """
+        metadata_cache = get_metadata_cache()
+        if metadata_cache is None or method not in _CACHED_METHODS:
+            return (await self._get_api(method, json))["results"]
+        key = _json.dumps(json, sort_keys=True)
+        results = metadata_cache.get(method, key)
+        if results is None:
+            r = await self._get_api(method, json)
+            results = r["results"]
+            if _has_results(r):
+                metadata_cache.set(method, key, results)
+        return results
+
+    async def _get_api(self, method: str, json=None) -> dict:
+        if method == consts.METHOD_GET_USER:
+            r = await self._post(method, "null", json)
+            _raise_for_gw_error(method, r)
+            return r
+
+        token = await self.token_manager.get()
+        r = await self._post(method, token, json)
+        if _is_invalid_token(r):
+            r = await self._post(method,
+                                 await self.token_manager.refresh(token), json)
+        _raise_for_gw_error(method, r)
+        return r
+
+    async def _post(self, method: str, token: str, json=None) -> dict:
+        params = {
+            "api_version": "1.0",
+            "api_token": token,
+            "input": "3",
+            "method": method,
+        }
+        return await self._fetch_json("gw", "POST", consts.API_URL,
+                                      params=params, json=json)
+
+    async def _fetch_json(self, endpoint: str, method: str, url: str,
+                          **kwargs) -> dict:
+        metrics.count("requests", endpoint=endpoint)
+
+        async def send() -> Tuple[aiohttp.ClientResponse, Optional[dict]]:
+            async with self._client.request(method, url, **kwargs) as resp:
+                if is_overloaded(resp):
+                    return resp, None
+                return resp, await resp.json(content_type=None)
+
+        _, r = await limited_async(
+            endpoint, send,
+            lambda r: is_overloaded(r[0]) or types._is_quota_error(r[1]) or
+            _is_gw_quota_error(r[1]))
+        return r
+
+    async def _get_json(self, kind: str, content_id: int) -> Dict[str, Any]:
+        metadata_cache = get_metadata_cache()
+        if metadata_cache is not None:
+            r = metadata_cache.get(kind, content_id)
+            if r is not None:
+                return r
+        with metrics.timed("metadata", kind=kind):
+            r = await self._fetch_json(
+                "api", "GET", f"{consts.LEGACY_API_URL}{kind}/{content_id}")
+        if metadata_cache is not None and "error" not in r:
+            metadata_cache.set(kind, content_id, r)
+        return r
+
+    async def _get_track_ids(self, kind: str, content_id: int,
+                             first_page: Sequence[int],
+                             total: int) -> List[int]:
+        track_ids = list(first_page)
+        url = f"{consts.LEGACY_API_URL}{kind}/{content_id}/tracks" \
+              f"?index={len(track_ids)}&limit={types._PAGE_SIZE}"
+        while url and len(track_ids) < total:
+            r = await self._fetch_json("api", "GET", url)
+            types._raise_for_error(r)
+            track_ids.extend(x["id"] for x in r["data"])
+            url = r.get("next")
+        return track_ids
+
+    async def _load(self, cls, kind: str, content_id: int):
+        instance = cls.cache.get(content_id)
+        if instance is None:
+            instance = cls.from_json(await self._get_json(kind, content_id))
+        return instance
+
+    async def load_track(self, track_id: int) -> types.Track:
+        """
+        Load a [Track][deethon.types.Track] without blocking the event loop.
+        Cached instances are returned without a request.
+
+        Args:
+            track_id: The Deezer track ID.
+
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
+        """
+        return await self._load(types.Track, "track", track_id)
+
+    async def load_album(self, album_id: int) -> types.Album:
+        """
+        Load an [Album][deethon.types.Album] without blocking the event loop.
+        Cached instances are returned without a request.
+
+        Args:
+            album_id: The Deezer album ID.
+
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
+        """
+        return await self._load(types.Album, "album", album_id)
+
+    async def load_playlist(self, playlist_id: int) -> types.Playlist:
+        """
+        Load a [Playlist][deethon.types.Playlist] without blocking the
+        event loop. Cached instances are returned without a request.
+
+        Args:
+            playlist_id: The Deezer playlist ID.
+
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
+        """
+        return await self._load(types.Playlist, "playlist", playlist_id)
+
+    async def add_more_tags(self, track: types.Track) -> None:
+        """
+        Asynchronous version of
+        [Track.add_more_tags()][deethon.types.Track.add_more_tags].
+
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+        """
+        track._parse_more_tags(await self.get_api(
+            consts.METHOD_PAGE_TRACK, {"sng_id": track.id}
+        ))
+
+    async def add_more_tags_bulk(self,
+                                 tracks: Iterable[types.Track],
+                                 lyrics: bool = True) -> None:
+        """
+        Asynchronous version of
+        [Session.add_more_tags_bulk()][deethon.session.Session.add_more_tags_bulk].
+
+        Args:
+            tracks: The [Track][deethon.types.Track] instances.
+            lyrics: If `true`, the lyrics are requested separately for
+                each track that has lyrics.
+        """
+        tracks = list(tracks)
+        for i in range(0, len(tracks), _BULK_SIZE):
+            batch = tracks[i:i + _BULK_SIZE]
+            data = await self._get_list_data([track.id for track in batch])
+            batch = [track for track in batch if track.id in data]
+            tags = [{"DATA": data[track.id]} for track in batch]
+            if lyrics:
+                with_lyrics = [r for r in tags
+                               if int(r["DATA"].get("LYRICS_ID") or 0)]
+                results = await asyncio.gather(*(
+                    self.get_api(consts.METHOD_GET_LYRICS,
+                                 {"sng_id": int(r["DATA"]["SNG_ID"])})
+                    for r in with_lyrics))
+                for r, result in zip(with_lyrics, results):
+                    r["LYRICS"] = result
+            for track, r in zip(batch, tags):
+                track._parse_more_tags(r, lyrics)
+
+    async def add_lyrics(self, track: types.Track) -> None:
+        """
+        Asynchronous version of
+        [Track.add_lyrics()][deethon.types.Track.add_lyrics].
+
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+        """
+        if track._lyrics_id:
+            track._parse_lyrics(await self.get_api(
+                consts.METHOD_GET_LYRICS, {"sng_id": track.id}))
+
+    async def _get_list_data(self, track_ids: List[int]) -> Dict[int, dict]:
+        metadata_cache = get_metadata_cache()
+        data = {}
+        if metadata_cache is not None:
+            for track_id in track_ids:
+                item = metadata_cache.get(consts.METHOD_GET_LIST_DATA, track_id)
+                if item is not None:
+                    data[track_id] = item
+        missing = [track_id for track_id in track_ids if track_id not in data]
+        if missing:
+            r = await self._get_api(consts.METHOD_GET_LIST_DATA,
+                                    {"sng_ids": missing})
+            for item in r["results"]["data"]:
+                data[int(item["SNG_ID"])] = item
+                if metadata_cache is not None and _has_results(r):
+                    metadata_cache.set(consts.METHOD_GET_LIST_DATA,
+                                       int(item["SNG_ID"]), item)
+        return data
+
+    async def download(self,
+                       url: str,
+                       bitrate: str = "FLAC",
+                       progress_callback: Optional[Callable] = None):
+        """
+        Downloads the given Deezer url if possible.
+
+        Args:
+            url: The URL of the track, album or playlist to download.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            progress_callback: A callable that accepts
+                `current` and `bytes` arguments.
+
+        Raises:
+            ActionNotSupported: The specified URL is not (yet)
+                supported for download.
+            InvalidUrlError: The specified URL is not a valid deezer link.
+        """
+        mode, content_id = utils.parse_url(url)
+
+        if mode == "track":
+            return await self.download_track(
+                await self.load_track(content_id), bitrate, progress_callback)
+        if mode == "album":
+            return await self.download_album(
+                await self.load_album(content_id), bitrate)
+        if mode == "playlist":
+            return await self.download_playlist(
+                await self.load_playlist(content_id), bitrate)
+
+        raise errors.ActionNotSupported(mode)
+
+    async def get_available_bitrates(self,
+                                     track: types.Track,
+                                     bitrate: str = "FLAC") -> Dict[str, int]:
+        """
+        Asynchronous version of
+        [Session.get_available_bitrates()][deethon.session.Session.get_available_bitrates].
+        """
+        if track.md5_origin is None:
+            await self.add_more_tags(track)
+        if bitrate not in consts.BITRATES:
+            bitrate = "MP3_128"
+        bitrates = consts.BITRATES[consts.BITRATES.index(bitrate):]
+        key = (track.id, track.md5_origin)
+        sizes = self.availability_cache.get(key, {})
+        missing = [b for b in bitrates if b not in sizes]
+        if missing:
+            probed = await asyncio.gather(
+                *(self._probe(track, b) for b in missing))
+            sizes = {**sizes, **{b: size for b, size in zip(missing, probed)
+                                 if size is not None}}
+            self.availability_cache.put(key, sizes)
+        return {b: sizes[b] for b in bitrates if sizes.get(b)}
+
+    async def _probe(self, track: types.Track,
+                     bitrate: str) -> Optional[int]:
+        url = utils.get_stream_url(track, utils.get_quality(bitrate))
+        metrics.count("requests", endpoint="cdn")
+        r = await limited_async(
+            "cdn", lambda: self._client.head(url, allow_redirects=True))
+        async with r:
+            if r.status < 400:
+                return int(r.headers.get("Content-Length", 0))
+            return 0 if r.status == 404 else None
+
+    async def stream_track(self,
+                           track: types.Track,
+                           bitrate: str = "FLAC",
+                           tags: bool = True) -> AsyncGenerator[bytes, Any]:
+        """
+        Asynchronous version of
+        [Session.stream_track()][deethon.session.Session.stream_track],
+        without resuming interrupted downloads.
+        """
+        available = await self.get_available_bitrates(track, bitrate)
+        if not available:
+            raise errors.DownloadError(track.id)
+        quality = utils.get_quality(next(iter(available)))
+        download_url = utils.get_stream_url(track, quality)
+        tagger = None
+        if tags:
+            ext = ".flac" if quality == "9" else ".mp3"
+            await asyncio.gather(self.load_album(track.album_id),
+                                 self.add_lyrics(track))
+            header = await asyncio.get_running_loop().run_in_executor(
+                None, utils.get_tag_header, track, ext)
+            tagger = utils.Tagger(header, ext)
+
+        metrics.count("requests", endpoint="cdn")
+        crypt = await limited_async(
+            "cdn", lambda: self._client.get(download_url))
+        async with crypt:
+            if not int(crypt.headers["Content-Length"]):
+                self.availability_cache.invalidate(
+                    (track.id, track.md5_origin))
+                raise errors.DownloadError(track.id)
+            async for data in _decrypt_stream(crypt.content, track.id):
+                if tagger:
+                    data = tagger.update(data)
+                if data:
+                    yield data
+        if tagger:
+            data = tagger.finalize()
+            if data:
+                yield data
+
+    async def download_track(self,
+                             track: types.Track,
+                             bitrate: str = "FLAC",
+                             progress_callback: Optional[Callable] = None
+                             ) -> Path:
+        """
+        Downloads the given [Track][deethon.types.Track] object.
+
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            progress_callback: A callable that accepts
+                `current` and `bytes` arguments.
+
+        Returns:
+            The file path of the downloaded track.
+
+        Raises:
+            DownloadError: The track is not downloadable.
+        """
+        loop = asyncio.get_running_loop()
+        if self.manifest is not None:
+            if track.md5_origin is None:
+                await self.add_more_tags(track)
+            file_path = self.manifest.lookup(track, utils.get_quality(bitrate))
+            if file_path is not None:
+                return file_path
+
+        available, _, _ = await asyncio.gather(
+            self.get_available_bitrates(track, bitrate),
+            self.load_album(track.album_id), self.add_lyrics(track))
+        if not available:
+            raise errors.DownloadError(track.id)
+        quality = utils.get_quality(next(iter(available)))
+        download_url = utils.get_stream_url(track, quality)
+
+        metrics.count("requests", endpoint="cdn")
+        crypt = await limited_async(
+            "cdn", lambda: self._client.get(download_url))
+        async with crypt:
+            total = int(crypt.headers["Content-Length"])
+            if not total:
+                # The track is not available anymore in the probed bitrate.
+                self.availability_cache.invalidate(
+                    (track.id, track.md5_origin))
+                raise errors.DownloadError(track.id)
+            current = 0
+
+            ext = ".flac" if quality == "9" else ".mp3"
+            file_path = await loop.run_in_executor(
+                None, utils.get_file_path, track, ext)
+            header = await loop.run_in_executor(
+                None, utils.get_tag_header, track, ext)
+
+            # Decryption and disk writes run in the executor, so that
+            # they do not block other downloads on the event loop.
+            with file_path.open("w+b") as f:
+                await loop.run_in_executor(None, f.write, header)
+                async for data in _decrypt_stream(crypt.content, track.id):
+                    current += len(data)
+                    await loop.run_in_executor(None, f.write, data)
+                    if progress_callback:
+                        progress_callback(current, total)
+                await loop.run_in_executor(None, utils.complete_tag_header,
+                                           f, ext, len(header))
+
+        if self.manifest is not None:
+            await loop.run_in_executor(None, self.manifest.add, track,
+                                       utils.get_quality(bitrate), file_path)
+
+        return file_path.absolute()
+
+    async def download_album(
+            self,
+            album: types.Album,
+            bitrate: str = None,
+            stream: bool = False,
+            max_workers: Optional[int] = None,
+            prefetch: int = 4
+    ) -> Union[AsyncGenerator[Path, Any], Tuple[Path, ...]]:
+        """
+        Downloads an album from Deezer using the specified Album object.
+
+        Args:
+            album: An [Album][deethon.types.Album] instance.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            stream: If `true`, this method returns an asynchronous
+                generator, otherwise the downloaded files are returned
+                as a tuple that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                See [download_tracks()][deethon.aio.AsyncSession.download_tracks].
+            prefetch: The number of tracks that are loaded at the same time.
+
+        Returns:
+            The file paths.
+        """
+        track_ids = await self._get_track_ids(
+            "album", album.id, album.track_ids, album.total_tracks)
+        tracks = await self._load_tracks(track_ids, prefetch)
+        return await self.download_tracks(tracks, bitrate, stream, max_workers)
+
+    async def download_playlist(
+            self,
+            playlist: types.Playlist,
+            bitrate: str = None,
+            stream: bool = False,
+            max_workers: Optional[int] = None,
+            prefetch: int = 4
+    ) -> Union[AsyncGenerator[Path, Any], Tuple[Path, ...]]:
+        """
+        Downloads a playlist from Deezer using the specified Playlist object.
+
+        Args:
+            playlist: A [Playlist][deethon.types.Playlist] instance.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            stream: If `true`, this method returns an asynchronous
+                generator, otherwise the downloaded files are returned
+                as a tuple that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                See [download_tracks()][deethon.aio.AsyncSession.download_tracks].
+            prefetch: The number of tracks that are loaded at the same time.
+
+        Returns:
+            The file paths.
+        """
+        track_ids = await self._get_track_ids(
+            "playlist", playlist.id, playlist.track_ids,
+            playlist.total_tracks)
+        tracks = await self._load_tracks(track_ids, prefetch)
+        return await self.download_tracks(tracks, bitrate, stream, max_workers)
+
+    async def _load_tracks(
+            self,
+            track_ids: List[int],
+            prefetch: int
+    ) -> List[Union[types.Track, Exception]]:
+        # The exception of a track that cannot be loaded is returned in
+        # its place, like a failed download.
+        semaphore = asyncio.Semaphore(max(prefetch, 1))
+
+        async def load_track(track_id: int) -> types.Track:
+            async with semaphore:
+                return await self.load_track(track_id)
+
+        return await asyncio.gather(*map(load_track, track_ids),
+                                    return_exceptions=True)
+
+    async def download_tracks(
+            self,
+            tracks: Iterable[Union[types.Track, Exception]],
+            bitrate: str = None,
+            stream: bool = False,
+            max_workers: Optional[int] = None
+    ) -> Union[AsyncGenerator[Union[Path, Exception], Any],
+               Tuple[Union[Path, Exception], ...]]:
+        """
+        Asynchronous version of
+        [Session.download_tracks()][deethon.session.Session.download_tracks].
+
+        Args:
+            tracks: The [Track][deethon.types.Track] instances to download.
+                An exception in place of a track is handled like a
+                failed download.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            stream: If `true`, this method returns an asynchronous
+                generator, otherwise the downloaded files are returned
+                as a tuple that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                If it is greater than 1, a track that fails does not
+                stop the other downloads: the raised exception is
+                returned in place of its file path.
+
+        Returns:
+            The file paths in track order. If `stream` is `true` and
+            `max_workers` is greater than 1, the file paths are yielded
+            as soon as each track is finished.
+        """
+        tracks = list(tracks)
+        # The lyrics are requested when a track is downloaded.
+        await self.add_more_tags_bulk(
+            [track for track in tracks if not isinstance(track, Exception)],
+            lyrics=False)
+        if not max_workers or max_workers == 1:
+            paths = self._download_sequentially(tracks, bitrate)
+            if stream:
+                return paths
+            return tuple([path async for path in paths])
+
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def download_track(track: types.Track) -> Path:
+            async with semaphore:
+                return await self.download_track(_checked(track), bitrate)
+
+        tasks = [asyncio.ensure_future(download_track(track))
+                 for track in tracks]
+        if stream:
+            return self._download_concurrently(tasks)
+        return tuple(await asyncio.gather(*tasks, return_exceptions=True))
+
+    async def _download_sequentially(
+            self,
+            tracks: Iterable[Union[types.Track, Exception]],
+            bitrate: str
+    ) -> AsyncGenerator[Path, Any]:
+        for track in tracks:
+            yield await self.download_track(_checked(track), bitrate)
+
+    @staticmethod
+    async def _download_concurrently(
+            tasks: Iterable[asyncio.Future]
+    ) -> AsyncGenerator[Union[Path, Exception], Any]:
+        for task in asyncio.as_completed(tasks):
+            try:
+                yield await task
+            except Exception as e:  # pylint: disable=broad-except
+                yield e
+
+
+async def _decrypt_stream(content: aiohttp.StreamReader,
+                          track_id: int) -> AsyncGenerator[bytes, Any]:
+    loop = asyncio.get_running_loop()
+    decrypter = utils.Decrypter(track_id)
+    async for data in content.iter_chunked(consts.CHUNK_SIZE):
+        data = await loop.run_in_executor(None, decrypter.update, data)
+        if data:
+            yield data
+    data = decrypter.finalize()
+    if data:
+        yield data
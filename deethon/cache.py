@@ -0,0 +1,505 @@
+"""This module contains the caches that are used to avoid redundant requests."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from . import metrics
+from .client import get_client
+
+
+class LRUCache:
+    """
+    A thread-safe least recently used cache with time-based expiry.
+
+    Attributes:
+        maxsize: The maximum number of entries.
+        ttl: The number of seconds after which an entry expires or
+            `None` if the entries never expire.
+        hits: The number of lookups that were served from the cache.
+        misses: The number of lookups that were not served from the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """
+        Create a new, empty cache.
+
+        Args:
+            maxsize: The maximum number of entries.
+            ttl: The number of seconds after which an entry expires or
+                `None` if the entries never expire.
+        """
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the value of an entry.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if there is no valid entry.
+
+        Returns:
+            The cached value or `default`.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Add or replace an entry and evict the least recently used
+        entries if the cache is full.
+
+        Args:
+            key: The key of the entry.
+            value: The value to cache.
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None \
+            else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove an entry if it exists.
+
+        Args:
+            key: The key of the entry.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Get the value of an entry or load it if there is no valid entry.
+
+        If several threads request the same missing entry at the same
+        time, `loader` is only called once and the other threads wait
+        for its result.
+
+        Args:
+            key: The key of the entry.
+            loader: A callable that returns the value to cache.
+
+        Returns:
+            The cached or loaded value.
+        """
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry[1]
+                event = self._loading.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading the entry. If it fails, the
+            # next iteration loads the entry in this thread.
+            event.wait()
+
+        try:
+            value = loader()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+
+class MetadataCache:
+    """
+    A persistent cache for JSON responses of Deezer's APIs that is
+    stored in an SQLite database and can be shared between processes.
+
+    Attributes:
+        ttls: The number of seconds after which an entry expires, by kind
+            of entry, e.g. `track`, `album`, `playlist` or the method
+            name of Deezer's unofficial API.
+        max_size: The maximum size of all entries in bytes. The least
+            recently used entries are evicted if it is exceeded.
+        hits: The number of lookups that were served from the cache.
+        misses: The number of lookups that were not served from the cache.
+    """
+
+    DEFAULT_TTLS: Dict[str, float] = {
+        "track": 7 * 86400,
+        "album": 7 * 86400,
+        "playlist": 3600,
+        "deezer.pageTrack": 86400,
+    }
+    """The default number of seconds after which an entry expires."""
+
+    DEFAULT_TTL: float = 86400
+    """The number of seconds after which an entry of other kinds expires."""
+
+    def __init__(self,
+                 path: Union[str, Path, None] = None,
+                 ttls: Optional[Dict[str, float]] = None,
+                 max_size: int = 256 * 1024 * 1024):
+        """
+        Open or create a metadata cache.
+
+        Args:
+            path: The path of the database file. Defaults to
+                `metadata.sqlite3` in the [cache directory][deethon.cache.get_cache_dir].
+            ttls: The number of seconds after which an entry expires, by
+                kind of entry. Overrides the default TTLs.
+            max_size: The maximum size of all entries in bytes.
+        """
+        if path is None:
+            path = get_cache_dir() / "metadata.sqlite3"
+        self.path: Path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls: Dict[str, float] = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "kind TEXT, key TEXT, value TEXT, size INTEGER, "
+            "expires REAL, accessed REAL, PRIMARY KEY (kind, key))")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS metadata_accessed "
+            "ON metadata (accessed)")
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached response.
+
+        Args:
+            kind: The kind of the entry.
+            key: The key of the entry, e.g. the ID of a track.
+
+        Returns:
+            The decoded JSON response or `None` if there is no valid entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM metadata "
+                "WHERE kind = ? AND key = ? AND expires > ?",
+                (kind, str(key), now)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.count("cache_misses", cache="metadata")
+                return None
+            self.hits += 1
+            metrics.count("cache_hits", cache="metadata")
+            self._db.execute(
+                "UPDATE metadata SET accessed = ? WHERE kind = ? AND key = ?",
+                (now, kind, str(key)))
+        return json.loads(row[0])
+
+    def set(self, kind: str, key: Hashable, value: Any) -> None:
+        """
+        Add or replace a cached response.
+
+        Args:
+            kind: The kind of the entry.
+            key: The key of the entry, e.g. the ID of a track.
+            value: The decoded JSON response.
+        """
+        data = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        expires = now + self.ttls.get(kind, self.DEFAULT_TTL)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, str(key), data, len(data), expires, now))
+            self._writes += 1
+            if self._writes % 64 == 0:
+                self._evict()
+
+    def invalidate(self, kind: Optional[str] = None,
+                   key: Optional[Hashable] = None) -> None:
+        """
+        Remove entries from the cache.
+
+        Args:
+            kind: Only remove entries of this kind.
+            key: Only remove the entry with this key.
+        """
+        query = "DELETE FROM metadata"
+        conditions = []
+        params = []
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if key is not None:
+            conditions.append("key = ?")
+            params.append(str(key))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            self._db.execute(query, params)
+
+    def _evict(self) -> None:
+        self._db.execute("DELETE FROM metadata WHERE expires <= ?",
+                         (time.time(),))
+        size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+        if size <= self.max_size:
+            return
+        excess = size - self.max_size
+        cursor = self._db.execute(
+            "SELECT kind, key, size FROM metadata ORDER BY accessed")
+        evicted = []
+        for kind, key, entry_size in cursor:
+            if excess <= 0:
+                break
+            evicted.append((kind, key))
+            excess -= entry_size
+        self._db.executemany(
+            "DELETE FROM metadata WHERE kind = ? AND key = ?", evicted)
+
+
+class CoverCache:
+    """
+    A cache for cover images with an in-memory layer and an optional
+    on-disk layer that can be shared between processes.
+
+    The files on disk are named after the SHA-1 hash of the cover URL.
+    Deezer's cover URLs contain the hash of the image itself, so a
+    file never has to be revalidated.
+
+    Attributes:
+        directory: The directory of the on-disk layer or `None` if
+            covers are only cached in memory.
+        max_size: The maximum size of all files on disk in bytes. The
+            least recently used files are evicted if it is exceeded.
+        memory: The in-memory layer.
+    """
+
+    def __init__(self,
+                 directory: Union[str, Path, None] = None,
+                 max_size: int = 512 * 1024 * 1024,
+                 max_memory_entries: int = 64):
+        """
+        Create a cover cache.
+
+        Args:
+            directory: The directory of the on-disk layer, e.g.
+                `get_cache_dir() / "covers"`, or `None` to only cache
+                covers in memory.
+            max_size: The maximum size of all files on disk in bytes.
+            max_memory_entries: The maximum number of covers in memory.
+        """
+        self.directory: Optional[Path] = \
+            Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size: int = max_size
+        self.memory: LRUCache = LRUCache(max_memory_entries)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """
+        Get a cover image and download it if it is not cached.
+
+        Args:
+            url: The URL of the cover.
+
+        Returns:
+            The content of the image.
+        """
+        loaded = False
+
+        def load() -> bytes:
+            nonlocal loaded
+            loaded = True
+            return self._load(url)
+
+        data = self.memory.get_or_load(url, load)
+        metrics.count("cache_misses" if loaded else "cache_hits",
+                      cache="cover")
+        return data
+
+    def invalidate(self, url: str) -> None:
+        """
+        Remove a cover from both layers.
+
+        Args:
+            url: The URL of the cover.
+        """
+        self.memory.invalidate(url)
+        if self.directory is not None:
+            try:
+                self._path(url).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _path(self, url: str) -> Path:
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return self.directory / f"{name}.jpg"
+
+    def _load(self, url: str) -> bytes:
+        if self.directory is None:
+            return self._download(url)
+        path = self._path(url)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            pass
+        else:
+            os.utime(path)
+            return data
+        data = self._download(url)
+        tmp = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._writes += 1
+            if self._writes % 16 == 0:
+                self._evict()
+        return data
+
+    @staticmethod
+    def _download(url: str) -> bytes:
+        with metrics.timed("cover"):
+            r = get_client().get(url, "cdn")
+            r.raise_for_status()
+            return r.content
+
+    def _evict(self) -> None:
+        files = []
+        size = 0
+        for path in self.directory.glob("*.jpg"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            size += stat.st_size
+        files.sort()
+        for _, file_size, path in files:
+            if size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+
+def get_cache_dir() -> Path:
+    """
+    Get the directory of the persistent caches. It can be changed with
+    the `DEETHON_CACHE_DIR` environment variable.
+
+    Returns:
+        The cache directory.
+    """
+    if "DEETHON_CACHE_DIR" in os.environ:
+        return Path(os.environ["DEETHON_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "deethon"
+
+
+_metadata_cache: Optional[MetadataCache] = None
+
+
+def get_metadata_cache() -> Optional[MetadataCache]:
+    """
+    Get the metadata cache that is used by the types and sessions.
+
+    Returns:
+        The metadata cache or `None` if it is disabled.
+    """
+    return _metadata_cache
+
+
+def set_metadata_cache(metadata_cache: Optional[MetadataCache]) -> None:
+    """
+    Set the metadata cache that is used by the types and sessions. The
+    metadata cache is disabled by default.
+
+    Args:
+        metadata_cache: A [MetadataCache][deethon.cache.MetadataCache]
+            instance or `None` to disable it.
+    """
+    global _metadata_cache  # pylint: disable=global-statement
+    _metadata_cache = metadata_cache
+
+
+_cover_cache: CoverCache = CoverCache()
+
+
+def get_cover_cache() -> CoverCache:
+    """
+    Get the cover cache that is used by the types and the tagger.
+
+    Returns:
+        The cover cache.
+    """
+    return _cover_cache
+
+
+def set_cover_cache(cover_cache: CoverCache) -> None:
+    """
+    Set the cover cache that is used by the types and the tagger. By
+    default, covers are only cached in memory.
+
+    Args:
+        cover_cache: A [CoverCache][deethon.cache.CoverCache] instance.
+    """
+    global _cover_cache  # pylint: disable=global-statement
+    _cover_cache = cover_cache
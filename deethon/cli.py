@@ -0,0 +1,420 @@
+"""
+This module contains the `deethon` command, which downloads the tracks of
+many track, album and playlist URLs in one job.
+
+```sh
+deethon --arl ARL --input urls.txt --workers 8 \\
+    --journal job.journal --report report.json
+```
+
+The URLs are read from the arguments, from the `--input` files or from
+the standard input, one URL per line. Albums and playlists are expanded
+to their tracks and each track is downloaded only once, also if it is
+part of several URLs.
+
+Every finished track is appended to the journal. If a job with the same
+journal is started again, for example after a crash, the tracks that
+were already downloaded are skipped.
+
+The report is a JSON document with the timing and the result of each
+URL and each track. The command exits with the status 1 if a URL or a
+track failed and with the status 2 if the job could not run, e.g.
+because the arl token is invalid.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import (ThreadPoolExecutor, Future, FIRST_COMPLETED,
+                                wait)
+from pathlib import Path
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    TextIO, Tuple)
+
+import requests
+
+from . import consts, errors, types, utils
+from .manifest import Manifest
+from .session import Session
+
+
+class Journal:
+    """
+    An append-only log of the finished tracks of a job. Each line is a
+    JSON object with the `track_id`, the `status` (`done` or `failed`)
+    and the `path` or `error` of a track.
+
+    Attributes:
+        path: The path of the journal file.
+        done: The last entry of each track that was downloaded, by track ID.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open or create a journal and read the finished tracks.
+
+        Args:
+            path: The path of the journal file.
+        """
+        self.path: Path = Path(path)
+        self.done: Dict[int, Dict[str, Any]] = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a crashed job may be incomplete.
+                        continue
+                    if entry["status"] == "done":
+                        self.done[entry["track_id"]] = entry
+                    else:
+                        self.done.pop(entry["track_id"], None)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Append the entry of a finished track and flush it to disk.
+
+        Args:
+            entry: The entry with at least the `track_id` and `status`.
+        """
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Close the journal file."""
+        self._file.close()
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """
+    Get the URLs of an input file. Empty lines and lines starting with
+    `#` are ignored.
+
+    Args:
+        lines: The lines of the file.
+
+    Returns:
+        The URLs.
+    """
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(line)
+    return urls
+
+
+def expand(url: str) -> List[int]:
+    """
+    Get the IDs of the tracks of a URL.
+
+    Args:
+        url: The URL of a track, album or playlist.
+
+    Returns:
+        The track IDs.
+
+    Raises:
+        ActionNotSupported: The URL is not a track, album or playlist.
+        InvalidUrlError: The URL is not a valid Deezer link.
+    """
+    mode, content_id = utils.parse_url(url)
+    if mode == "track":
+        return [content_id]
+    if mode == "album":
+        content = types.Album(content_id)
+    elif mode == "playlist":
+        content = types.Playlist(content_id)
+    else:
+        raise errors.ActionNotSupported(mode)
+    return list(content.iter_track_ids())
+
+
+class Job:
+    """
+    Downloads the tracks of many URLs with a pool of worker threads and
+    records the result of each track in the journal and the report.
+
+    Attributes:
+        session: The [Session][deethon.session.Session] to download with.
+        bitrate: The preferred bitrate.
+        workers: The number of tracks that are downloaded concurrently.
+        prefetch: The number of tracks that are prepared ahead.
+        journal: The [Journal][deethon.cli.Journal] or `None`.
+    """
+
+    def __init__(self,
+                 session: Session,
+                 bitrate: str = "FLAC",
+                 workers: int = 4,
+                 prefetch: int = 4,
+                 journal: Optional[Journal] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Create a new job.
+
+        Args:
+            session: The [Session][deethon.session.Session] to download with.
+            bitrate: The preferred bitrate
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            workers: The number of tracks that are downloaded concurrently.
+            prefetch: The number of tracks that are prepared ahead.
+            journal: A [Journal][deethon.cli.Journal] of finished tracks.
+            log: A callable that receives a line for each finished track.
+        """
+        self.session: Session = session
+        self.bitrate: str = bitrate
+        self.workers: int = workers
+        self.prefetch: int = prefetch
+        self.journal: Optional[Journal] = journal
+        self._log = log
+        self.started: float = 0.0
+        self.duration: float = 0.0
+        self._items: List[Dict[str, Any]] = []
+        self._tracks: List[Dict[str, Any]] = []
+        self._indexes: Dict[int, int] = {}
+        self._urls: Dict[int, str] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def run(self, urls: List[str]) -> Dict[str, Any]:
+        """
+        Expand the URLs and download all tracks.
+
+        Args:
+            urls: The URLs of tracks, albums and playlists.
+
+        Returns:
+            The report, see [report()][deethon.cli.Job.report].
+        """
+        self.started = time.time()
+        try:
+            track_urls = self._expand(urls)
+            self._total = len(track_urls)
+            done = self.journal.done if self.journal is not None else {}
+            pending = []
+            for track_id, url in track_urls.items():
+                if track_id in done:
+                    self._finish({**done[track_id], "url": url,
+                                  "status": "skipped"}, record=False)
+                else:
+                    pending.append((track_id, url))
+            self._download(pending)
+        finally:
+            self.duration = time.time() - self.started
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Get the report of the job.
+
+        Returns:
+            A dictionary with the `items` (the URLs with their track IDs,
+            duration and error), the `tracks` (with their status, path,
+            duration and error) and a `summary` with the number of URLs
+            and tracks of each status.
+        """
+        with self._lock:
+            tracks = sorted(self._tracks, key=lambda t: t["index"])
+            items = list(self._items)
+        summary = {"urls": len(items),
+                   "failed_urls": sum(1 for i in items if i["error"]),
+                   "tracks": len(tracks)}
+        for status in ("done", "skipped", "failed"):
+            summary[status] = sum(1 for t in tracks if t["status"] == status)
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                     time.gmtime(self.started)),
+            "duration": self.duration,
+            "bitrate": self.bitrate,
+            "workers": self.workers,
+            "summary": summary,
+            "items": items,
+            "tracks": tracks,
+        }
+
+    def _expand(self, urls: List[str]) -> Dict[int, str]:
+        def expand_timed(url: str) -> Dict[str, Any]:
+            start = time.perf_counter()
+            try:
+                track_ids, error = expand(url), None
+            except Exception as e:  # pylint: disable=broad-except
+                track_ids, error = [], str(e)
+            return {"url": url, "track_ids": track_ids, "error": error,
+                    "seconds": time.perf_counter() - start}
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            self._items = list(executor.map(expand_timed, urls))
+        track_urls: Dict[int, str] = {}
+        for item in self._items:
+            for track_id in item["track_ids"]:
+                track_urls.setdefault(track_id, item["url"])
+        self._indexes = {track_id: index
+                         for index, track_id in enumerate(track_urls)}
+        return track_urls
+
+    def _load(self, pending: List[Tuple[int, str]]) -> Iterator[types.Track]:
+        # Load the tracks in order, but a few of them ahead.
+        with ThreadPoolExecutor(max(self.prefetch, 1)) as executor:
+            window = deque()
+            for track_id, url in pending:
+                window.append((track_id, url,
+                               executor.submit(types.Track, track_id)))
+                if len(window) > self.prefetch:
+                    yield from self._loaded(*window.popleft())
+            while window:
+                yield from self._loaded(*window.popleft())
+
+    def _loaded(self, track_id: int, url: str,
+                future: Future) -> Iterator[types.Track]:
+        exception = future.exception()
+        if exception is not None:
+            self._finish({"track_id": track_id, "url": url,
+                          "status": "failed", "seconds": 0.0,
+                          "error": str(exception)})
+            return
+        self._urls[track_id] = url
+        yield future.result()
+
+    def _download(self, pending: List[Tuple[int, str]]) -> None:
+        # The prepared items are in the order of the loaded tracks, so
+        # a track whose tags failed to load is taken from this queue.
+        loaded = deque()
+
+        def load() -> Iterator[types.Track]:
+            for track in self._load(pending):
+                loaded.append(track)
+                yield track
+
+        def download(track: types.Track) -> None:
+            entry = {"track_id": track.id, "url": self._urls[track.id]}
+            start = time.perf_counter()
+            try:
+                path = self.session.download_track(track, self.bitrate)
+            except Exception as e:  # pylint: disable=broad-except
+                entry.update(status="failed", error=str(e))
+            else:
+                entry.update(status="done", path=str(path))
+            entry["seconds"] = time.perf_counter() - start
+            self._finish(entry)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = set()
+            for item in self.session.prepare_tracks(load(), self.bitrate,
+                                                    self.prefetch):
+                track = loaded.popleft()
+                if isinstance(item, Exception):
+                    self._finish({"track_id": track.id,
+                                  "url": self._urls[track.id],
+                                  "status": "failed", "seconds": 0.0,
+                                  "error": str(item)})
+                    continue
+                futures.add(executor.submit(download, track))
+                if len(futures) >= 2 * self.workers:
+                    _, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in futures:
+                future.result()
+
+    def _finish(self, entry: Dict[str, Any], record: bool = True) -> None:
+        if record and self.journal is not None:
+            self.journal.record(entry)
+        with self._lock:
+            entry["index"] = self._indexes[entry["track_id"]]
+            self._tracks.append(entry)
+            finished = len(self._tracks)
+        if self._log:
+            result = entry.get("path") or entry.get("error") or ""
+            self._log(f"[{finished}/{self._total}] {entry['status']} "
+                      f"{entry['track_id']} {result}")
+
+
+def _read_inputs(args: argparse.Namespace, stdin: TextIO) -> List[str]:
+    urls = list(args.urls)
+    for name in args.input or []:
+        if name == "-":
+            urls += read_urls(stdin)
+        else:
+            with open(name, encoding="utf-8") as f:
+                urls += read_urls(f)
+    if not args.urls and not args.input:
+        urls += read_urls(stdin)
+    return urls
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the `deethon` command.
+
+    Args:
+        argv: The command line arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="deethon",
+        description="Download the tracks of many Deezer URLs.")
+    parser.add_argument("urls", nargs="*", metavar="URL",
+                        help="track, album or playlist URLs")
+    parser.add_argument("--input", "-i", action="append", metavar="FILE",
+                        help="read URLs from a file, one per line "
+                             "(- for the standard input)")
+    parser.add_argument("--arl", default=os.environ.get("DEETHON_ARL"),
+                        help="the arl token (default: $DEETHON_ARL)")
+    parser.add_argument("--bitrate", "-b", default="FLAC", choices=consts.BITRATES,
+                        help="the preferred bitrate (default: FLAC)")
+    parser.add_argument("--workers", "-w", type=int, default=4,
+                        help="the number of concurrent downloads "
+                             "(default: 4)")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="the number of tracks that are prepared "
+                             "ahead (default: 4)")
+    parser.add_argument("--journal", "-j", type=Path,
+                        help="record finished tracks and resume a job")
+    parser.add_argument("--report", "-r", type=Path,
+                        help="write a JSON report to this file")
+    parser.add_argument("--manifest", "-m", type=Path,
+                        help="skip tracks that are in this manifest")
+    parser.add_argument("--quiet", "-q", action="store_true",
+                        help="do not print a line for each track")
+    args = parser.parse_args(argv)
+    if not args.arl:
+        parser.error("an arl token is required (--arl or $DEETHON_ARL)")
+
+    manifest = journal = None
+    try:
+        urls = _read_inputs(args, sys.stdin)
+        manifest = Manifest(args.manifest) if args.manifest else None
+        journal = Journal(args.journal) if args.journal else None
+        job = Job(Session(args.arl, manifest=manifest), args.bitrate,
+                  args.workers, args.prefetch, journal,
+                  None if args.quiet else lambda line: print(line,
+                                                              file=sys.stderr))
+        report = job.run(urls)
+    except (errors.DeezerApiError, errors.DeezerLoginError,
+            errors.RateLimitError, requests.RequestException, OSError) as e:
+        # Errors that stop the whole job, e.g. an invalid arl token or
+        # a journal that cannot be written.
+        print(f"deethon: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
+
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    summary = report["summary"]
+    print(f"{summary['done']} downloaded, {summary['skipped']} skipped, "
+          f"{summary['failed']} failed, {summary['failed_urls']} invalid "
+          f"URLs in {report['duration']:.1f}s", file=sys.stderr)
+    return 1 if summary["failed"] or summary["failed_urls"] else 0
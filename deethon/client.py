@@ -0,0 +1,177 @@
+"""
+This module contains the HTTPClient class, the HTTP layer that is shared
+by the types and sessions.
+"""
+import http.cookiejar
+import random
+import time
+from typing import Callable, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import consts, metrics
+from .ratelimit import RateLimiter, get_rate_limiter, is_overloaded
+
+
+class HTTPClient:
+    """
+    A thread-safe HTTP client with keep-alive connection pools, timeouts
+    and retries with exponential backoff and jitter. All requests go
+    through the [rate limiter][deethon.ratelimit.RateLimiter].
+
+    Each host has its own connection pool, including each of the
+    `e-cdns-proxy-0` to `e-cdns-proxy-f` hosts of Deezer's CDN, which
+    get larger pools than the API hosts.
+
+    The client does not store cookies, so it can be shared by sessions
+    with different arl tokens. Cookies are passed with each request.
+
+    Attributes:
+        session: The underlying `requests.Session`.
+        timeout: The connect and read timeouts in seconds.
+        retries: The number of times a request is retried after a
+            connection error or a `500`, `502` or `504` response.
+        backoff: The number of seconds to wait before the first retry.
+        rate_limiter: The rate limiter or `None` to use the
+            [process-wide rate limiter][deethon.ratelimit.get_rate_limiter].
+    """
+
+    RETRY_STATUS = (500, 502, 504)
+    """The status codes of responses that are retried."""
+
+    def __init__(self,
+                 pool_size: int = 32,
+                 cdn_pool_size: int = 64,
+                 timeout: Union[float, Tuple[float, float]] = (10, 60),
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """
+        Create a new HTTP client.
+
+        Args:
+            pool_size: The maximum number of connections per API host.
+            cdn_pool_size: The maximum number of connections per CDN host.
+            timeout: The connect and read timeouts in seconds.
+            retries: The number of times a request is retried.
+            backoff: The number of seconds to wait before the first retry.
+            rate_limiter: A [RateLimiter][deethon.ratelimit.RateLimiter].
+                Defaults to the process-wide rate limiter.
+        """
+        self.timeout: Union[float, Tuple[float, float]] = timeout
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.rate_limiter: Optional[RateLimiter] = rate_limiter
+        self.session: requests.Session = requests.Session()
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(
+            allowed_domains=[]))
+        # 16 CDN hosts and the API hosts.
+        api_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size)
+        cdn_adapter = HTTPAdapter(pool_connections=32,
+                                  pool_maxsize=cdn_pool_size)
+        self.session.mount("https://", api_adapter)
+        self.session.mount("http://", api_adapter)
+        self.session.mount(consts.CDN_URL.split("{}")[0], cdn_adapter)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+    def request(self,
+                method: str,
+                url: str,
+                endpoint: str,
+                overloaded: Callable[[requests.Response], bool] = is_overloaded,
+                **kwargs) -> requests.Response:
+        """
+        Send a request.
+
+        Args:
+            method: The HTTP method.
+            url: The URL.
+            endpoint: The endpoint class for the rate limiter
+                (`api`, `gw` or `cdn`).
+            overloaded: A callable that checks if a response was rejected
+                because the server is overloaded.
+            **kwargs: The arguments of `requests.Session.request`.
+
+        Returns:
+            The response.
+
+        Raises:
+            RateLimitError: The server was still overloaded after all retries.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        metrics.count("requests", endpoint=endpoint)
+        rate_limiter = self.rate_limiter or get_rate_limiter()
+
+        def send() -> requests.Response:
+            return self._send(method, url, **kwargs)
+
+        # The backoff happens outside of the rate limiter, so that a
+        # request does not hold a concurrency slot while it waits.
+        attempt = 0
+        while True:
+            try:
+                if rate_limiter is None:
+                    r = send()
+                else:
+                    r = rate_limiter.call(endpoint, send, overloaded,
+                                          kwargs.get("stream", False))
+                if r.status_code not in self.RETRY_STATUS or \
+                        attempt >= self.retries:
+                    return r
+                r.close()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+            metrics.count("retries", reason="error")
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, endpoint: str = "api",
+            **kwargs) -> requests.Response:
+        """Send a `GET` request, see [request()][deethon.client.HTTPClient.request]."""
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str = "gw",
+             **kwargs) -> requests.Response:
+        """Send a `POST` request, see [request()][deethon.client.HTTPClient.request]."""
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def head(self, url: str, endpoint: str = "cdn",
+             **kwargs) -> requests.Response:
+        """Send a `HEAD` request, see [request()][deethon.client.HTTPClient.request]."""
+        return self.request("HEAD", url, endpoint, **kwargs)
+
+
+_client: Optional[HTTPClient] = None
+
+
+def get_client() -> HTTPClient:
+    """
+    Get the HTTP client that is used by the types and sessions. It is
+    created on first use.
+
+    Returns:
+        The HTTP client.
+    """
+    global _client  # pylint: disable=global-statement
+    if _client is None:
+        _client = HTTPClient()
+    return _client
+
+
+def set_client(client: HTTPClient) -> None:
+    """
+    Set the HTTP client that is used by the types and sessions.
+
+    Args:
+        client: An [HTTPClient][deethon.client.HTTPClient] instance.
+    """
+    global _client  # pylint: disable=global-statement
+    _client = client
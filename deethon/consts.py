@@ -8,6 +8,9 @@
 API_URL: str = "http://www.deezer.com/ajax/gw-light.php"
 """The url of Deezer's unofficial API server."""
 
+BITRATES: tuple = ("FLAC", "MP3_320", "MP3_256", "MP3_128")
+"""The bitrates of Deezer's tracks, from the best to the worst."""
+
 METHOD_GET_USER: str = "deezer.getUserData"
 """The `deezer.getUserData` method for the Deezer API request."""
 
@@ -19,3 +22,12 @@
 
 METHOD_PAGE_TRACK: str = "deezer.pageTrack"
 """The `deezer.pageTrack` method for the Deezer API request."""
+
+METHOD_GET_LIST_DATA: str = "song.getListData"
+"""The `song.getListData` method for the Deezer API request."""
+
+CDN_URL: str = "https://e-cdns-proxy-{}.dzcdn.net/mobile/1/"
+"""The url template of Deezer's CDN servers for encrypted tracks."""
+
+CHUNK_SIZE: int = 6144 * 32
+"""The size of the chunks in which encrypted tracks are read from the CDN."""
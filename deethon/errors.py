@@ -18,6 +18,18 @@ def __init__(self, error: str, message: str, code: int):
         super().__init__(f"Error {code}: {error} - {message}")
 
 
+class DeezerGatewayError(DeezerApiError):
+    """Occurs when a request to Deezer's unofficial API replies with an error."""
+
+    def __init__(self, method: str, error: str, message: str):
+        # pylint: disable=super-init-not-called
+        self.method: str = method
+        self.error: str = error
+        self.code: int = 0
+        self.message: str = message
+        Exception.__init__(self, f"{method}: {error} - {message}")
+
+
 class InvalidUrlError(Exception):
     """Occurs when an invalid URL is passed."""
 
@@ -40,3 +52,12 @@ class DownloadError(Exception):
     def __init__(self, track_id: int):
         self.track_id: int = track_id
         super().__init__(f"Track {self.track_id} is not downloadable.")
+
+
+class RateLimitError(Exception):
+    """Occurs when Deezer still rejects requests after all retries because
+    of the rate limit."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint: str = endpoint
+        super().__init__(f"Rate limit of {self.endpoint} requests exceeded.")
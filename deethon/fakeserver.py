@@ -0,0 +1,661 @@
+"""
+This module contains a local stand-in for Deezer's official API, the
+unofficial API (`gw-light.php`) and the CDN, which serves tracks that are
+encrypted like Deezer's. It is used by the tests and the benchmarks and
+can be used to load-test applications without network access.
+
+The server can add latency, limit the bandwidth and answer with random
+server and quota errors:
+
+```python
+with FakeDeezer(latency=0.05, bandwidth=2 * 1024 * 1024,
+                error_rate=0.01, quota_rate=0.05, seed=1) as server:
+    server.add_album(1, [1, 2, 3])
+    with server.install():
+        deethon.Session("arl").download_album(deethon.Album(1))
+```
+
+The [Recorder][deethon.fakeserver.Recorder] captures real responses of
+Deezer's APIs, which the server replays with synthetic audio data:
+
+```python
+recorder = Recorder()
+deethon.client.set_client(recorder)
+deethon.Session(arl).download_album(deethon.Album(302127))
+recorder.save("deezer.json")
+
+with FakeDeezer() as server:
+    server.load_recording("deezer.json")
+```
+
+The server also runs on its own with `python -m deethon.fakeserver`.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from binascii import a2b_hex
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterator, Tuple, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from Crypto.Cipher import AES, Blowfish
+
+from . import consts, utils
+from .client import HTTPClient
+
+
+def encrypt(data: bytes, track_id: int) -> bytes:
+    """Encrypt a track in the same way as Deezer's CDN does."""
+    key = utils.get_blowfish_key(track_id)
+    out = bytearray()
+    for seg, i in enumerate(range(0, len(data), 2048)):
+        chunk = data[i:i + 2048]
+        if seg % 3 == 0 and len(chunk) == 2048:
+            chunk = Blowfish.new(key, Blowfish.MODE_CBC,
+                                 a2b_hex("0001020304050607")).encrypt(chunk)
+        out += chunk
+    return bytes(out)
+
+
+def make_flac(size: int) -> bytes:
+    """Create the content of a minimal FLAC file with `size` bytes."""
+    streaminfo = bytes([0x10, 0x00, 0x10, 0x00]) + bytes(6) + \
+        bytes([0x0a, 0xc4, 0x42, 0xf0]) + bytes(4) + bytes(16)
+    header = b"fLaC" + bytes([0x80, 0x00, 0x00, len(streaminfo)]) + streaminfo
+    return header + make_mp3(size - len(header))
+
+
+def make_mp3(size: int) -> bytes:
+    """Create the content of a fake MP3 file with `size` bytes."""
+    return (bytes(range(241)) * (size // 241 + 1))[:size]
+
+
+_BLOCK_SIZE = 16 * 1024
+
+_QUALITIES = ("9", "3", "5", "1")
+
+# The hosts of Deezer's official API and image CDN in recorded responses.
+_API_HOST = re.compile(r"https?://api\.deezer\.com/")
+_IMAGE_HOST = re.compile(r"https?://(?:e-)?cdns?-images\.dzcdn\.net/images/")
+
+
+class FakeDeezer:
+    """
+    A threaded HTTP server that imitates Deezer.
+
+    The content is added with [add_album()][deethon.fakeserver.FakeDeezer.add_album],
+    [add_playlist()][deethon.fakeserver.FakeDeezer.add_playlist],
+    [add_track()][deethon.fakeserver.FakeDeezer.add_track] or
+    [load_recording()][deethon.fakeserver.FakeDeezer.load_recording].
+    All attributes can be changed while the server is running.
+
+    Attributes:
+        url: The base URL of the server.
+        arl_tokens: The valid arl tokens or `None` to accept all tokens.
+        requests: The paths of all requests and the methods of the
+            requests to the unofficial API, in the order of arrival.
+        latency: The number of seconds each response is delayed.
+        bandwidth: The maximum number of bytes per second that are sent
+            to a connection or `None` for no limit.
+        error_rate: The probability of a `500` response.
+        quota_rate: The probability of a quota error of the official API.
+        drops: The number of bytes after which the next CDN responses
+            are cut off.
+        short_ranges: The number of bytes of the next ranged CDN
+            responses, which end early with a matching `Content-Range`.
+        quota_errors: The number of following requests to the official
+            API that fail with a quota error.
+        gw_quota_errors: The number of following requests to the
+            unofficial API that fail with a quota error.
+        too_many_requests: The number of following requests that fail
+            with a `429` response.
+        server_errors: The number of following requests that fail with a
+            `500` response.
+        page_size: The number of tracks that are embedded in an album or
+            playlist, the rest is only available from the paginated
+            track list.
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 bandwidth: Optional[float] = None,
+                 error_rate: float = 0.0,
+                 quota_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Create a new server. It is started with the `with` statement.
+
+        Args:
+            host: The address to bind to.
+            port: The port to bind to, by default a free port.
+            latency: The number of seconds each response is delayed.
+            bandwidth: The maximum number of bytes per second per
+                connection.
+            error_rate: The probability of a `500` response.
+            quota_rate: The probability of a quota error of the
+                official API.
+            seed: The seed of the random errors.
+        """
+        self.tracks: Dict[int, Dict[str, Any]] = {}
+        self.albums: Dict[int, Dict[str, Any]] = {}
+        self.playlists: Dict[int, Dict[str, Any]] = {}
+        self.audio: Dict[Tuple[int, str], bytes] = {}
+        self.requests: List[str] = []
+        self.ranges: List[str] = []
+        self.drops: List[int] = []
+        self.short_ranges: List[int] = []
+        self.quota_errors = 0
+        self.gw_quota_errors = 0
+        self.too_many_requests = 0
+        self.server_errors = 0
+        self.cookies: List[str] = []
+        self.arl_tokens: Optional[List[str]] = None
+        self.token_version = 0
+        self.page_size = 400
+        self.latency: float = latency
+        self.bandwidth: Optional[float] = bandwidth
+        self.error_rate: float = error_rate
+        self.quota_rate: float = quota_rate
+        self.recording: Dict[str, Dict[str, Any]] = {"api": {}, "gw": {}}
+        self._random = random.Random(seed)
+        self._encrypted: Dict[Tuple[int, str], Tuple[bytes, bytes]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self.url = f"http://{host}:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def consts(self) -> Dict[str, str]:
+        """The values of the url constants that point to this server."""
+        return {
+            "LEGACY_API_URL": self.url + "/",
+            "API_URL": self.url + "/ajax/gw-light.php",
+            "CDN_URL": self.url + "/cdn/{}/",
+        }
+
+    def patch(self, monkeypatch) -> None:
+        """Point deethon to this server instead of Deezer in a test."""
+        for name, value in self.consts.items():
+            monkeypatch.setattr(consts, name, value)
+
+    @contextmanager
+    def install(self) -> Iterator["FakeDeezer"]:
+        """
+        Point deethon to this server instead of Deezer in the `with` block.
+
+        ```python
+        with server.install():
+            track = deethon.Track(1)
+        ```
+        """
+        original = {name: getattr(consts, name) for name in self.consts}
+        for name, value in self.consts.items():
+            setattr(consts, name, value)
+        try:
+            yield self
+        finally:
+            for name, value in original.items():
+                setattr(consts, name, value)
+
+    def load_recording(self, path: str, audio_size: int = 1024 * 1024) -> None:
+        """
+        Replay the responses that were saved by a
+        [Recorder][deethon.fakeserver.Recorder]. The links to Deezer's
+        API and covers in the responses point to this server, and the
+        recorded tracks are streamed with synthetic audio data.
+
+        Args:
+            path: The path of the recording.
+            audio_size: The size of the synthetic audio data of each track.
+        """
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        text = _API_HOST.sub(lambda m: self.url + "/", text)
+        text = _IMAGE_HOST.sub(lambda m: self.url + "/cover/", text)
+        recording = json.loads(text)
+        self.recording["api"].update(recording["api"])
+        self.recording["gw"].update(recording["gw"])
+
+        audio = {quality: (make_flac if quality == "9" else make_mp3)(
+            audio_size) for quality in _QUALITIES}
+        for key in recording["api"]:
+            kind, _, track_id = key.partition("/")
+            if kind == "track" and track_id.isdigit():
+                for quality, data in audio.items():
+                    self.audio.setdefault((int(track_id), quality), data)
+
+    def add_album(self, album_id: int, track_ids: List[int]) -> None:
+        """Add an album and its tracks with audio data in all qualities."""
+        self.albums[album_id] = {
+            "id": album_id,
+            "artist": {"name": "Artist"},
+            "tracks": {"data": [{"id": i} for i in track_ids]},
+            "cover_small": f"{self.url}/cover/{album_id}/small.jpg",
+            "cover_medium": f"{self.url}/cover/{album_id}/medium.jpg",
+            "cover_big": f"{self.url}/cover/{album_id}/big.jpg",
+            "cover_xl": f"{self.url}/cover/{album_id}/xl.jpg",
+            "duration": 60 * len(track_ids),
+            "genres": {"data": [{"name": "Pop"}]},
+            "label": "Label",
+            "link": f"https://www.deezer.com/album/{album_id}",
+            "record_type": "album",
+            "release_date": "2020-01-01",
+            "title": f"Album {album_id}",
+            "nb_tracks": len(track_ids),
+            "upc": "0000000000000",
+        }
+        for number, track_id in enumerate(track_ids, 1):
+            self.add_track(track_id, album_id, number)
+
+    def add_playlist(self, playlist_id: int, track_ids: List[int]) -> None:
+        """Add a playlist of tracks that were added before."""
+        self.playlists[playlist_id] = {
+            "id": playlist_id,
+            "title": f"Playlist {playlist_id}",
+            "tracks": {"data": [{"id": i} for i in track_ids]},
+            "description": "",
+            "duration": 60 * len(track_ids),
+            "public": True,
+            "is_loved_track": False,
+            "collaborative": False,
+            "nb_tracks": len(track_ids),
+            "link": f"https://www.deezer.com/playlist/{playlist_id}",
+            "share": "",
+            "picture": "",
+            "picture_small": f"{self.url}/cover/p{playlist_id}/small.jpg",
+            "picture_medium": f"{self.url}/cover/p{playlist_id}/medium.jpg",
+            "picture_big": f"{self.url}/cover/p{playlist_id}/big.jpg",
+            "picture_xl": f"{self.url}/cover/p{playlist_id}/xl.jpg",
+            "checksum": "",
+        }
+
+    def add_track(self, track_id: int, album_id: int, number: int = 1,
+                  qualities: Tuple[str, ...] = _QUALITIES,
+                  size: int = 50000) -> None:
+        """Add a track with about `size` bytes of audio data per quality."""
+        self.tracks[track_id] = {
+            "id": track_id,
+            "album": {"id": album_id},
+            "artist": {"name": "Artist"},
+            "contributors": [{"name": "Artist"}],
+            "bpm": 120,
+            "disk_number": 1,
+            "duration": 60,
+            "isrc": "XX0000000000",
+            "link": f"https://www.deezer.com/track/{track_id}",
+            "track_position": number,
+            "preview": "",
+            "rank": 0,
+            "gain": -8.0,
+            "release_date": "2020-01-01",
+            "title": f"Track {track_id}",
+            "title_short": f"Track {track_id}",
+        }
+        for quality in qualities:
+            make = make_flac if quality == "9" else make_mp3
+            self.audio[(track_id, quality)] = make(size + track_id % 1000)
+
+    def _random_error(self, rate: float) -> bool:
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _page_track(self, track_id: int) -> Dict[str, Any]:
+        return {"DATA": {
+            "MD5_ORIGIN": f"{track_id:032x}"[::-1],
+            "MEDIA_VERSION": "1",
+            "SNG_CONTRIBUTORS": {"composer": ["Composer"]},
+            "COPYRIGHT": "(C) Label",
+        }}
+
+    def _list_data(self, track_ids: List[int]) -> Dict[str, Any]:
+        data = []
+        for track_id in track_ids:
+            item = self._page_track(int(track_id))["DATA"]
+            item["SNG_ID"] = str(track_id)
+            item["LYRICS_ID"] = track_id % 2
+            data.append(item)
+        return {"data": data, "count": len(data), "errors": []}
+
+    def _content(self, store: Dict[int, Dict[str, Any]],
+                 content_id: int) -> Dict[str, Any]:
+        data = dict(store[content_id])
+        data["tracks"] = {"data": data["tracks"]["data"][:self.page_size]}
+        return data
+
+    def _track_page(self, kind: str, content_id: int,
+                    query: Dict[str, List[str]]) -> Dict[str, Any]:
+        tracks = self.albums.get(content_id) if kind == "album" \
+            else self.playlists.get(content_id)
+        tracks = tracks["tracks"]["data"]
+        index = int(query.get("index", ["0"])[0])
+        limit = int(query.get("limit", ["25"])[0])
+        page = {"data": tracks[index:index + limit], "total": len(tracks)}
+        if index + limit < len(tracks):
+            page["next"] = f"{self.url}/{kind}/{content_id}/tracks" \
+                           f"?index={index + limit}&limit={limit}"
+        return page
+
+    def _cdn(self, path: str) -> bytes:
+        hashs = path.rsplit("/", 1)[-1]
+        data = AES.new(b"jo6aey6haid2Teih", AES.MODE_ECB).decrypt(
+            a2b_hex(hashs))
+        _, _, quality, track_id, _ = data.split(b"\xa4")[:5]
+        key = (int(track_id), quality.decode())
+        plain = self.audio.get(key, b"")
+        if key not in self._encrypted or self._encrypted[key][0] is not plain:
+            self._encrypted[key] = (plain, encrypt(plain, int(track_id)))
+        return self._encrypted[key][1]
+
+    def _handler(self):
+        deezer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _write(self, data: bytes) -> None:
+                if not deezer.bandwidth:
+                    self.wfile.write(data)
+                    return
+                for i in range(0, len(data), _BLOCK_SIZE):
+                    block = data[i:i + _BLOCK_SIZE]
+                    time.sleep(len(block) / deezer.bandwidth)
+                    self.wfile.write(block)
+
+            def _send(self, body: bytes, content_type: str,
+                      headers: Dict[str, str] = None) -> None:
+                self.send_response(200)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self._write(body)
+
+            def _send_stream(self, body: bytes) -> None:
+                start, end = 0, len(body)
+                ranges = self.headers.get("Range")
+                deezer.ranges.append(ranges)
+                if ranges and body:
+                    first, _, last = ranges[len("bytes="):].partition("-")
+                    start = int(first)
+                    if last:
+                        end = min(int(last) + 1, end)
+                    if deezer.short_ranges:
+                        end = min(start + deezer.short_ranges.pop(0), end)
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range",
+                                     f"bytes {start}-{end - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start))
+                self.end_headers()
+                if deezer.drops:
+                    # Simulate a dropped connection.
+                    self._write(body[start:min(start + deezer.drops.pop(0),
+                                               end)])
+                    self.close_connection = True
+                    return
+                self._write(body[start:end])
+
+            def _send_json(self, data: Any,
+                           headers: Dict[str, str] = None) -> None:
+                self._send(json.dumps(data).encode(), "application/json",
+                           headers)
+
+            def _fail(self) -> bool:
+                if deezer.latency:
+                    time.sleep(deezer.latency)
+                with deezer._lock:
+                    if deezer.too_many_requests:
+                        deezer.too_many_requests -= 1
+                        status = 429
+                    elif deezer.server_errors:
+                        deezer.server_errors -= 1
+                        status = 500
+                    else:
+                        status = None
+                if status is None:
+                    if not deezer._random_error(deezer.error_rate):
+                        return False
+                    status = 500
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                deezer.requests.append(url.path)
+                if self._fail():
+                    return None
+                kind, _, rest = url.path.strip("/").partition("/")
+                if kind == "cdn":
+                    return self._send_stream(deezer._cdn(url.path))
+                if kind == "cover":
+                    return self._send(b"\xff\xd8\xff\xe0" + bytes(100),
+                                      "image/jpeg")
+                with deezer._lock:
+                    quota_error = deezer.quota_errors > 0
+                    deezer.quota_errors -= quota_error
+                if quota_error or deezer._random_error(deezer.quota_rate):
+                    return self._send_json({"error": {
+                        "type": "Exception", "code": 4,
+                        "message": "Quota limit exceeded"}})
+                key = url.path.lstrip("/") + (f"?{url.query}" if url.query
+                                              else "")
+                if key in deezer.recording["api"]:
+                    return self._send_json(deezer.recording["api"][key])
+                store = {"track": deezer.tracks, "album": deezer.albums,
+                         "playlist": deezer.playlists}.get(kind, {})
+                content_id, _, sub = rest.partition("/")
+                data = None
+                if content_id.isdigit() and int(content_id) in store:
+                    if sub == "tracks" and kind != "track":
+                        data = deezer._track_page(kind, int(content_id),
+                                                  parse_qs(url.query))
+                    elif not sub:
+                        data = deezer._content(store, int(content_id)) \
+                            if kind != "track" else store[int(content_id)]
+                if data is None:
+                    data = {"error": {"type": "DataException",
+                                      "message": "no data", "code": 800}}
+                return self._send_json(data)
+
+            def do_HEAD(self):
+                url = urlparse(self.path)
+                deezer.requests.append("HEAD " + url.path)
+                if deezer.latency:
+                    time.sleep(deezer.latency)
+                body = deezer._cdn(url.path) if url.path.startswith("/cdn/") \
+                    else b""
+                self.send_response(200 if body else 404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                method = parse_qs(url.query)["method"][0]
+                deezer.requests.append(method)
+                deezer.cookies.append(self.headers.get("Cookie"))
+                if self._fail():
+                    return None
+                with deezer._lock:
+                    quota_error = deezer.gw_quota_errors > 0
+                    deezer.gw_quota_errors -= quota_error
+                if quota_error:
+                    return self._send_json({
+                        "error": {"QUOTA_ERROR": "Quota limit exceeded"},
+                        "results": {}})
+                if method == consts.METHOD_GET_USER:
+                    cookies = SimpleCookie(self.headers.get("Cookie") or "")
+                    if deezer.arl_tokens is not None and (
+                            "arl" not in cookies or
+                            cookies["arl"].value not in deezer.arl_tokens):
+                        return self._send_json({"results": {
+                            "USER": {"USER_ID": 0}, "checkForm": ""}})
+                    deezer.token_version += 1
+                    return self._send_json(
+                        {"results": {
+                            "USER": {"USER_ID": 1},
+                            "checkForm": f"token{deezer.token_version}"}},
+                        {"Set-Cookie": f"sid={deezer.token_version}; Path=/"})
+                token = parse_qs(url.query)["api_token"][0]
+                if token != f"token{deezer.token_version}":
+                    return self._send_json({
+                        "error": {"VALID_TOKEN_REQUIRED": "Invalid CSRF token"},
+                        "results": {}})
+                key = f"{method} {json.dumps(body, sort_keys=True)}"
+                if key in deezer.recording["gw"]:
+                    return self._send_json(deezer.recording["gw"][key])
+                if method == consts.METHOD_PAGE_TRACK:
+                    return self._send_json(
+                        {"results": deezer._page_track(int(body["sng_id"]))})
+                if method == consts.METHOD_GET_LIST_DATA:
+                    return self._send_json(
+                        {"results": deezer._list_data(body["sng_ids"])})
+                if method == consts.METHOD_GET_LYRICS:
+                    return self._send_json({"results": {
+                        "LYRICS_TEXT": "Lyrics", "LYRICS_WRITERS": "Writer"}})
+                return self._send_json({"error": {}, "results": {}})
+
+        return Handler
+
+
+class Recorder(HTTPClient):
+    """
+    An [HTTPClient][deethon.client.HTTPClient] that records the
+    successful responses of Deezer's official and unofficial APIs, so
+    that a [FakeDeezer][deethon.fakeserver.FakeDeezer] server can replay
+    them. The responses of `deezer.getUserData`, which contain the data
+    of the account, and the audio data and covers are not recorded.
+
+    Attributes:
+        recording: The recorded responses of the official API by path and
+            of the unofficial API by method and request body.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Create a new recorder. The arguments are those of
+        [HTTPClient][deethon.client.HTTPClient].
+        """
+        super().__init__(*args, **kwargs)
+        self.recording: Dict[str, Dict[str, Any]] = {"api": {}, "gw": {}}
+        self._lock = threading.Lock()
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        r = super()._send(method, url, **kwargs)
+        if r.status_code != 200:
+            return r
+        if url == consts.API_URL:
+            gw_method = kwargs["params"]["method"]
+            data = r.json()
+            if gw_method != consts.METHOD_GET_USER and not data.get("error"):
+                key = f"{gw_method} " \
+                      f"{json.dumps(kwargs.get('json'), sort_keys=True)}"
+                with self._lock:
+                    self.recording["gw"][key] = data
+        elif url.startswith(consts.LEGACY_API_URL):
+            data = r.json()
+            if "error" not in data:
+                with self._lock:
+                    self.recording["api"][
+                        r.url[len(consts.LEGACY_API_URL):]] = data
+        return r
+
+    def save(self, path: str) -> None:
+        """
+        Save the recorded responses as JSON.
+
+        Args:
+            path: The path of the file.
+        """
+        with self._lock:
+            text = json.dumps(self.recording, indent=2, sort_keys=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the server until it is interrupted.
+
+    Args:
+        argv: The command line arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m deethon.fakeserver",
+        description="Run a local stand-in for Deezer.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="the address to bind to (default: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8000,
+                        help="the port to bind to (default: 8000)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="the delay of each response in seconds")
+    parser.add_argument("--bandwidth", type=float,
+                        help="the bytes per second per connection")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="the probability of a 500 response")
+    parser.add_argument("--quota-rate", type=float, default=0.0,
+                        help="the probability of a quota error")
+    parser.add_argument("--seed", type=int,
+                        help="the seed of the random errors")
+    parser.add_argument("--albums", type=int, default=0,
+                        help="the number of synthetic albums with 10 tracks "
+                             "each, with the IDs 1 to N")
+    parser.add_argument("--replay", action="append", default=[],
+                        metavar="FILE", help="replay a recording")
+    args = parser.parse_args(argv)
+
+    with FakeDeezer(args.host, args.port, args.latency, args.bandwidth,
+                    args.error_rate, args.quota_rate, args.seed) as server:
+        for album_id in range(1, args.albums + 1):
+            server.add_album(album_id, list(range(album_id * 100,
+                                                  album_id * 100 + 10)))
+        for path in args.replay:
+            server.load_recording(path)
+        for name, value in server.consts.items():
+            print(f"deethon.consts.{name} = {value!r}", flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
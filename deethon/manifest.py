@@ -0,0 +1,194 @@
+"""
+This module contains the Manifest class, an index of downloaded tracks
+that allows repeated downloads to skip tracks that did not change.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+from .cache import get_cache_dir
+from .types import Track
+
+
+class ManifestEntry(NamedTuple):
+    """A downloaded track in the [Manifest][deethon.manifest.Manifest]."""
+
+    track_id: int
+    quality: str
+    md5_origin: str
+    media_version: str
+    path: Path
+    size: int
+    mtime: float
+    checksum: str
+
+
+class Manifest:
+    """
+    An index of downloaded tracks that is stored in an SQLite database.
+
+    An entry is keyed by the track ID and the requested quality and is
+    only valid as long as the `md5_origin` and `media_version` of the
+    track are unchanged and the file still has the recorded size and
+    modification time, so checking a track does not require any
+    request to Deezer's CDN.
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        """
+        Open or create a manifest.
+
+        Args:
+            path: The path of the database file. Defaults to
+                `manifest.sqlite3` in the [cache directory][deethon.cache.get_cache_dir].
+        """
+        if path is None:
+            path = get_cache_dir() / "manifest.sqlite3"
+        self.path: Path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "track_id INTEGER, quality TEXT, md5_origin TEXT, "
+            "media_version TEXT, path TEXT, size INTEGER, mtime REAL, "
+            "checksum TEXT, PRIMARY KEY (track_id, quality))")
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def get(self, track_id: int, quality: str) -> Optional[ManifestEntry]:
+        """
+        Get the entry of a track.
+
+        Args:
+            track_id: The ID of the track.
+            quality: The requested quality of the download.
+
+        Returns:
+            The entry or `None` if the track was not downloaded.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM tracks WHERE track_id = ? AND quality = ?",
+                (track_id, quality)).fetchone()
+        return _to_entry(row) if row else None
+
+    def lookup(self, track: Track, quality: str) -> Optional[Path]:
+        """
+        Get the file of a track if it was downloaded before and neither
+        the track nor the file changed since.
+
+        Args:
+            track: A [Track][deethon.types.Track] instance with the
+                additional tags.
+            quality: The requested quality of the download.
+
+        Returns:
+            The file path or `None` if the track has to be downloaded.
+        """
+        entry = self.get(track.id, quality)
+        if entry is None or entry.md5_origin != track.md5_origin or \
+                entry.media_version != str(track.media_version):
+            return None
+        if _is_modified(entry):
+            return None
+        return entry.path
+
+    def add(self, track: Track, quality: str, path: Path) -> ManifestEntry:
+        """
+        Add or replace the entry of a downloaded track.
+
+        Args:
+            track: The downloaded [Track][deethon.types.Track].
+            quality: The requested quality of the download.
+            path: The path of the complete, tagged file.
+
+        Returns:
+            The new entry.
+        """
+        stat = path.stat()
+        entry = ManifestEntry(track.id, quality, track.md5_origin,
+                              str(track.media_version), path.absolute(),
+                              stat.st_size, stat.st_mtime, _checksum(path))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*entry[:4], str(entry.path), *entry[5:]))
+        return entry
+
+    def remove(self, track_id: int, quality: Optional[str] = None) -> None:
+        """
+        Remove the entries of a track.
+
+        Args:
+            track_id: The ID of the track.
+            quality: Only remove the entry of this quality.
+        """
+        with self._lock:
+            if quality is None:
+                self._db.execute("DELETE FROM tracks WHERE track_id = ?",
+                                 (track_id,))
+            else:
+                self._db.execute(
+                    "DELETE FROM tracks WHERE track_id = ? AND quality = ?",
+                    (track_id, quality))
+
+    def verify(self, checksums: bool = False,
+               remove: bool = False) -> List[ManifestEntry]:
+        """
+        Check if the files of all entries still exist and are unchanged.
+
+        Args:
+            checksums: Also compare the checksums of the files instead of
+                only their sizes and modification times.
+            remove: Remove the entries of missing or modified files, so
+                that the tracks are downloaded again.
+
+        Returns:
+            The entries of missing or modified files.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM tracks").fetchall()
+        invalid = []
+        for entry in map(_to_entry, rows):
+            if _is_modified(entry) or \
+                    (checksums and _checksum(entry.path) != entry.checksum):
+                invalid.append(entry)
+        if remove:
+            for entry in invalid:
+                self.remove(entry.track_id, entry.quality)
+        return invalid
+
+
+def _to_entry(row: tuple) -> ManifestEntry:
+    return ManifestEntry(row[0], row[1], row[2], row[3], Path(row[4]),
+                         *row[5:])
+
+
+def _is_modified(entry: ManifestEntry) -> bool:
+    try:
+        stat = os.stat(entry.path)
+    except OSError:
+        return True
+    return stat.st_size != entry.size or stat.st_mtime != entry.mtime
+
+
+def _checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for data in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(data)
+    return digest.hexdigest()
@@ -0,0 +1,283 @@
+"""
+This module contains the hooks that report the duration of each stage of
+a download and counters of requests, cache lookups, retries and bytes.
+
+The events are passed to all registered sinks. Without sinks, the hooks
+do nothing. [Metrics][deethon.metrics.Metrics] is a sink that aggregates
+the events and exports them in the Prometheus text format or as JSON:
+
+```python
+metrics = deethon.metrics.Metrics()
+deethon.metrics.add_sink(metrics)
+session.download_album(album)
+print(metrics.to_prometheus())
+```
+
+Stages (durations in seconds):
+
+- `metadata`: a request to Deezer's official API
+- `add_more_tags`: the additional tags of one or more tracks
+- `stream_url`: the generation of a stream URL
+- `cdn_ttfb`: the time until the response headers of the CDN arrive
+- `transfer`: the complete download of the audio data of a track
+- `decrypt`: the decryption of a track
+- `write`: writing a track to disk
+- `cover`: the download of a cover
+- `tag`: the creation and completion of the tags of a track
+
+Counters:
+
+- `requests`: the requests to Deezer, by `endpoint`
+- `cache_hits` and `cache_misses`: lookups in the metadata cache, by `cache`
+- `retries`: repeated requests, by `reason`
+- `bytes`: the downloaded audio data
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class Event(NamedTuple):
+    """A measurement that is passed to the sinks."""
+
+    name: str
+    """The name of the stage or counter."""
+    kind: str
+    """`timing` for the duration of a stage or `count` for a counter."""
+    value: float
+    """The duration in seconds or the increment of the counter."""
+    labels: Tuple[Tuple[str, str], ...] = ()
+    """Additional dimensions of the measurement as name-value pairs."""
+    track_id: Optional[int] = None
+    """The ID of the track that the measurement belongs to."""
+
+
+class MetricsSink:
+    """The base class of the sinks that receive the events."""
+
+    def record(self, event: Event) -> None:
+        """
+        Receive an event. This method may be called from several threads.
+
+        Args:
+            event: The [Event][deethon.metrics.Event].
+        """
+        raise NotImplementedError
+
+
+class Metrics(MetricsSink):
+    """
+    A sink that aggregates the events: the number, total and maximum of
+    the durations of each stage and the sum of each counter.
+    """
+
+    def __init__(self):
+        """Create a new sink without measurements."""
+        self._timings: Dict[Tuple[str, tuple], List[float]] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, event: Event) -> None:
+        key = (event.name, event.labels)
+        with self._lock:
+            if event.kind == "timing":
+                timing = self._timings.setdefault(key, [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += event.value
+                timing[2] = max(timing[2], event.value)
+            else:
+                self._counters[key] = self._counters.get(key, 0) + event.value
+
+    def reset(self) -> None:
+        """Remove all measurements."""
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> Dict[str, list]:
+        """
+        Get the aggregated measurements.
+
+        Returns:
+            A dictionary with a list of `timings` (`name`, `labels`,
+            `count`, `sum` and `max`) and a list of `counters` (`name`,
+            `labels` and `value`).
+        """
+        with self._lock:
+            timings = sorted(self._timings.items())
+            counters = sorted(self._counters.items())
+        return {
+            "timings": [{"name": name, "labels": dict(labels), "count": count,
+                         "sum": total, "max": maximum}
+                        for (name, labels), (count, total, maximum)
+                        in timings],
+            "counters": [{"name": name, "labels": dict(labels),
+                          "value": value}
+                         for (name, labels), value in counters],
+        }
+
+    def to_json(self) -> str:
+        """
+        Export the measurements as JSON, see
+        [to_dict()][deethon.metrics.Metrics.to_dict].
+
+        Returns:
+            The JSON document.
+        """
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "deethon") -> str:
+        """
+        Export the measurements in the Prometheus text format. The stages
+        are summaries named `<prefix>_<stage>_seconds` and the counters
+        are named `<prefix>_<counter>_total`.
+
+        Args:
+            prefix: The prefix of the metric names.
+
+        Returns:
+            The metrics in the Prometheus text exposition format.
+        """
+        data = self.to_dict()
+        lines = []
+        for metric, samples in _group(data["timings"], prefix, "_seconds"):
+            lines.append(f"# TYPE {metric} summary")
+            for sample in samples:
+                labels = _format_labels(sample["labels"])
+                lines.append(f"{metric}_count{labels} {sample['count']}")
+                lines.append(f"{metric}_sum{labels} {sample['sum']!r}")
+        for metric, samples in _group(data["counters"], prefix, "_total"):
+            lines.append(f"# TYPE {metric} counter")
+            for sample in samples:
+                labels = _format_labels(sample["labels"])
+                lines.append(f"{metric}{labels} {sample['value']!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _group(samples: List[dict], prefix: str,
+           suffix: str) -> Iterator[Tuple[str, List[dict]]]:
+    groups: Dict[str, List[dict]] = {}
+    for sample in samples:
+        groups.setdefault(f"{prefix}_{sample['name']}{suffix}",
+                          []).append(sample)
+    return iter(groups.items())
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+_sinks: Tuple[MetricsSink, ...] = ()
+_lock = threading.Lock()
+
+
+def add_sink(sink: MetricsSink) -> None:
+    """
+    Pass all following events to a sink.
+
+    Args:
+        sink: A [MetricsSink][deethon.metrics.MetricsSink].
+    """
+    global _sinks  # pylint: disable=global-statement
+    with _lock:
+        _sinks = (*_sinks, sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    """
+    Stop passing events to a sink.
+
+    Args:
+        sink: A sink that was added with [add_sink()][deethon.metrics.add_sink].
+    """
+    global _sinks  # pylint: disable=global-statement
+    with _lock:
+        _sinks = tuple(s for s in _sinks if s is not sink)
+
+
+def enabled() -> bool:
+    """
+    Check if any sink is registered.
+
+    Returns:
+        `True` if events are recorded.
+    """
+    return bool(_sinks)
+
+
+def emit(event: Event) -> None:
+    """
+    Pass an event to all sinks.
+
+    Args:
+        event: The [Event][deethon.metrics.Event].
+    """
+    for sink in _sinks:
+        sink.record(event)
+
+
+def count(name: str, value: float = 1, track_id: Optional[int] = None,
+          **labels: str) -> None:
+    """
+    Increment a counter.
+
+    Args:
+        name: The name of the counter.
+        value: The increment.
+        track_id: The ID of the track that the increment belongs to.
+        **labels: Additional dimensions of the counter.
+    """
+    if _sinks:
+        emit(Event(name, "count", value, tuple(sorted(labels.items())),
+                   track_id))
+
+
+def observe(name: str, seconds: float, track_id: Optional[int] = None,
+            **labels: str) -> None:
+    """
+    Record the duration of a stage.
+
+    Args:
+        name: The name of the stage.
+        seconds: The duration in seconds.
+        track_id: The ID of the track that the stage belongs to.
+        **labels: Additional dimensions of the stage.
+    """
+    if _sinks:
+        emit(Event(name, "timing", seconds, tuple(sorted(labels.items())),
+                   track_id))
+
+
+@contextmanager
+def timed(name: str, track_id: Optional[int] = None,
+          **labels: str) -> Iterator[None]:
+    """
+    Record the duration of the `with` block as a stage, also if it
+    raises an exception.
+
+    ```python
+    with timed("cover"):
+        data = download(url)
+    ```
+
+    Args:
+        name: The name of the stage.
+        track_id: The ID of the track that the stage belongs to.
+        **labels: Additional dimensions of the stage.
+    """
+    if not _sinks:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, track_id, **labels)
@@ -0,0 +1,473 @@
+"""
+This module contains the rate limiter that controls the request rate and
+the number of concurrent requests to Deezer, by endpoint class:
+
+- `api`: Deezer's official API (`consts.LEGACY_API_URL`)
+- `gw`: Deezer's unofficial API (`consts.API_URL`)
+- `cdn`: Deezer's CDN for tracks and covers
+"""
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import (Any, Awaitable, Callable, Dict, Iterator, List, Optional,
+                    Tuple, TypeVar)
+
+from . import errors, metrics
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that allows `rate` requests per second
+    with bursts of up to `burst` requests.
+
+    Attributes:
+        rate: The number of tokens that are added per second.
+        burst: The maximum number of tokens.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Create a new, full token bucket.
+
+        Args:
+            rate: The number of tokens that are added per second.
+            burst: The maximum number of tokens.
+        """
+        self.rate: float = rate
+        self.burst: int = burst
+        self._tokens: float = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take a token, which may not be available yet.
+
+        Returns:
+            The number of seconds to wait until the token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """Take a token and wait until it is available."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    def drain(self, seconds: float = 0.0) -> None:
+        """
+        Remove all tokens, so that no requests are allowed for `seconds`.
+
+        Args:
+            seconds: The number of seconds until the next token is added.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of concurrent requests and adapts the limit with
+    additive increase and multiplicative decrease: the limit is halved
+    when the server is overloaded and grows by one after a full limit
+    of successful requests.
+
+    Attributes:
+        minimum: The lowest limit.
+        maximum: The highest limit.
+        limit: The current limit.
+        active: The number of requests in flight.
+    """
+
+    COOLDOWN: float = 1.0
+    """The number of seconds between two decreases of the limit."""
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        """
+        Create a new controller that starts at the highest limit.
+
+        Args:
+            maximum: The highest limit.
+            minimum: The lowest limit.
+        """
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.limit: float = maximum
+        self.active: int = 0
+        self._decreased = float("-inf")
+        self._condition = threading.Condition()
+        # The futures of coroutines that wait in acquire_async().
+        self._waiters: List[Tuple[Any, Any]] = []
+
+    def try_acquire(self) -> bool:
+        """
+        Start a request if the limit allows it.
+
+        Returns:
+            `True` if the request may be sent.
+        """
+        with self._condition:
+            if self.active >= int(self.limit):
+                return False
+            self.active += 1
+            return True
+
+    def acquire(self) -> None:
+        """Wait until the limit allows another request and start it."""
+        with self._condition:
+            while self.active >= int(self.limit):
+                self._condition.wait()
+            self.active += 1
+
+    async def acquire_async(self) -> None:
+        """
+        Asynchronous version of
+        [acquire()][deethon.ratelimit.AdaptiveConcurrency.acquire] that
+        waits without blocking the event loop.
+        """
+        import asyncio  # pylint: disable=import-outside-toplevel
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.active < int(self.limit):
+                    self.active += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def release(self, overloaded: bool = False) -> None:
+        """
+        Finish a request and adapt the limit.
+
+        Args:
+            overloaded: `True` if the server replied that it is overloaded.
+        """
+        with self._condition:
+            self.active -= 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._decreased >= self.COOLDOWN:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
+
+
+class RateLimiter:
+    """
+    Limits the requests to Deezer by endpoint class with a
+    [TokenBucket][deethon.ratelimit.TokenBucket] and an
+    [AdaptiveConcurrency][deethon.ratelimit.AdaptiveConcurrency]
+    controller. A rate limiter can be shared by several sessions and
+    threads.
+
+    Requests that are rejected because of the quota or with the status
+    `429 Too Many Requests` reduce the concurrency, pause all requests to
+    the endpoint class and are retried with exponential backoff.
+
+    Attributes:
+        buckets: The token buckets by endpoint class. Endpoint classes
+            without a bucket are not limited by rate.
+        concurrency: The concurrency controllers by endpoint class.
+        retries: The number of times a rejected request is retried.
+        backoff: The number of seconds to wait before the first retry.
+    """
+
+    DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+        "api": (10, 50),
+        "gw": (20, 40),
+    }
+    """The default rate and burst size of each endpoint class. Deezer's
+    official API allows 50 requests per 5 seconds."""
+
+    DEFAULT_CONCURRENCY: Dict[str, int] = {
+        "api": 16,
+        "gw": 16,
+        "cdn": 64,
+    }
+    """The default concurrency limit of each endpoint class."""
+
+    def __init__(self,
+                 rates: Optional[Dict[str, Optional[Tuple[float, int]]]] = None,
+                 concurrency: Optional[Dict[str, int]] = None,
+                 retries: int = 5,
+                 backoff: float = 1.0):
+        """
+        Create a new rate limiter.
+
+        Args:
+            rates: The rate and burst size by endpoint class, or `None`
+                to disable the rate limit of an endpoint class. Overrides
+                the default rates.
+            concurrency: The concurrency limit by endpoint class.
+                Overrides the default limits.
+            retries: The number of times a rejected request is retried.
+            backoff: The number of seconds to wait before the first retry.
+        """
+        rates = {**self.DEFAULT_RATES, **(rates or {})}
+        self.buckets: Dict[str, TokenBucket] = {
+            endpoint: TokenBucket(*rate)
+            for endpoint, rate in rates.items() if rate is not None}
+        concurrency = {**self.DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.concurrency: Dict[str, AdaptiveConcurrency] = {
+            endpoint: AdaptiveConcurrency(limit)
+            for endpoint, limit in concurrency.items()}
+        self.retries: int = retries
+        self.backoff: float = backoff
+
+    @contextmanager
+    def limit(self, endpoint: str) -> Iterator[Callable[[], None]]:
+        """
+        Wait until a request to the endpoint class is allowed.
+
+        ```python
+        with rate_limiter.limit("gw") as overloaded:
+            r = requests.post(url)
+            if r.status_code == 429:
+                overloaded()
+        ```
+
+        Args:
+            endpoint: The endpoint class (`api`, `gw` or `cdn`).
+
+        Returns:
+            A context manager that yields a callable to report that the
+            server is overloaded.
+        """
+        bucket = self.buckets.get(endpoint)
+        concurrency = self.concurrency.get(endpoint)
+        if bucket is not None:
+            bucket.acquire()
+        if concurrency is not None:
+            concurrency.acquire()
+        overloaded = False
+
+        def report() -> None:
+            nonlocal overloaded
+            overloaded = True
+
+        try:
+            yield report
+        finally:
+            if concurrency is not None:
+                concurrency.release(overloaded)
+
+    def call(self,
+             endpoint: str,
+             send: Callable[[], T],
+             is_overloaded: Callable[[T], bool],
+             stream: bool = False) -> T:
+        """
+        Send a request within the limits and retry it with exponential
+        backoff as long as the server is overloaded.
+
+        Args:
+            endpoint: The endpoint class (`api`, `gw` or `cdn`).
+            send: A callable that sends the request and returns the response.
+            is_overloaded: A callable that checks if a response was
+                rejected because the server is overloaded.
+            stream: If `true`, the request counts against the concurrency
+                limit until the response is closed, so that the limit
+                also bounds the transfers of streamed bodies. Otherwise
+                it counts until the response headers arrive. A streamed
+                response that is never closed counts until it is garbage
+                collected.
+
+        Returns:
+            The response.
+
+        Raises:
+            RateLimitError: The server was still overloaded after all retries.
+        """
+        bucket = self.buckets.get(endpoint)
+        concurrency = self.concurrency.get(endpoint)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            if concurrency is not None:
+                concurrency.acquire()
+            overloaded = held = False
+            try:
+                r = send()
+                overloaded = is_overloaded(r)
+                if not overloaded:
+                    held = stream and concurrency is not None
+                    if held:
+                        _release_on_close(r, concurrency)
+                    return r
+                _close(r)
+            finally:
+                if concurrency is not None and not held:
+                    concurrency.release(overloaded)
+            delay = self._pause(endpoint, attempt, r)
+            attempt += 1
+            if attempt > self.retries:
+                raise errors.RateLimitError(endpoint)
+            metrics.count("retries", reason="overloaded", endpoint=endpoint)
+            time.sleep(delay)
+
+    async def call_async(self,
+                         endpoint: str,
+                         send: Callable[[], Awaitable[T]],
+                         is_overloaded: Callable[[T], bool]) -> T:
+        """
+        Asynchronous version of [call()][deethon.ratelimit.RateLimiter.call]
+        whose `send` argument is a coroutine function. A request counts
+        against the concurrency limit only until its response headers
+        arrive, also if its body is streamed.
+        """
+        import asyncio  # pylint: disable=import-outside-toplevel
+        bucket = self.buckets.get(endpoint)
+        concurrency = self.concurrency.get(endpoint)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                await asyncio.sleep(bucket.reserve())
+            if concurrency is not None:
+                await concurrency.acquire_async()
+            overloaded = False
+            try:
+                r = await send()
+                overloaded = is_overloaded(r)
+                if not overloaded:
+                    return r
+                _close(r)
+            finally:
+                if concurrency is not None:
+                    concurrency.release(overloaded)
+            delay = self._pause(endpoint, attempt, r)
+            attempt += 1
+            if attempt > self.retries:
+                raise errors.RateLimitError(endpoint)
+            metrics.count("retries", reason="overloaded", endpoint=endpoint)
+            await asyncio.sleep(delay)
+
+    def _pause(self, endpoint: str, attempt: int, r: object) -> float:
+        delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+        headers = getattr(r, "headers", None) or {}
+        retry_after = headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None:
+            bucket.drain(delay)
+        return delay
+
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _release_on_close(r: Any, concurrency: AdaptiveConcurrency) -> None:
+    # The response keeps its slot until it is closed or garbage collected.
+    # The weak references avoid a cycle that would delay the collection.
+    release = weakref.finalize(r, concurrency.release)
+    response = weakref.ref(r)
+    close = type(r).close
+
+    def close_and_release() -> None:
+        try:
+            if response() is not None:
+                close(response())
+        finally:
+            release()
+
+    r.close = close_and_release
+
+
+def _close(r: object) -> None:
+    close = getattr(r, "close", None)
+    if close is not None:
+        close()
+
+
+def is_overloaded(r: object) -> bool:
+    """
+    Check if a response of `requests` or `aiohttp` has the status
+    `429 Too Many Requests` or `503 Service Unavailable`.
+
+    Args:
+        r: The response.
+
+    Returns:
+        `True` if the server is overloaded.
+    """
+    status = getattr(r, "status_code", None) or getattr(r, "status", None)
+    return status in (429, 503)
+
+
+async def limited_async(endpoint: str,
+                        send: Callable[[], Awaitable[T]],
+                        overloaded: Callable[[T], bool] = is_overloaded) -> T:
+    """
+    Send a request with the [rate limiter][deethon.ratelimit.get_rate_limiter],
+    see [RateLimiter.call_async()][deethon.ratelimit.RateLimiter.call_async].
+
+    Args:
+        endpoint: The endpoint class (`api`, `gw` or `cdn`).
+        send: A coroutine function that sends the request and returns
+            the response.
+        overloaded: A callable that checks if a response was rejected
+            because the server is overloaded.
+
+    Returns:
+        The response.
+    """
+    rate_limiter = _rate_limiter
+    if rate_limiter is None:
+        return await send()
+    return await rate_limiter.call_async(endpoint, send, overloaded)
+
+
+_rate_limiter: Optional[RateLimiter] = RateLimiter()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Get the rate limiter that is used by the types and sessions.
+
+    Returns:
+        The rate limiter or `None` if it is disabled.
+    """
+    return _rate_limiter
+
+
+def set_rate_limiter(rate_limiter: Optional[RateLimiter]) -> None:
+    """
+    Set the rate limiter that is used by the types and sessions.
+
+    Args:
+        rate_limiter: A [RateLimiter][deethon.ratelimit.RateLimiter]
+            instance or `None` to disable rate limiting.
+    """
+    global _rate_limiter  # pylint: disable=global-statement
+    _rate_limiter = rate_limiter
@@ -1,57 +1,420 @@
 """This module contains the Session class."""
+import json as _json
+import threading
 import time
-import re
+from collections import deque
+from concurrent.futures import (Executor, ThreadPoolExecutor, Future,
+                                as_completed, wait, FIRST_COMPLETED)
 from pathlib import Path
-from typing import Union, Generator, Any, Tuple, Optional, Callable
+from typing import (Union, Generator, Any, Tuple, Optional, Callable,
+                    Iterable, Iterator, List, Dict, BinaryIO)
 
 import requests
 
-from . import errors, consts, utils, types
+from . import errors, consts, metrics, utils, types
+from .cache import LRUCache, get_metadata_cache
+from .manifest import Manifest
+from .client import HTTPClient, get_client
+from .ratelimit import is_overloaded
+
+_CACHED_METHODS = (consts.METHOD_PAGE_TRACK, consts.METHOD_GET_LYRICS)
+
+# A track of a download pipeline or the exception that occurred while
+# it was loaded.
+_TrackOrError = Union[types.Track, Exception]
+_BULK_SIZE = 100
+# The encrypted data that is passed to the decrypt executor at once and
+# the number of buffers of a track that may be pending.
+_DECRYPT_BUFFER_SIZE = 64 * utils.Decrypter.STRIPE_SIZE
+_DECRYPT_PENDING = 8
+
+
+class TokenManager:
+    """
+    Manages the CSRF token that is required by Deezer's unofficial API.
+
+    The token is cached until it is close to expiry. Within `margin`
+    seconds before it expires, callers still get the cached token while
+    it is refreshed in a background thread. Concurrent callers share a
+    single in-flight refresh.
+
+    Attributes:
+        lifetime: The number of seconds a token is valid.
+        margin: The number of seconds before expiry in which the token is
+            refreshed in the background.
+        refresh_count: The number of times the token was refreshed.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[], str],
+                 lifetime: float = 3600,
+                 margin: float = 300):
+        """
+        Create a new token manager.
+
+        Args:
+            fetch: A callable that requests a new token.
+            lifetime: The number of seconds a token is valid.
+            margin: The number of seconds before expiry in which the
+                token is refreshed in the background.
+        """
+        self.lifetime: float = lifetime
+        self.margin: float = margin
+        self.refresh_count: int = 0
+        self._fetch = fetch
+        self._token: Optional[str] = None
+        self._expires: float = 0
+        self._lock = threading.Lock()
+        self._refreshing: Optional[threading.Event] = None
+
+    def _fresh_token(self) -> Optional[str]:
+        """Return the token if it does not need to be refreshed yet."""
+        if self._token is not None and \
+                time.time() < self._expires - self.margin:
+            return self._token
+        return None
+
+    def _usable_token(self) -> Optional[str]:
+        """Return the token if it has not expired yet."""
+        if self._token is not None and time.time() < self._expires:
+            return self._token
+        return None
+
+    def _set_token(self, token: str) -> None:
+        self._token = token
+        self._expires = time.time() + self.lifetime
+        self.refresh_count += 1
+
+    def get(self) -> str:
+        """
+        Get a valid token and refresh it if required.
+
+        Returns:
+            The CSRF token.
+        """
+        token = self._fresh_token()
+        if token is not None:
+            return token
+        token = self._usable_token()
+        if token is not None:
+            with self._lock:
+                if self._refreshing is None:
+                    # Claimed under the lock, so only one thread is started.
+                    event = self._refreshing = threading.Event()
+                    threading.Thread(target=self._refresh_in_background,
+                                     args=(event,), daemon=True).start()
+            return token
+        return self.refresh()
+
+    def refresh(self, stale: Optional[str] = None) -> str:
+        """
+        Refresh the token. If another thread is already refreshing it,
+        wait for its result instead.
+
+        Args:
+            stale: The token that was rejected by the API. If the token
+                was already refreshed since, the new token is returned
+                without another refresh.
+
+        Returns:
+            The new CSRF token.
+        """
+        while True:
+            with self._lock:
+                if stale is not None and self._token != stale and \
+                        self._usable_token() is not None:
+                    return self._token
+                event = self._refreshing
+                if event is None:
+                    event = self._refreshing = threading.Event()
+                    break
+            event.wait()
+            token = self._usable_token()
+            if token is not None and token != stale:
+                return token
+        return self._fetch_token(event)
+
+    def _fetch_token(self, event: threading.Event) -> str:
+        """Fetch a new token for the refresh that was claimed with `event`."""
+        try:
+            token = self._fetch()
+            with self._lock:
+                self._set_token(token)
+            return token
+        finally:
+            with self._lock:
+                self._refreshing = None
+            event.set()
+
+    def _refresh_in_background(self, event: threading.Event) -> None:
+        try:
+            self._fetch_token(event)
+        except Exception:  # pylint: disable=broad-except
+            # The current token is still valid, the next caller retries.
+            pass
+
+    def invalidate(self) -> None:
+        """Discard the current token."""
+        with self._lock:
+            self._token = None
+            self._expires = 0
 
 
 class Session:
-    """A session is required to connect to Deezer's unofficial API."""
+    """
+    A session is required to connect to Deezer's unofficial API.
 
-    def __init__(self, arl_token: str):
+    Attributes:
+        token_manager: The [TokenManager][deethon.session.TokenManager]
+            of the CSRF token of this session.
+        availability_cache: The sizes of the available bitrates of each
+            track, by track ID and MD5 origin.
+        manifest: The [Manifest][deethon.manifest.Manifest] of the
+            downloaded tracks or `None`.
+        client: The [HTTPClient][deethon.client.HTTPClient] of this session.
+        decrypt_executor: The executor that decrypts and writes the
+            downloaded tracks or `None`.
+    """
+
+    def __init__(self,
+                 arl_token: str,
+                 manifest: Optional[Manifest] = None,
+                 client: Optional[HTTPClient] = None,
+                 decrypt_executor: Optional[Executor] = None):
         """
         Creates a new Deezer session instance.
 
         Args:
             arl_token (str): The arl token is used to make API requests
                 on Deezer's unofficial API
+            manifest: A [Manifest][deethon.manifest.Manifest]. Tracks
+                that are in the manifest and did not change are not
+                downloaded again.
+            client: An [HTTPClient][deethon.client.HTTPClient]. Defaults
+                to the [shared client][deethon.client.get_client].
+            decrypt_executor: An executor, usually a
+                `concurrent.futures.ProcessPoolExecutor`, that decrypts
+                and writes the downloaded tracks, so that the download
+                threads only receive data and decryption is not limited
+                by the GIL. By default, tracks are decrypted in the
+                download threads. The executor is not shut down by the
+                session.
 
         Raises:
             DeezerLoginError: The specified arl token is not valid.
         """
         self._arl_token: str = arl_token
-        self._req = requests.Session()
-        self._req.cookies["arl"] = self._arl_token
-        self._csrf_token = "null"
-        self._session_expires = 0
+        self._cookies = requests.cookies.RequestsCookieJar()
+        self._cookies["arl"] = self._arl_token
+        self.client: HTTPClient = client or get_client()
+        self.token_manager: TokenManager = TokenManager(self._fetch_token)
+        self.availability_cache: LRUCache = LRUCache(maxsize=4096, ttl=3600)
+        self.manifest: Optional[Manifest] = manifest
+        self.decrypt_executor: Optional[Executor] = decrypt_executor
 
-    def _refresh_session(self) -> None:
-        user = self.get_api(consts.METHOD_GET_USER)
+    def _fetch_token(self) -> str:
+        user = self._post(consts.METHOD_GET_USER, "null")["results"]
         if user["USER"]["USER_ID"] == 0:
             raise errors.DeezerLoginError
-        self._csrf_token = user["checkForm"]
-        self._session_expires = time.time() + 3600
+        return user["checkForm"]
+
+    def _refresh_session(self) -> None:
+        self.token_manager.refresh()
 
     def get_api(self, method: str, json=None) -> dict:
-        if not method == consts.METHOD_GET_USER and \
-                (self._csrf_token == "null" or self._session_expires > time.time()):
-            self._refresh_session()
+        """
+        Make a request to Deezer's unofficial API. The results of
+        `deezer.pageTrack` and `song.getLyrics` requests are stored in the
+        [metadata cache][deethon.cache.MetadataCache] if it is enabled.
 
+        If the API rejects the CSRF token, the token is refreshed and the
+        request is sent once more.
+
+        Args:
+            method: The API method, e.g. `deezer.pageTrack`.
+            json: The JSON body of the request.
+
+        Returns:
+            The `results` of the response.
+        """
+        metadata_cache = get_metadata_cache()
+        if metadata_cache is None or method not in _CACHED_METHODS:
+            return self._get_api(method, json)["results"]
+        key = _json.dumps(json, sort_keys=True)
+        results = metadata_cache.get(method, key)
+        if results is None:
+            r = self._get_api(method, json)
+            results = r["results"]
+            if _has_results(r):
+                metadata_cache.set(method, key, results)
+        return results
+
+    def _get_api(self, method: str, json=None) -> dict:
+        if method == consts.METHOD_GET_USER:
+            r = self._post(method, "null", json)
+            _raise_for_gw_error(method, r)
+            return r
+
+        token = self.token_manager.get()
+        r = self._post(method, token, json)
+        if _is_invalid_token(r):
+            r = self._post(method, self.token_manager.refresh(token), json)
+        _raise_for_gw_error(method, r)
+        return r
+
+    def _post(self, method: str, token: str, json=None) -> dict:
         params = {
             "api_version": "1.0",
-            "api_token": self._csrf_token,
+            "api_token": token,
             "input": "3",
             "method": method,
         }
-        return self._req.post(
+        r = self.client.post(
             consts.API_URL,
             params=params,
-            json=json
-        ).json()["results"]
+            json=json,
+            cookies=self._cookies,
+            overloaded=_is_gw_overloaded
+        )
+        self._cookies.update(r.cookies)
+        return r.json()
+
+    def add_more_tags_bulk(self,
+                           tracks: Iterable[types.Track],
+                           lyrics: bool = True) -> None:
+        """
+        Adds more tags to several tracks with one request to Deezer's
+        unofficial API per 100 tracks. This is equivalent to calling
+        [add_more_tags()][deethon.types.Track.add_more_tags] for each track.
+
+        Args:
+            tracks: The [Track][deethon.types.Track] instances.
+            lyrics: If `true`, the lyrics are requested separately for
+                each track that has lyrics. Otherwise they are requested
+                by [Track.add_lyrics()][deethon.types.Track.add_lyrics]
+                when a track is downloaded.
+        """
+        with metrics.timed("add_more_tags"):
+            self._add_more_tags_bulk(list(tracks), lyrics)
+
+    def _add_more_tags_bulk(self, tracks: List[types.Track],
+                            lyrics: bool) -> None:
+        for i in range(0, len(tracks), _BULK_SIZE):
+            batch = tracks[i:i + _BULK_SIZE]
+            data = self._get_list_data([track.id for track in batch])
+            for track in batch:
+                if track.id not in data:
+                    continue
+                r = {"DATA": data[track.id]}
+                if lyrics and int(data[track.id].get("LYRICS_ID") or 0):
+                    r["LYRICS"] = self.get_api(consts.METHOD_GET_LYRICS,
+                                               {"sng_id": track.id})
+                track._parse_more_tags(r, lyrics)
+
+    def _get_list_data(self, track_ids: List[int]) -> Dict[int, dict]:
+        metadata_cache = get_metadata_cache()
+        data = {}
+        if metadata_cache is not None:
+            for track_id in track_ids:
+                item = metadata_cache.get(consts.METHOD_GET_LIST_DATA, track_id)
+                if item is not None:
+                    data[track_id] = item
+        missing = [track_id for track_id in track_ids if track_id not in data]
+        if missing:
+            r = self._get_api(consts.METHOD_GET_LIST_DATA,
+                              {"sng_ids": missing})
+            for item in r["results"]["data"]:
+                data[int(item["SNG_ID"])] = item
+                if metadata_cache is not None and _has_results(r):
+                    metadata_cache.set(consts.METHOD_GET_LIST_DATA,
+                                       int(item["SNG_ID"]), item)
+        return data
+
+    def _add_more_tags_in_batches(
+            self,
+            tracks: Iterable[_TrackOrError]
+    ) -> Generator[_TrackOrError, Any, None]:
+        # The first batches are smaller, so that the first download
+        # starts before the tracks of a full batch are loaded.
+        batch = []
+        size = 8
+        for track in tracks:
+            batch.append(track)
+            if len(batch) == size:
+                yield from self._add_more_tags_to_batch(batch)
+                batch = []
+                size = min(size * 2, _BULK_SIZE)
+        if batch:
+            yield from self._add_more_tags_to_batch(batch)
+
+    def _add_more_tags_to_batch(
+            self,
+            batch: List[_TrackOrError]
+    ) -> List[_TrackOrError]:
+        # If the batch fails, its exception is the result of each track.
+        # The lyrics are requested when a track is downloaded, so that a
+        # batch costs only one request.
+        try:
+            self.add_more_tags_bulk(
+                [track for track in batch if not isinstance(track, Exception)],
+                lyrics=False)
+        except Exception as e:  # pylint: disable=broad-except
+            return [track if isinstance(track, Exception) else e
+                    for track in batch]
+        return batch
+
+    def prepare_tracks(
+            self,
+            tracks: Iterable[Union[types.Track, Exception]],
+            bitrate: str = "FLAC",
+            prefetch: int = 4
+    ) -> Generator[Union[types.Track, Exception], Any, None]:
+        """
+        Prepare [Track][deethon.types.Track] objects for their downloads.
+        The additional tags of the tracks are loaded in batches and, while
+        the tracks are consumed, the available bitrates, albums and covers
+        of the next `prefetch` tracks are loaded in the background.
+
+        Args:
+            tracks: The [Track][deethon.types.Track] instances to prepare.
+                An exception in place of a track is passed through.
+            bitrate: The preferred bitrate
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            prefetch: The number of tracks that are prepared ahead.
+
+        Returns:
+            A generator that yields one item for each track, in track
+            order: the track or, if its additional tags cannot be loaded,
+            the raised exception.
+        """
+        return self._prefetch_ahead(self._add_more_tags_in_batches(tracks),
+                                    bitrate, prefetch)
+
+    def _prefetch_ahead(
+            self,
+            tracks: Iterable[_TrackOrError],
+            bitrate: str,
+            prefetch: int
+    ) -> Generator[_TrackOrError, Any, None]:
+        # Probe the bitrates and load the albums and covers of the next
+        # tracks while the current track is downloaded.
+        with ThreadPoolExecutor(max(prefetch, 1)) as executor:
+            window = deque()
+            for track in tracks:
+                future = None if isinstance(track, Exception) else \
+                    executor.submit(self._prefetch, track, bitrate)
+                window.append((track, future))
+                if len(window) > prefetch:
+                    yield _prefetched(*window.popleft())
+            while window:
+                yield _prefetched(*window.popleft())
+
+    def _prefetch(self, track: types.Track, bitrate: str) -> None:
+        if self.manifest is not None and \
+                self.manifest.lookup(track, utils.get_quality(bitrate)):
+            return
+        if self.get_available_bitrates(track, bitrate):
+            _ = track.album.cover_xl
 
     def download(self,
                  url: str,
@@ -72,37 +435,209 @@ def download(self,
                 supported for download.
             InvalidUrlError: The specified URL is not a valid deezer link.
         """
-        match = re.match(
-            r"https?://(?:www\.)?deezer\.com/(?:\w+/)?(\w+)/(\d+)", url)
-        if match:
-            mode = match.group(1)
-            content_id = int(match.group(2))
+        mode, content_id = utils.parse_url(url)
+
+        if mode == "track":
+            return self.download_track(types.Track(content_id), bitrate,
+                                       progress_callback)
+        if mode == "album":
+            return self.download_album(types.Album(content_id), bitrate)
+
+        if mode == "playlist":
+            return self.download_playlist(types.Playlist(content_id), bitrate)
+
+        raise errors.ActionNotSupported(mode)
+
+    def get_available_bitrates(self,
+                               track: types.Track,
+                               bitrate: str = "FLAC") -> Dict[str, int]:
+        """
+        Check which bitrates of a track are available, starting with the
+        preferred bitrate. All bitrates are probed at the same time with
+        `HEAD` requests and the results are cached for an hour in
+        `availability_cache`. A bitrate whose probe fails with an error
+        other than `404` is left out and probed again by the next call.
+
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+            bitrate: The preferred bitrate
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+
+        Returns:
+            The file size of each available bitrate that is not better
+            than the preferred bitrate, best bitrate first.
+        """
+        if track.md5_origin is None:
+            track.add_more_tags(self)
+        if bitrate not in consts.BITRATES:
+            bitrate = "MP3_128"
+        bitrates = consts.BITRATES[consts.BITRATES.index(bitrate):]
+        key = (track.id, track.md5_origin)
+        sizes = self.availability_cache.get(key, {})
+        missing = [b for b in bitrates if b not in sizes]
+        if missing:
+            if len(missing) == 1:
+                probed = [self._probe(track, missing[0])]
+            else:
+                with ThreadPoolExecutor(len(missing)) as executor:
+                    probed = list(executor.map(
+                        lambda b: self._probe(track, b), missing))
+            sizes = {**sizes, **{b: size for b, size in zip(missing, probed)
+                                 if size is not None}}
+            self.availability_cache.put(key, sizes)
+        return {b: sizes[b] for b in bitrates if sizes.get(b)}
+
+    def _probe(self, track: types.Track, bitrate: str) -> Optional[int]:
+        # Only a missing or empty file is a definitive answer, transient
+        # errors such as a 403 or 5xx must not be cached as unavailable.
+        url = utils.get_stream_url(track, utils.get_quality(bitrate))
+        r = self.client.head(url, allow_redirects=True)
+        if r.ok:
+            return int(r.headers.get("Content-Length", 0))
+        return 0 if r.status_code == 404 else None
+
+    def stream_track(self,
+                     track: types.Track,
+                     bitrate: str = "FLAC",
+                     tags: bool = True,
+                     retries: int = 3) -> Generator[bytes, Any, None]:
+        """
+        Downloads the given [Track][deethon.types.Track] object and
+        yields the decrypted data instead of writing it to a file.
+
+        The best available bitrate is streamed, see
+        [get_available_bitrates()][deethon.session.Session.get_available_bitrates].
+        If the connection drops, the download is resumed from the last
+        yielded byte.
+
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            tags: If `true`, the tags are written in front of the audio
+                data, see [Tagger][deethon.utils.Tagger].
+            retries: The number of times an interrupted download is resumed.
+
+        Returns:
+            A generator that yields chunks of the track.
+
+        Raises:
+            DownloadError: The track is not downloadable.
+        """
+        available = self.get_available_bitrates(track, bitrate)
+        if not available:
+            raise errors.DownloadError(track.id)
+        quality = utils.get_quality(next(iter(available)))
+        download_url = utils.get_stream_url(track, quality)
+        tagger = None
+        if tags:
+            ext = ".flac" if quality == "9" else ".mp3"
+            track.add_lyrics(self)
+            tagger = utils.Tagger(utils.get_tag_header(track, ext), ext)
+
+        position = 0
+        attempt = 0
+        while True:
+            headers = {"Range": f"bytes={position}-"} if position else None
+            try:
+                with self.client.get(download_url, "cdn", headers=headers,
+                                     stream=True) as crypt:
+                    if position and crypt.status_code != 206 or \
+                            not _get_total_size(crypt):
+                        self.availability_cache.invalidate(
+                            (track.id, track.md5_origin))
+                        raise errors.DownloadError(track.id)
+                    for data in utils.decrypt_file(
+                            crypt.iter_content(consts.CHUNK_SIZE),
+                            track.id, position):
+                        # Decrypted data ends at a segment boundary, so
+                        # the download can be resumed from here.
+                        position += len(data)
+                        if tagger:
+                            data = tagger.update(data)
+                        if data:
+                            yield data
+                break
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                attempt += 1
+                if attempt > retries:
+                    raise
+        if tagger:
+            data = tagger.finalize()
+            if data:
+                yield data
 
-            if mode == "track":
-                return self.download_track(types.Track(content_id), bitrate,
-                                           progress_callback)
-            if mode == "album":
-                return self.download_album(types.Album(content_id), bitrate)
+    def download_track_to(self,
+                          track: types.Track,
+                          sink: BinaryIO,
+                          bitrate: str = "FLAC",
+                          tags: bool = True,
+                          retries: int = 3) -> str:
+        """
+        Downloads the given [Track][deethon.types.Track] object into a
+        binary sink, e.g. a socket file, a pipe or an in-memory buffer.
+        See [stream_track()][deethon.session.Session.stream_track].
 
-            if mode == "playlist":
-                return self.download_playlist(types.Playlist(content_id), bitrate)
+        Args:
+            track: A [Track][deethon.types.Track] instance.
+            sink: An object with a `write()` method that accepts bytes.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            tags: If `true`, the tags are written in front of the audio data.
+            retries: The number of times an interrupted download is resumed.
 
-            raise errors.ActionNotSupported(mode)
-        raise errors.InvalidUrlError(url)
+        Returns:
+            The downloaded bitrate.
+
+        Raises:
+            DownloadError: The track is not downloadable.
+        """
+        available = self.get_available_bitrates(track, bitrate)
+        if not available:
+            raise errors.DownloadError(track.id)
+        bitrate = next(iter(available))
+        for data in self.stream_track(track, bitrate, tags, retries):
+            sink.write(data)
+        return bitrate
 
     def download_track(self,
                        track: types.Track,
                        bitrate: str = "FLAC",
-                       progress_callback: Optional[Callable] = None) -> Path:
+                       progress_callback: Optional[Callable] = None,
+                       retries: int = 3,
+                       segments: int = 1) -> Path:
         """
         Downloads the given [Track][deethon.types.Track] object.
 
+        The track is written to a `.part` file next to the final file path.
+        If the connection drops, the download is resumed from the last
+        complete encryption stripe, also by later calls. The tags are
+        written in front of the audio data, see
+        [get_tag_header()][deethon.utils.get_tag_header], so the file is
+        written only once. It is moved to its final path when it is
+        complete.
+
+        With `segments` greater than 1, the track is split into byte
+        ranges that are downloaded and decrypted in parallel. Segmented
+        downloads are resumed within this call, but not by later calls.
+
+        If the session has a [Manifest][deethon.manifest.Manifest] and
+        the track was already downloaded with the same preferred bitrate,
+        the existing file is returned without a request to the CDN.
+
+        If the preferred bitrate is not available, the best available
+        lower bitrate is downloaded, see
+        [get_available_bitrates()][deethon.session.Session.get_available_bitrates].
+
         Args:
             track: A [Track][deethon.types.Track] instance.
             bitrate: The preferred bitrate to download
                 (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
             progress_callback: A callable that accepts
                 `current` and `bytes` arguments.
+            retries: The number of times an interrupted download is resumed.
+            segments: The number of parallel connections for this track.
 
         Returns:
             The file path of the downloaded track.
@@ -110,43 +645,244 @@ def download_track(self,
         Raises:
             DownloadError: The track is not downloadable.
         """
-        track.add_more_tags(self)
-        quality = utils.get_quality(bitrate)
-        download_url = utils.get_stream_url(track, quality)
-        crypt = self._req.get(download_url, stream=True)
-
-        total = int(crypt.headers["Content-Length"])
-        if not total:
-            if bitrate == "FLAC":
-                fallback_bitrate = "MP3_320"
-            elif bitrate == "MP3_320":
-                fallback_bitrate = "MP3_256"
-            elif bitrate == "MP3_256":
-                fallback_bitrate = "MP3_128"
-            else:
-                return None
-            return self.download_track(track, fallback_bitrate, progress_callback)
-        current = 0
+        if self.manifest is not None:
+            if track.md5_origin is None:
+                track.add_more_tags(self)
+            file_path = self.manifest.lookup(track, utils.get_quality(bitrate))
+            if file_path is not None:
+                return file_path
 
+        available = self.get_available_bitrates(track, bitrate)
+        if not available:
+            raise errors.DownloadError(track.id)
+        quality = utils.get_quality(next(iter(available)))
+        with metrics.timed("stream_url", track.id):
+            download_url = utils.get_stream_url(track, quality)
         ext = ".flac" if quality == "9" else ".mp3"
+        track.add_lyrics(self)
+        with metrics.timed("tag", track.id):
+            header = utils.get_tag_header(track, ext)
         file_path = utils.get_file_path(track, ext)
+        # The part file of a previous call is resumed with the first request.
+        part_path = _get_part_path(file_path, quality)
 
-        with file_path.open("wb") as f:
-            for data in utils.decrypt_file(crypt.iter_content(2048), track.id):
-                current += len(data)
-                f.write(data)
-                if progress_callback:
-                    progress_callback(current, total)
+        attempt = 0
+        while True:
+            offset, header_size = _get_resume_offset(part_path, ext)
+            headers = {"Range": f"bytes={offset}-"} if offset else None
+            try:
+                crypt = self.client.get(download_url, "cdn", headers=headers,
+                                        stream=True)
+                # Without the waits of the rate limiter and the retries.
+                metrics.observe("cdn_ttfb", crypt.elapsed.total_seconds(),
+                                track.id)
+                with crypt:
+                    if crypt.status_code == 416:
+                        # The part file does not match the track anymore.
+                        part_path.unlink()
+                        continue
+                    if crypt.status_code != 206:
+                        offset = 0
+                    total = _get_total_size(crypt)
+                    if not total:
+                        break
+                    if segments > 1 and not offset and \
+                            total > segments * consts.CHUNK_SIZE:
+                        crypt.close()
+                        with metrics.timed("transfer", track.id):
+                            self._download_segments(
+                                download_url, part_path, track.id, total,
+                                segments, header, ext, progress_callback,
+                                retries)
+                        break
 
-        utils.tag(file_path, track)
+                    transfer = metrics.timed("transfer", track.id)
+                    with transfer, \
+                            part_path.open("r+b" if offset else "w+b") as f:
+                        if offset:
+                            f.seek(header_size + offset)
+                        else:
+                            header_size = len(header)
+                            f.write(header)
+                        f.truncate()
+                        if self.decrypt_executor is not None:
+                            f.flush()
+                            self._decrypt_in_executor(
+                                crypt.iter_content(consts.CHUNK_SIZE),
+                                part_path, header_size, track.id, offset,
+                                total, progress_callback)
+                            f.seek(0)
+                        else:
+                            _write_decrypted(
+                                crypt.iter_content(consts.CHUNK_SIZE), f,
+                                track.id, offset, total, progress_callback)
+                        with metrics.timed("tag", track.id):
+                            utils.complete_tag_header(f, ext, header_size)
+                break
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                attempt += 1
+                if attempt > retries:
+                    raise
+                metrics.count("retries", reason="resume")
+
+        if not total:
+            # The track is not available anymore in the probed bitrate.
+            self.availability_cache.invalidate((track.id, track.md5_origin))
+            raise errors.DownloadError(track.id)
+
+        part_path.replace(file_path)
+        if self.manifest is not None:
+            self.manifest.add(track, utils.get_quality(bitrate), file_path)
 
         return file_path.absolute()
 
+    def _decrypt_in_executor(self,
+                             chunks: Iterator[bytes],
+                             part_path: Path,
+                             header_size: int,
+                             track_id: int,
+                             offset: int,
+                             total: int,
+                             progress_callback: Optional[Callable]) -> None:
+        # The buffers consist of whole stripes, so each buffer can be
+        # decrypted on its own. Only a few buffers may be pending, which
+        # blocks the download until the executor catches up.
+        pending = deque()
+        buffer = bytearray()
+        start = current = offset
+        decrypting = writing = 0.0
+
+        def submit(multiple: int) -> None:
+            nonlocal start
+            end = len(buffer) - len(buffer) % multiple
+            if not end:
+                return
+            pending.append(self.decrypt_executor.submit(
+                utils._decrypt_into, str(part_path), header_size + start,
+                bytes(buffer[:end]), track_id, start))
+            del buffer[:end]
+            start += end
+            if len(pending) >= _DECRYPT_PENDING:
+                complete(pending.popleft())
+
+        def complete(future: Future) -> None:
+            nonlocal current, decrypting, writing
+            size, decrypted, written = future.result()
+            current += size
+            decrypting += decrypted
+            writing += written
+            metrics.count("bytes", size, track_id)
+            if progress_callback:
+                progress_callback(current, total)
+
+        try:
+            for data in chunks:
+                buffer += data
+                if len(buffer) >= _DECRYPT_BUFFER_SIZE:
+                    submit(_DECRYPT_BUFFER_SIZE)
+            submit(1)
+        except BaseException:
+            # Keep the complete stripes for resuming the download.
+            submit(utils.Decrypter.STRIPE_SIZE)
+            raise
+        finally:
+            # The part file must not have gaps when the download resumes.
+            try:
+                while pending:
+                    complete(pending.popleft())
+            finally:
+                metrics.observe("decrypt", decrypting, track_id)
+                metrics.observe("write", writing, track_id)
+
+    def _download_segments(self,
+                           download_url: str,
+                           part_path: Path,
+                           track_id: int,
+                           total: int,
+                           segments: int,
+                           header: bytes,
+                           ext: str,
+                           progress_callback: Optional[Callable],
+                           retries: int) -> None:
+        stripe = utils.Decrypter.STRIPE_SIZE
+        step = -(-total // segments // stripe) * stripe
+        lock = threading.Lock()
+        current = 0
+
+        def download_range(start: int, end: int) -> None:
+            nonlocal current
+            attempt = 0
+
+            def progress(position: int, _: int) -> None:
+                # Decrypted data ends at a segment boundary, so the range
+                # can be resumed from here.
+                nonlocal start, current
+                with lock:
+                    current += position - start
+                    if progress_callback:
+                        progress_callback(current, total)
+                start = position
+
+            with part_path.open("r+b") as f:
+                while start < end:
+                    position = start
+                    try:
+                        with self.client.get(
+                                download_url, "cdn", stream=True,
+                                headers={"Range": f"bytes={start}-{end - 1}"}
+                        ) as crypt:
+                            metrics.observe("cdn_ttfb",
+                                            crypt.elapsed.total_seconds(),
+                                            track_id)
+                            if crypt.status_code != 206:
+                                raise errors.DownloadError(track_id)
+                            f.seek(len(header) + start)
+                            _write_decrypted(
+                                crypt.iter_content(consts.CHUNK_SIZE), f,
+                                track_id, start, total, progress)
+                    except (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError):
+                        attempt += 1
+                        if attempt > retries:
+                            raise
+                        continue
+                    if start < end:
+                        # The response ended early. The rest of an
+                        # incomplete segment was not decrypted.
+                        segment = start - start % utils.Decrypter.SEGMENT_SIZE
+                        with lock:
+                            current -= start - segment
+                        start = segment
+                    if start == position:
+                        attempt += 1
+                        if attempt > retries:
+                            raise errors.DownloadError(track_id)
+
+        with part_path.open("wb") as f:
+            f.write(header)
+            f.truncate(len(header) + total)
+        try:
+            with ThreadPoolExecutor(segments) as executor:
+                futures = [executor.submit(download_range, start,
+                                           min(start + step, total))
+                           for start in range(0, total, step)]
+                for future in futures:
+                    future.result()
+            with part_path.open("r+b") as f:
+                utils.complete_tag_header(f, ext, len(header))
+        except BaseException:
+            # A preallocated part file cannot be resumed by its size.
+            part_path.unlink()
+            raise
+
     def download_album(
             self,
             album: types.Album,
             bitrate: str = None,
-            stream: bool = False
+            stream: bool = False,
+            max_workers: Optional[int] = None,
+            prefetch: int = 4
     ) -> Union[Generator[Path, Any, None], Tuple[Path, ...]]:
         """
         Downloads an album from Deezer using the specified Album object.
@@ -158,23 +894,25 @@ def download_album(
             stream: If `true`, this method returns a generator object,
                 otherwise the downloaded files are returned as a tuple
                 that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                See [download_tracks()][deethon.session.Session.download_tracks].
+            prefetch: The number of tracks that are prepared ahead of
+                the downloads.
 
         Returns:
             The file paths.
         """
-
-        tracks = (self.download_track(track, bitrate)
-            for track in album.tracks)
-
-        if stream:
-            return tracks
-        return tuple(tracks)
+        return self.download_tracks(
+            album.iter_tracks(return_exceptions=True), bitrate, stream,
+            max_workers, prefetch)
 
     def download_playlist(
             self,
             playlist: types.Playlist,
             bitrate: str = None,
-            stream: bool = False
+            stream: bool = False,
+            max_workers: Optional[int] = None,
+            prefetch: int = 4
     ) -> Union[Generator[Path, Any, None], Tuple[Path, ...]]:
         """
         Downloads an playlist from Deezer using the specified Playlist object.
@@ -186,14 +924,214 @@ def download_playlist(
             stream: If `true`, this method returns a generator object,
                 otherwise the downloaded files are returned as a tuple
                 that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                See [download_tracks()][deethon.session.Session.download_tracks].
+            prefetch: The number of tracks that are prepared ahead of
+                the downloads.
 
         Returns:
             The file paths.
         """
+        return self.download_tracks(
+            playlist.iter_tracks(return_exceptions=True), bitrate, stream,
+            max_workers, prefetch)
 
-        tracks = (self.download_track(track, bitrate)
-            for track in playlist.tracks)
+    def download_tracks(
+            self,
+            tracks: Iterable[Union[types.Track, Exception]],
+            bitrate: str = None,
+            stream: bool = False,
+            max_workers: Optional[int] = None,
+            prefetch: int = 4
+    ) -> Union[Generator[Union[Path, Exception], Any, None],
+               Tuple[Union[Path, Exception], ...]]:
+        """
+        Downloads several [Track][deethon.types.Track] objects.
+
+        While a track is downloaded, the available bitrates, albums and
+        covers of the next `prefetch` tracks are loaded in the background,
+        so the download of each track starts without waiting for them.
+
+        Args:
+            tracks: The [Track][deethon.types.Track] instances to download.
+                An exception in place of a track, e.g. from
+                `iter_tracks(return_exceptions=True)`, is handled like a
+                failed download.
+            bitrate: The preferred bitrate to download
+                (`FLAC`, `MP3_320`, `MP3_256`, `MP3_128`).
+            stream: If `true`, this method returns a generator object,
+                otherwise the downloaded files are returned as a tuple
+                that contains the file paths.
+            max_workers: The number of tracks to download concurrently.
+                If it is greater than 1, the tracks are downloaded in a
+                pool of worker threads and a track that fails, also while
+                its additional tags are loaded, does not stop the other
+                downloads: the raised exception is returned in place of
+                its file path.
+            prefetch: The number of tracks that are prepared ahead of
+                the downloads.
+
+        Returns:
+            The file paths in track order. If `stream` is `true` and
+            `max_workers` is greater than 1, the file paths are yielded
+            as soon as each track is finished.
+        """
+        tracks = self.prepare_tracks(tracks, bitrate, prefetch)
+        if not max_workers or max_workers == 1:
+            paths = (self.download_track(_checked(track), bitrate)
+                     for track in tracks)
+        elif stream:
+            paths = self._download_concurrently(tracks, bitrate, max_workers)
+        else:
+            paths = self._download_concurrently(tracks, bitrate, max_workers,
+                                                ordered=True)
 
         if stream:
-            return tracks
-        return tuple(tracks)
+            return paths
+        return tuple(paths)
+
+    def _download_concurrently(
+            self,
+            tracks: Iterable[_TrackOrError],
+            bitrate: str,
+            max_workers: int,
+            ordered: bool = False
+    ) -> Generator[Union[Path, Exception], Any, None]:
+        # Only a bounded number of tracks is submitted ahead, so that
+        # the tracks are consumed lazily. Tracks that failed to load are
+        # returned like failed downloads.
+        with ThreadPoolExecutor(max_workers) as executor:
+            pending = deque()
+            for track in tracks:
+                if isinstance(track, Exception):
+                    future = Future()
+                    future.set_exception(track)
+                else:
+                    future = executor.submit(self.download_track, track,
+                                             bitrate)
+                pending.append(future)
+                if len(pending) >= 2 * max_workers:
+                    if ordered:
+                        yield _result(pending.popleft())
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.remove(future)
+                            yield _result(future)
+            for future in pending if ordered else as_completed(pending):
+                yield _result(future)
+
+
+def _prefetched(track: _TrackOrError,
+                future: Optional[Future]) -> _TrackOrError:
+    # Errors are raised again when the track is downloaded.
+    if future is not None:
+        future.exception()
+    return track
+
+
+def _checked(track: _TrackOrError) -> types.Track:
+    if isinstance(track, Exception):
+        raise track
+    return track
+
+
+def _write_decrypted(chunks: Iterator[bytes],
+                     f: BinaryIO,
+                     track_id: int,
+                     offset: int,
+                     total: int,
+                     progress_callback: Optional[Callable]) -> None:
+    decrypter = utils.Decrypter(track_id, offset)
+    current = offset
+    decrypting = writing = 0.0
+    chunks = iter(chunks)
+    try:
+        while True:
+            chunk = next(chunks, None)
+            start = time.perf_counter()
+            data = decrypter.update(chunk) if chunk is not None \
+                else decrypter.finalize()
+            decrypted = time.perf_counter()
+            f.write(data)
+            decrypting += decrypted - start
+            writing += time.perf_counter() - decrypted
+            if data:
+                current += len(data)
+                if progress_callback:
+                    progress_callback(current, total)
+            if chunk is None:
+                break
+    finally:
+        metrics.observe("decrypt", decrypting, track_id)
+        metrics.observe("write", writing, track_id)
+        metrics.count("bytes", current - offset, track_id)
+
+
+def _result(future: Future) -> Union[Path, Exception]:
+    exception = future.exception()
+    return exception if exception else future.result()
+
+
+def _get_part_path(file_path: Path, quality: str) -> Path:
+    return file_path.with_name(f"{file_path.name}.{quality}.part")
+
+
+def _get_resume_offset(part_path: Path,
+                       ext: str) -> Tuple[int, Optional[int]]:
+    if not part_path.exists():
+        return 0, None
+    with part_path.open("rb") as f:
+        header_size = utils.read_tag_header_size(f, ext)
+    if header_size is None:
+        return 0, None
+    size = max(part_path.stat().st_size - header_size, 0)
+    return size - size % utils.Decrypter.STRIPE_SIZE, header_size
+
+
+def _get_total_size(response: requests.Response) -> int:
+    content_range = response.headers.get("Content-Range")
+    if response.status_code == 206 and content_range:
+        return int(content_range.rsplit("/", 1)[1])
+    return int(response.headers.get("Content-Length", 0))
+
+
+def _is_invalid_token(r: dict) -> bool:
+    return bool(r.get("error")) and "VALID_TOKEN_REQUIRED" in r["error"]
+
+
+# The errors of the unofficial API when the request rate is too high.
+_GW_QUOTA_ERRORS = ("QUOTA_ERROR", "RATE_LIMIT_EXCEEDED")
+
+
+def _is_gw_quota_error(r: Optional[dict]) -> bool:
+    return bool(r) and isinstance(r.get("error"), dict) and \
+        any(error in r["error"] for error in _GW_QUOTA_ERRORS)
+
+
+def _is_gw_overloaded(r: requests.Response) -> bool:
+    if is_overloaded(r):
+        return True
+    if not any(error.encode() in r.content for error in _GW_QUOTA_ERRORS):
+        return False
+    try:
+        return _is_gw_quota_error(r.json())
+    except ValueError:
+        return False
+
+
+def _raise_for_gw_error(method: str, r: dict) -> None:
+    error = r.get("error")
+    if not error:
+        return
+    if isinstance(error, dict):
+        name, message = next(iter(error.items()))
+    else:
+        name, message = "ERROR", error
+    raise errors.DeezerGatewayError(method, name, str(message))
+
+
+def _has_results(r: dict) -> bool:
+    # Errors of the unofficial API have the status 200, so only responses
+    # without an error and with results may be cached.
+    return not r.get("error") and bool(r.get("results"))
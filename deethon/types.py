@@ -1,24 +1,153 @@
 """This module contains all available type classes."""
 from __future__ import annotations
 
+import functools
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional, List, Dict, Any, ClassVar
+from typing import (TYPE_CHECKING, Optional, List, Dict, Any, ClassVar,
+                    Iterator, Sequence, Union)
 
 import requests
 
-from . import consts, errors
+from . import consts, errors, metrics
+from .cache import LRUCache, get_cover_cache, get_metadata_cache
+from .client import get_client
+from .ratelimit import is_overloaded
 
 if TYPE_CHECKING:
     from .session import Session
 
 
-class Album:
+class _Cached(type):
+    """
+    Return the cached instance with the specified ID if it exists,
+    otherwise create a new instance and cache it. `__init__` is only
+    called when a new instance is created.
+    """
+
+    def __call__(cls, content_id: int):
+        return cls.cache.get_or_load(
+            content_id, lambda: super(_Cached, cls).__call__(content_id))
+
+    def _from_json(cls, r: Dict[str, Any]):
+        _raise_for_error(r)
+        instance = cls.cache.get(r["id"])
+        if instance is None:
+            instance = cls.__new__(cls)
+        instance._parse(r)
+        cls.cache.put(r["id"], instance)
+        return instance
+
+
+def _raise_for_error(r: Dict[str, Any]) -> None:
+    if "error" in r:
+        raise errors.DeezerApiError(r["error"]["type"],
+                                    r["error"]["message"],
+                                    r["error"]["code"])
+
+
+def _is_quota_error(r: Optional[Dict[str, Any]]) -> bool:
+    # Error 4 is "Quota limit exceeded" and 700 is "Service busy".
+    return bool(r) and "error" in r and r["error"].get("code") in (4, 700)
+
+
+def _is_quota_exceeded(r: requests.Response) -> bool:
+    if is_overloaded(r):
+        return True
+    return b'"error"' in r.content[:16] and _is_quota_error(r.json())
+
+
+def _get_json(kind: str, content_id: int) -> Dict[str, Any]:
+    metadata_cache = get_metadata_cache()
+    if metadata_cache is not None:
+        r = metadata_cache.get(kind, content_id)
+        if r is not None:
+            return r
+    with metrics.timed("metadata", kind=kind):
+        r = get_client().get(f"{consts.LEGACY_API_URL}{kind}/{content_id}",
+                             overloaded=_is_quota_exceeded).json()
+    _raise_for_error(r)
+    if metadata_cache is not None:
+        metadata_cache.set(kind, content_id, r)
+    return r
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date(date: str) -> Optional[datetime]:
+    # The instances share the datetime objects of equal dates.
+    if date == "0000-00-00":
+        return None
+    return datetime.strptime(date, "%Y-%m-%d")
+
+
+def _track_ids(r: Dict[str, Any]) -> array:
+    return array("q", [track["id"] for track in r["tracks"]["data"]])
+
+
+_intern = sys.intern
+
+_PAGE_SIZE = 500
+
+
+def _iter_track_ids(kind: str, content_id: int,
+                    first_page: Sequence[int],
+                    total: int) -> Iterator[int]:
+    yield from first_page
+    if len(first_page) >= total:
+        return
+    url = f"{consts.LEGACY_API_URL}{kind}/{content_id}/tracks" \
+          f"?index={len(first_page)}&limit={_PAGE_SIZE}"
+    while url:
+        r = get_client().get(url, overloaded=_is_quota_exceeded).json()
+        _raise_for_error(r)
+        for track in r["data"]:
+            yield track["id"]
+        url = r.get("next")
+
+
+def _load_track(track_id: int) -> Union[Track, Exception]:
+    try:
+        return Track(track_id)
+    except Exception as e:  # pylint: disable=broad-except
+        return e
+
+
+def _iter_tracks(track_ids: Iterator[int], prefetch: int,
+                 return_exceptions: bool) -> Iterator[Union[Track, Exception]]:
+    load = _load_track if return_exceptions else Track
+    if prefetch < 1:
+        for track_id in track_ids:
+            yield load(track_id)
+        return
+    with ThreadPoolExecutor(prefetch) as executor:
+        window = deque()
+        for track_id in track_ids:
+            window.append(executor.submit(load, track_id))
+            if len(window) > prefetch:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+_MORE_TAGS = ("md5_origin", "media_version", "composer", "author",
+              "copyright", "lyrics", "lyrics_sync", "lyrics_copyrights",
+              "lyrics_writers")
+
+
+def _intern_all(names: Optional[List[str]]) -> Optional[List[str]]:
+    return None if names is None else [_intern(name) for name in names]
+
+
+class Album(metaclass=_Cached):
     """
     The Album class contains several information about an album.
 
     Attributes:
         artist: The main artist of the album.
-        basic_tracks_data: A list that contains basic tracks data.
+        cache: The [LRUCache][deethon.cache.LRUCache] of album instances.
         cover_small_link: The link for the album cover in small size.
         cover_medium_link: The link for the album cover in medium size.
         cover_big_link: The link for the album cover in big size.
@@ -32,14 +161,20 @@ class Album:
         release_date: The release date of the album.
         title: The title of the album.
         total_tracks: The total number of tracks in the album.
+        track_ids: The IDs of the tracks in the first page of the
+            API response.
         upc: The Universal Product Code (UPC) of the album.
 
     """
 
-    _cache: ClassVar[Dict[int, Album]] = {}
+    __slots__ = ("artist", "cover_small_link", "cover_medium_link",
+                 "cover_big_link", "cover_xl_link", "duration", "genres",
+                 "id", "label", "record_type", "release_date", "title",
+                 "total_tracks", "track_ids", "upc")
+
+    cache: ClassVar[LRUCache] = LRUCache(maxsize=1024, ttl=3600)
 
     artist: str
-    basic_tracks_data: List[Dict[str, Any]]
     cover_small_link: str
     cover_medium_link: str
     cover_big_link: str
@@ -48,96 +183,88 @@ class Album:
     genres: List[str]
     id: int
     label: str
-    link: str
     record_type: str
     release_date: datetime
     title: str
     total_tracks: int
+    track_ids: array
     upc: str
 
-    _cover_small: Optional[bytes] = None
-    _cover_medium: Optional[bytes] = None
-    _cover_big: Optional[bytes] = None
-    _cover_xl: Optional[bytes] = None
-
-    def __new__(cls, album_id: int):
+    def __init__(self, album_id: int):
         """
-        If an album instance with the specified album ID already exists,
-        this method returns the cached instance, otherwise a new album
-        instance is created.
+        Create a new album instance with the specified album ID.
 
         Args:
             album_id: The Deezer album ID.
 
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
+
         """
-        if album_id not in cls._cache.keys():
-            cls._cache[album_id] = super(Album, cls).__new__(cls)
-        return cls._cache[album_id]
+        self._parse(_get_json("album", album_id))
 
-    def __init__(self, album_id: int):
+    @classmethod
+    def from_json(cls, r: Dict[str, Any]) -> Album:
         """
-        Create a new album instance with the specified album ID.
+        Create an album instance from a response of Deezer's official API.
 
         Args:
-            album_id: The Deezer album ID.
+            r: The decoded JSON response of the `album` endpoint.
 
         Raises:
-            DeezerApiError: The Deezer API request replied with an error.
+            DeezerApiError: The response contains an error.
 
         """
-        r = requests.get(f"https://api.deezer.com/album/{album_id}").json()
-        if "error" in r:
-            raise errors.DeezerApiError(r["error"]["type"],
-                                        r["error"]["message"],
-                                        r["error"]["code"])
-
-        self.artist = r["artist"]["name"]
-        self.basic_tracks_data = r["tracks"]["data"]
+        return cls._from_json(r)
+
+    def _parse(self, r: Dict[str, Any]) -> None:
+        self.artist = _intern(r["artist"]["name"])
+        self.track_ids = _track_ids(r)
         self.cover_small_link = r["cover_small"]
         self.cover_medium_link = r["cover_medium"]
         self.cover_big_link = r["cover_big"]
         self.cover_xl_link = r["cover_xl"]
         self.duration = r["duration"]
-        self.genres = [genre["name"] for genre in r["genres"]["data"]]
+        self.genres = [_intern(genre["name"])
+                       for genre in r["genres"]["data"]]
         self.id = r["id"]
-        self.label = r["label"]
-        self.link = r["link"]
-        self.record_type = r["record_type"]
-        if r['release_date'] != '0000-00-00':
-            self.release_date = datetime.strptime(r["release_date"], "%Y-%m-%d")
-        else:
-            self.release_date = None
+        self.label = _intern(r["label"])
+        self.record_type = _intern(r["record_type"])
+        self.release_date = _parse_date(r["release_date"])
         self.title = r["title"]
         self.total_tracks = r["nb_tracks"]
         self.upc = r["upc"]
 
+    @property
+    def link(self) -> str:
+        """The Deezer link of the album."""
+        return f"https://www.deezer.com/album/{self.id}"
+
+    @property
+    def basic_tracks_data(self) -> List[Dict[str, int]]:
+        """The tracks in the first page of the API response as
+        `{"id": track_id}` dictionaries, see `track_ids`."""
+        return [{"id": track_id} for track_id in self.track_ids]
+
     @property
     def cover_small(self) -> bytes:
         """The album cover in small size."""
-        if not self._cover_small:
-            self._cover_small = requests.get(self.cover_small_link).content
-        return self._cover_small
+        return get_cover_cache().get(self.cover_small_link)
 
     @property
     def cover_medium(self) -> bytes:
         """The album cover in medium size."""
-        if not self._cover_medium:
-            self._cover_medium = requests.get(self.cover_medium_link).content
-        return self._cover_medium
+        return get_cover_cache().get(self.cover_medium_link)
 
     @property
     def cover_big(self) -> bytes:
         """The album cover in big size."""
-        if not self._cover_big:
-            self._cover_big = requests.get(self.cover_big_link).content
-        return self._cover_big
+        return get_cover_cache().get(self.cover_big_link)
 
     @property
     def cover_xl(self) -> bytes:
         """The album cover in xl size."""
-        if not self._cover_xl:
-            self._cover_xl = requests.get(self.cover_xl_link).content
-        return self._cover_xl
+        return get_cover_cache().get(self.cover_xl_link)
 
     @property
     def tracks(self) -> list:
@@ -145,10 +272,44 @@ def tracks(self) -> list:
         A list of [Track][deethon.types.Track] objects for each
         track in the album.
         """
-        return [Track(x["id"]) for x in self.basic_tracks_data]
+        return list(self.iter_tracks())
 
+    def iter_tracks(
+            self,
+            prefetch: int = 8,
+            return_exceptions: bool = False
+    ) -> Iterator[Union[Track, Exception]]:
+        """
+        Iterate over the tracks of the album. The tracks are created on
+        demand and further pages of the track list are requested when
+        they are reached.
 
-class Track:
+        Args:
+            prefetch: The number of tracks that are requested ahead in
+                the background.
+            return_exceptions: If `true`, the exception of a track that
+                cannot be loaded is yielded in place of the track instead
+                of being raised.
+
+        Returns:
+            An iterator of [Track][deethon.types.Track] objects.
+        """
+        return _iter_tracks(self.iter_track_ids(), prefetch,
+                            return_exceptions)
+
+    def iter_track_ids(self) -> Iterator[int]:
+        """
+        Iterate over the track IDs of the album. Further pages of the
+        track list are requested when they are reached.
+
+        Returns:
+            An iterator of track IDs.
+        """
+        return _iter_track_ids("album", self.id, self.track_ids,
+                               self.total_tracks)
+
+
+class Track(metaclass=_Cached):
     """
     The Track class contains several information about a track.
 
@@ -157,6 +318,7 @@ class Track:
         artist: The main artist of the track.
         artists: A list of artists featured in the track.
         bpm: Beats per minute of the track.
+        cache: The [LRUCache][deethon.cache.LRUCache] of track instances.
         disk_number: The disc number of the track.
         duration: The duration of the track.
         id: The Deezer ID of the track.
@@ -182,11 +344,18 @@ class Track:
     !!! Info
         `md5_origin`, `media_version`, `composer`, `author` and all
         `lyrics*` tags are only set after
-        [add_more_tags()][deethon.types.Track.add_more_tags] is called.
-        Defaults to `None`.
+        [add_more_tags()][deethon.types.Track.add_more_tags] or
+        [Session.add_more_tags_bulk()][deethon.session.Session.add_more_tags_bulk]
+        is called. Defaults to `None`. If the bulk request skipped the
+        lyrics, they are set by [add_lyrics()][deethon.types.Track.add_lyrics].
     """
 
-    _cache: ClassVar[Dict[int, Track]] = {}
+    __slots__ = ("album_id", "artist", "artists", "bpm", "disk_number",
+                 "duration", "id", "isrc", "number", "preview_link", "rank",
+                 "_gain", "_lyrics_id", "release_date", "title",
+                 "title_short", *_MORE_TAGS)
+
+    cache: ClassVar[LRUCache] = LRUCache(maxsize=4096, ttl=3600)
 
     album_id: int
     artist: str
@@ -196,11 +365,9 @@ class Track:
     duration: int
     id: int
     isrc: str
-    link: str
     number: int
     preview_link: str
     rank: int
-    replaygain_track_gain: str
     release_date: datetime
     title: str
     title_short: str
@@ -215,57 +382,68 @@ class Track:
     lyrics_copyrights: Optional[str]
     lyrics_writers: Optional[List[str]]
 
-    def __new__(cls, track_id: int):
+    def __init__(self, track_id: int):
         """
-        If a track instance with the specified track ID already exists,
-        this method returns the cached instance, otherwise a new track
-        instance is created and cached.
+        Create a new track instance with the specified track ID.
 
         Args:
-            track_id: The Deezer album ID.
+            track_id: The Deezer track ID.
+
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
 
         """
-        if track_id not in cls._cache.keys():
-            cls._cache[track_id] = super(Track, cls).__new__(cls)
-        return cls._cache[track_id]
+        self._parse(_get_json("track", track_id))
 
-    def __init__(self, track_id: int):
+    @classmethod
+    def from_json(cls, r: Dict[str, Any]) -> Track:
         """
-        Create a new track instance with the specified track ID.
+        Create a track instance from a response of Deezer's official API.
 
         Args:
-            track_id: The Deezer track ID.
+            r: The decoded JSON response of the `track` endpoint.
 
         Raises:
-            DeezerApiError: The Deezer API request replied with an error.
+            DeezerApiError: The response contains an error.
 
         """
-        r = requests.get(f"https://api.deezer.com/track/{track_id}").json()
-        if "error" in r:
-            raise errors.DeezerApiError(r["error"]["type"],
-                                        r["error"]["message"],
-                                        r["error"]["code"])
+        return cls._from_json(r)
+
+    def __getattr__(self, name: str) -> Any:
+        # The additional tags are None until they are added.
+        if name in _MORE_TAGS or name == "_lyrics_id":
+            return None
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'")
 
+    def _parse(self, r: Dict[str, Any]) -> None:
         self.album_id: int = r["album"]["id"]
-        self.artist = r["artist"]["name"]
-        self.artists = [artist["name"] for artist in r['contributors']]
+        self.artist = _intern(r["artist"]["name"])
+        self.artists = [_intern(artist["name"])
+                        for artist in r['contributors']]
         self.bpm = r["bpm"]
         self.disk_number = r["disk_number"]
         self.duration = r["duration"]
         self.id = r["id"]
         self.isrc = r["isrc"]
-        self.link = r["link"]
         self.number = r["track_position"]
         self.preview_link = r["preview"]
         self.rank = r["rank"]
-        self.replaygain_track_gain = f"{((r['gain'] + 18.4) * -1):.2f} dB"
-        if r['release_date'] != '0000-00-00':
-            self.release_date = datetime.strptime(r["release_date"], "%Y-%m-%d")
-        else:
-            self.release_date = None
+        self._gain = r["gain"]
+        self.release_date = _parse_date(r["release_date"])
         self.title = r["title"]
         self.title_short = r["title_short"]
 
+    @property
+    def link(self) -> str:
+        """The Deezer link of the track."""
+        return f"https://www.deezer.com/track/{self.id}"
+
+    @property
+    def replaygain_track_gain(self) -> str:
+        """The Replay Gain value of the track."""
+        return f"{((self._gain + 18.4) * -1):.2f} dB"
+
     @property
     def album(self) -> Album:
         """Return an Album instance."""
@@ -280,39 +458,74 @@ def add_more_tags(self, session: Session) -> None:
                 to the Deezer API.
 
         """
-        r = session.get_api(
-            consts.METHOD_PAGE_TRACK, {"sng_id": self.id}
-        )
+        with metrics.timed("add_more_tags", self.id):
+            r = session.get_api(consts.METHOD_PAGE_TRACK, {"sng_id": self.id})
+        self._parse_more_tags(r)
+
+    def add_lyrics(self, session: Session) -> None:
+        """
+        Adds the lyrics of a track whose additional tags were added by
+        [Session.add_more_tags_bulk()][deethon.session.Session.add_more_tags_bulk]
+        with `lyrics=False`. Nothing is requested if the track has no
+        lyrics or if they were already added.
+
+        Args:
+            session: A [Session][deethon.session.Session] object is required to connect
+                to the Deezer API.
+
+        """
+        if not self._lyrics_id:
+            return
+        with metrics.timed("add_more_tags", self.id):
+            r = session.get_api(consts.METHOD_GET_LYRICS, {"sng_id": self.id})
+        self._parse_lyrics(r)
 
+    def _parse_more_tags(self, r: Dict[str, Any], lyrics: bool = True) -> None:
         self.md5_origin = r["DATA"]["MD5_ORIGIN"]
         self.media_version = r["DATA"]["MEDIA_VERSION"]
         if isinstance(r["DATA"]["SNG_CONTRIBUTORS"], list):
             self.composer = None
             self.author = None
         else:
-            self.composer = r["DATA"]["SNG_CONTRIBUTORS"].get("composer")
-            self.author = r["DATA"]["SNG_CONTRIBUTORS"].get("author")
+            self.composer = _intern_all(
+                r["DATA"]["SNG_CONTRIBUTORS"].get("composer"))
+            self.author = _intern_all(
+                r["DATA"]["SNG_CONTRIBUTORS"].get("author"))
         self.copyright = r["DATA"]["COPYRIGHT"]
 
         if "LYRICS" in r.keys():
-            self.lyrics = r["LYRICS"].get('LYRICS_TEXT')
-            self.lyrics_sync = r["LYRICS"].get('LYRICS_SYNC_JSON')
-            self.lyrics_copyrights = r["LYRICS"].get('LYRICS_COPYRIGHTS')
-            self.lyrics_writers = r["LYRICS"].get('LYRICS_WRITERS').split(', ')
-        else:
+            self._parse_lyrics(r["LYRICS"])
+        elif lyrics or self.lyrics is None:
+            # Lyrics that were already added are kept. Without `lyrics`,
+            # they are requested later by add_lyrics().
             self.lyrics = None
             self.lyrics_sync = None
             self.lyrics_copyrights = None
             self.lyrics_writers = None
+            self._lyrics_id = None if lyrics else \
+                int(r["DATA"].get("LYRICS_ID") or 0) or None
+
+    def _parse_lyrics(self, r: Dict[str, Any]) -> None:
+        self.lyrics = r.get('LYRICS_TEXT')
+        self.lyrics_sync = r.get('LYRICS_SYNC_JSON')
+        self.lyrics_copyrights = r.get('LYRICS_COPYRIGHTS')
+        self.lyrics_writers = r.get('LYRICS_WRITERS').split(', ')
+        self._lyrics_id = None
 
 
-class Playlist:
+class Playlist(metaclass=_Cached):
 
-    _cache: ClassVar[Dict[int, Playlist]] = {}
+    __slots__ = ("id", "title", "track_ids", "description", "duration",
+                 "public", "is_loved_track", "collaborative", "rating",
+                 "total_tracks", "unseen_track_count", "fans", "share",
+                 "picture", "picture_small_link", "picture_medium_link",
+                 "picture_big_link", "picture_xl_link", "checksum")
+
+    cache: ClassVar[LRUCache] = LRUCache(maxsize=256, ttl=3600)
 
     id: int
     title: str
-    basic_tracks_data: List[Dict[str, Any]]
+    track_ids: array
     description: str
     duration: int
     public: bool
@@ -322,52 +535,45 @@ class Playlist:
     total_tracks: int
     unseen_track_count: int
     fans: int
-    link: str
     share: str
     picture: str
+    picture_small_link: str
+    picture_medium_link: str
+    picture_big_link: str
+    picture_xl_link: str
     checksum: str
 
-    _picture_small: Optional[bytes] = None
-    _picture_medium: Optional[bytes] = None
-    _picture_big: Optional[bytes] = None
-    _picture_xl: Optional[bytes] = None
-
-    def __new__(cls, playlist_id: int):
+    def __init__(self, playlist_id: int):
         """
-        If an playlist instance with the specified playlist ID already exists,
-        this method returns the cached instance, otherwise a new playlist
-        instance is created.
+        Create a new playlist instance with the specified playlist ID.
         Args:
             playlist_id: The Deezer playlist ID.
+        Raises:
+            DeezerApiError: The Deezer API request replied with an error.
         """
-        if playlist_id not in cls._cache.keys():
-            cls._cache[playlist_id] = super(Playlist, cls).__new__(cls)
-        return cls._cache[playlist_id]
+        self._parse(_get_json("playlist", playlist_id))
 
-    def __init__(self, playlist_id: int):
+    @classmethod
+    def from_json(cls, r: Dict[str, Any]) -> Playlist:
         """
-        Create a new playlist instance with the specified playlist ID.
+        Create a playlist instance from a response of Deezer's official API.
         Args:
-            playlist_id: The Deezer playlist ID.
+            r: The decoded JSON response of the `playlist` endpoint.
         Raises:
-            DeezerApiError: The Deezer API request replied with an error.
+            DeezerApiError: The response contains an error.
         """
-        r = requests.get(f"https://api.deezer.com/playlist/{playlist_id}").json()
-        if "error" in r:
-            raise errors.DeezerApiError(r["error"]["type"],
-                                        r["error"]["message"],
-                                        r["error"]["code"])
+        return cls._from_json(r)
 
+    def _parse(self, r: Dict[str, Any]) -> None:
         self.id = r['id']
         self.title = r['title']
-        self.basic_tracks_data = r['tracks']['data']
+        self.track_ids = _track_ids(r)
         self.description = r['description']
         self.duration = r['duration']
         self.public = r['public']
         self.is_loved_track = r['is_loved_track']
         self.collaborative = r['collaborative']
         self.total_tracks = r['nb_tracks']
-        self.link = r['link']
         self.share = r['share']
         self.picture = r['picture']
         self.picture_small_link = r['picture_small']
@@ -376,39 +582,75 @@ def __init__(self, playlist_id: int):
         self.picture_xl_link = r['picture_xl']
         self.checksum = r['checksum']
 
+    @property
+    def link(self) -> str:
+        """The Deezer link of the playlist."""
+        return f"https://www.deezer.com/playlist/{self.id}"
+
+    @property
+    def basic_tracks_data(self) -> List[Dict[str, int]]:
+        """The tracks in the first page of the API response as
+        `{"id": track_id}` dictionaries, see `track_ids`."""
+        return [{"id": track_id} for track_id in self.track_ids]
+
     @property
     def picture_small(self) -> bytes:
         """The album picture in small size."""
-        if not self._picture_small:
-            self._picture_small = requests.get(self.picture_small_link).content
-        return self._picture_small
+        return get_cover_cache().get(self.picture_small_link)
 
     @property
     def picture_medium(self) -> bytes:
         """The album picture in medium size."""
-        if not self._picture_medium:
-            self._picture_medium = requests.get(
-                self.picture_medium_link).content
-        return self._picture_medium
+        return get_cover_cache().get(self.picture_medium_link)
 
     @property
     def picture_big(self) -> bytes:
         """The album picture in big size."""
-        if not self._picture_big:
-            self._picture_big = requests.get(self.picture_big_link).content
-        return self._picture_big
+        return get_cover_cache().get(self.picture_big_link)
 
     @property
     def picture_xl(self) -> bytes:
         """The album picture in xl size."""
-        if not self._picture_xl:
-            self._picture_xl = requests.get(self.picture_xl_link).content
-        return self._picture_xl
+        return get_cover_cache().get(self.picture_xl_link)
 
     @property
     def tracks(self) -> list:
         """
         A list of [Track][deethon.types.Track] objects for each
-        track in the album.
+        track in the playlist.
+        """
+        return list(self.iter_tracks())
+
+    def iter_tracks(
+            self,
+            prefetch: int = 8,
+            return_exceptions: bool = False
+    ) -> Iterator[Union[Track, Exception]]:
+        """
+        Iterate over the tracks of the playlist. The tracks are created
+        on demand and further pages of the track list are requested when
+        they are reached, so large playlists are iterated completely.
+
+        Args:
+            prefetch: The number of tracks that are requested ahead in
+                the background.
+            return_exceptions: If `true`, the exception of a track that
+                cannot be loaded is yielded in place of the track instead
+                of being raised.
+
+        Returns:
+            An iterator of [Track][deethon.types.Track] objects.
+        """
+        return _iter_tracks(self.iter_track_ids(), prefetch,
+                            return_exceptions)
+
+    def iter_track_ids(self) -> Iterator[int]:
+        """
+        Iterate over the track IDs of the playlist. Further pages of the
+        track list are requested when they are reached.
+
+        Returns:
+            An iterator of track IDs.
         """
-        return [Track(x["id"]) for x in self.basic_tracks_data]
+        return _iter_track_ids("playlist", self.id, self.track_ids,
+                               self.total_tracks)
@@ -5,17 +5,28 @@
 from __future__ import annotations
 
 import hashlib
+import io
+import os
+import re
+import time
 from binascii import a2b_hex, b2a_hex
 from pathlib import Path
-from typing import Iterator, TYPE_CHECKING, Generator, Any
+from typing import (Iterator, TYPE_CHECKING, Generator, Any, Tuple, Optional,
+                    BinaryIO)
 
-from Crypto.Cipher import AES, Blowfish
-from mutagen.flac import FLAC, Picture
-from mutagen.id3 import ID3, Frames
+from . import consts, errors
+
+# pycryptodome and mutagen are imported by the functions that use them,
+# so that importing deethon for metadata lookups stays fast.
+# pylint: disable=import-outside-toplevel
 
 if TYPE_CHECKING:
+    from mutagen.flac import Picture, VCFLACDict
+    from mutagen.id3 import ID3
     from .types import Track
 
+_IV = a2b_hex("0001020304050607")
+
 
 def md5hex(data: bytes) -> bytes:
     return hashlib.md5(data).hexdigest().encode()
@@ -31,6 +42,26 @@ def get_quality(bitrate: str) -> str:
     return "1"
 
 
+def parse_url(url: str) -> Tuple[str, int]:
+    """
+    Extract the content type and the ID from a Deezer url.
+
+    Args:
+        url: A Deezer url, e.g. `https://www.deezer.com/track/2104162`.
+
+    Returns:
+        The content type (e.g. `track`, `album` or `playlist`) and the ID.
+
+    Raises:
+        InvalidUrlError: The specified URL is not a valid deezer link.
+    """
+    match = re.match(
+        r"https?://(?:www\.)?deezer\.com/(?:\w+/)?(\w+)/(\d+)", url)
+    if not match:
+        raise errors.InvalidUrlError(url)
+    return match.group(1), int(match.group(2))
+
+
 def get_file_path(track: Track, ext: str) -> Path:
     """
     Generate a file path using a Track object.
@@ -71,35 +102,194 @@ def get_stream_url(track: Track, quality: str) -> str:
     data = b"\xa4".join([md5hex(data), data]) + b"\xa4"
     if len(data) % 16:
         data += b"\x00" * (16 - len(data) % 16)
+    from Crypto.Cipher import AES
     c = AES.new("jo6aey6haid2Teih".encode(), AES.MODE_ECB)
     hashs = b2a_hex(c.encrypt(data)).decode()
-    return f"https://e-cdns-proxy-{track.md5_origin[0]}.dzcdn.net/mobile/1/{hashs}"
+    return consts.CDN_URL.format(track.md5_origin[0]) + hashs
 
 
-def decrypt_file(input_data: Iterator, track_id: int) -> Generator[bytes, Any, None]:
+def get_blowfish_key(track_id: int) -> bytes:
+    """
+    Generate the Blowfish key that is used to decrypt a track.
+
+    Args:
+        track_id: The id of the track to be decrypted.
+
+    Returns:
+        The Blowfish key.
+    """
+    h = md5hex(str(track_id).encode())
+    return bytes(h[i] ^ h[i + 16] ^ b"g4el58wc0zvf9na1"[i] for i in range(16))
+
+
+class Decrypter:
+    """
+    Decrypts an encrypted track that is passed in chunks of any size.
+
+    Deezer encrypts every third 2048 bytes segment of a track with
+    Blowfish in CBC mode. The Decrypter sets up the cipher only once and
+    decrypts all complete segments of the buffered data in a single call.
+
+    ```python
+    decrypter = Decrypter(track_id)
+    for chunk in chunks:
+        f.write(decrypter.update(chunk))
+    f.write(decrypter.finalize())
+    ```
+    """
+
+    SEGMENT_SIZE: int = 2048
+    """The size of an encryption segment."""
+
+    STRIPE_SIZE: int = 3 * SEGMENT_SIZE
+    """The size of an encrypted segment and the two following segments."""
+
+    def __init__(self, track_id: int, offset: int = 0):
+        """
+        Create a new Decrypter instance.
+
+        Args:
+            track_id: The id of the track to be decrypted.
+            offset: The position in the encrypted track where the input
+                starts. It must be a multiple of 2048.
+        """
+        if offset % self.SEGMENT_SIZE:
+            raise ValueError("The offset must be a multiple of 2048.")
+        from Crypto.Cipher import Blowfish
+        from Crypto.Util.strxor import strxor
+        self._strxor = strxor
+        self._cipher = Blowfish.new(get_blowfish_key(track_id),
+                                    Blowfish.MODE_ECB)
+        self._segment = offset // self.SEGMENT_SIZE
+        self._buffer = bytearray()
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Decrypt the next chunk of the track.
+
+        Args:
+            data: The next chunk of the encrypted track.
+
+        Returns:
+            The decrypted data of all complete segments. Data of an
+            incomplete segment is returned by a later call.
+        """
+        size = self.SEGMENT_SIZE
+        if not self._buffer and len(data) % size == 0:
+            buffer = bytearray(data)
+        else:
+            self._buffer += data
+            end = len(self._buffer) - len(self._buffer) % size
+            buffer = self._buffer[:end]
+            del self._buffer[:end]
+        if not buffer:
+            return b""
+
+        view = memoryview(buffer)
+        first = -self._segment % 3 * size
+        positions = range(first, len(buffer), 3 * size)
+        self._segment += len(buffer) // size
+        if not positions:
+            return bytes(buffer)
+
+        # CBC decryption: every plaintext block is the ECB decryption
+        # of its ciphertext block XOR the previous ciphertext block, or
+        # the IV for the first block of a segment.
+        encrypted = b"".join(view[p:p + size] for p in positions)
+        previous = b"".join(_IV + view[p:p + size - 8] for p in positions)
+        decrypted = self._strxor(self._cipher.decrypt(encrypted), previous)
+        for i, p in enumerate(positions):
+            view[p:p + size] = decrypted[i * size:(i + 1) * size]
+        return bytes(buffer)
+
+    def finalize(self) -> bytes:
+        """
+        Finish the decryption.
+
+        Returns:
+            The remaining data of an incomplete last segment, which is
+            not encrypted.
+        """
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def decrypt_file(input_data: Iterator[bytes],
+                 track_id: int,
+                 offset: int = 0) -> Generator[bytes, Any, None]:
     """
     Decrypt an encrypted track.
 
     Args:
-        input_data: The input stream must have a chunk size of 2048.
+        input_data: The encrypted input stream. The chunks may have any size.
         track_id: The id of the track to be decrypted.
+        offset: The position in the encrypted track where the input
+            stream starts. It must be a multiple of 2048.
 
     Returns:
         A Generator object containing the decrypted data
     """
-    h = md5hex(str(track_id).encode())
-    key = "".join(
-        chr(h[i] ^ h[i + 16] ^ b"g4el58wc0zvf9na1"[i]) for i in range(16))
-    seg = 0
+    decrypter = Decrypter(track_id, offset)
     for data in input_data:
-        if (seg % 3) == 0 and len(data) == 2048:
-            data = Blowfish.new(key.encode(), Blowfish.MODE_CBC,
-                                a2b_hex("0001020304050607")).decrypt(data)
-        seg += 1
+        data = decrypter.update(data)
+        if data:
+            yield data
+    data = decrypter.finalize()
+    if data:
         yield data
 
 
-def tag(file_path: Path, track: Track) -> None:
+def decrypt_into(file_path: str,
+                 position: int,
+                 data: bytes,
+                 track_id: int,
+                 offset: int) -> int:
+    """
+    Decrypt a part of an encrypted track and write it into an existing
+    file at the given position. The function does not share any state,
+    so parts of the same track can be decrypted in separate processes.
+
+    Args:
+        file_path: The path of the file.
+        position: The position in the file where the decrypted data is
+            written.
+        data: The encrypted data. It must end at a segment boundary
+            unless it is the end of the track.
+        track_id: The id of the track to be decrypted.
+        offset: The position in the encrypted track where the data
+            starts. It must be a multiple of 2048.
+
+    Returns:
+        The number of bytes written.
+    """
+    return _decrypt_into(file_path, position, data, track_id, offset)[0]
+
+
+def _decrypt_into(file_path: str,
+                  position: int,
+                  data: bytes,
+                  track_id: int,
+                  offset: int) -> Tuple[int, float, float]:
+    # Also return the durations of the decryption and the write, which
+    # an executor in another process cannot report to the metrics.
+    start = time.perf_counter()
+    decrypter = Decrypter(track_id, offset)
+    data = decrypter.update(data) + decrypter.finalize()
+    decrypted = time.perf_counter()
+    fd = os.open(file_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "pwrite"):
+            os.pwrite(fd, data, position)
+        else:  # Windows
+            os.lseek(fd, position, os.SEEK_SET)
+            os.write(fd, data)
+    finally:
+        os.close(fd)
+    return len(data), decrypted - start, time.perf_counter() - decrypted
+
+
+def tag(file_path: Path, track: Track, ext: Optional[str] = None) -> None:
     """
     Tag the music file at the given file path using the specified
     [Track][deethon.types.Track] instance.
@@ -107,68 +297,349 @@ def tag(file_path: Path, track: Track) -> None:
     Args:
         file_path (Path): The music file to be tagged
         track: The [Track][deethon.types.Track] instance to be used for tagging.
+        ext: The file extension that determines the tag format
+            (`.flac` or `.mp3`). Defaults to the suffix of `file_path`.
     """
-    ext = file_path.suffix
+    ext = ext or file_path.suffix
 
     if ext == ".mp3":
-        tags = ID3()
-        tags.clear()
-
-        tags.add(Frames["TALB"](encoding=3, text=track.album.title))
-        tags.add(Frames["TBPM"](encoding=3, text=str(track.bpm)))
-        tags.add(Frames["TCON"](encoding=3, text=track.album.genres))
-        tags.add(Frames["TCOP"](encoding=3, text=track.copyright))
-        tags.add(Frames["TDAT"](encoding=3,
-                                text=track.release_date.strftime("%d%m")))
-        tags.add(Frames["TIT2"](encoding=3, text=track.title))
-        tags.add(Frames["TPE1"](encoding=3, text=track.artist))
-        tags.add(Frames["TPE2"](encoding=3, text=track.album.artist))
-        tags.add(Frames["TPOS"](encoding=3, text=str(track.disk_number)))
-        tags.add(Frames["TPUB"](encoding=3, text=track.album.label))
-        tags.add(Frames["TRCK"](encoding=3,
-                                text=f"{track.number}/{track.album.total_tracks}"))
-        tags.add(Frames["TSRC"](encoding=3, text=track.isrc))
-        tags.add(Frames["TYER"](encoding=3, text=str(track.release_date.year)))
-
-        tags.add(Frames["TXXX"](encoding=3,
-                                desc="replaygain_track_gain",
-                                text=str(track.replaygain_track_gain)))
-
-        if track.lyrics:
-            tags.add(Frames["USLT"](encoding=3,
-                                    text=track.lyrics))
-
-        tags.add(Frames["APIC"](encoding=3,
-                                mime="image/jpeg",
-                                type=3,
-                                desc="Cover",
-                                data=track.album.cover_xl))
-
-        tags.save(file_path, v2_version=3)
+        _get_id3(track).save(file_path, v2_version=3)
 
     else:
+        from mutagen.flac import FLAC
         tags = FLAC(file_path)
         tags.clear()
-        tags["album"] = track.album.title
-        tags["albumartist"] = track.album.artist
-        tags["artist"] = track.artist
-        tags["bpm"] = str(track.bpm)
-        tags["copyright"] = track.copyright
-        tags["date"] = track.release_date.strftime("%Y-%m-%d")
-        tags["genre"] = track.album.genres
-        tags["isrc"] = track.isrc
-        if track.lyrics:
-            tags["lyrics"] = track.lyrics
-        tags["replaygain_track_gain"] = str(track.replaygain_track_gain)
-        tags["title"] = track.title
-        tags["tracknumber"] = str(track.number)
-        tags["year"] = str(track.release_date.year)
-
-        cover = Picture()
-        cover.type = 3
-        cover.data = track.album.cover_xl
-        cover.width = 1000
-        cover.height = 1000
+        _set_vorbis_comment(tags, track)
         tags.clear_pictures()
-        tags.add_picture(cover)
+        tags.add_picture(_get_cover(track))
         tags.save(deleteid3=True)
+
+
+def get_tag_header(track: Track, ext: str) -> bytes:
+    """
+    Create the tags of a track that are written in front of its audio
+    data, so that the file does not have to be rewritten for tagging.
+
+    For MP3 files, this is a complete ID3v2 tag. For FLAC files, these
+    are the `fLaC` marker, a placeholder of the STREAMINFO block and
+    VORBIS_COMMENT, PICTURE and PADDING blocks. The padding block
+    extends over the `fLaC` marker and the STREAMINFO block of the audio
+    data, which are moved into the placeholder by
+    [complete_tag_header()][deethon.utils.complete_tag_header].
+
+    Args:
+        track: The [Track][deethon.types.Track] instance to be used for tagging.
+        ext: The file extension that determines the tag format
+            (`.flac` or `.mp3`).
+
+    Returns:
+        The header.
+    """
+    if ext == ".mp3":
+        f = io.BytesIO()
+        _get_id3(track).save(f, v2_version=3)
+        return f.getvalue()
+
+    from mutagen.flac import VCFLACDict
+    tags = VCFLACDict()
+    _set_vorbis_comment(tags, track)
+    return b"".join((
+        b"fLaC",
+        _flac_block_header(0, _STREAMINFO_SIZE), bytes(_STREAMINFO_SIZE),
+        _flac_block_header(4, None, tags.write(framing=False)),
+        _flac_block_header(6, None, _get_cover(track).write()),
+        _flac_block_header(1, _FLAC_PADDING + _FLAC_START),
+        bytes(_FLAC_PADDING),
+    ))
+
+
+def read_tag_header_size(f: BinaryIO, ext: str) -> Optional[int]:
+    """
+    Get the size of a header that was created by
+    [get_tag_header()][deethon.utils.get_tag_header] from the beginning
+    of a file.
+
+    Args:
+        f: The file, opened for reading in binary mode.
+        ext: The file extension that determines the tag format
+            (`.flac` or `.mp3`).
+
+    Returns:
+        The size of the header or `None` if the file does not start
+        with a complete header.
+    """
+    f.seek(0)
+    if ext == ".mp3":
+        return _get_id3_size(f.read(10))
+
+    if f.read(4) != b"fLaC":
+        return None
+    position = 4
+    while True:
+        data = f.read(4)
+        if len(data) < 4:
+            return None
+        length = int.from_bytes(data[1:], "big")
+        position += 4 + length
+        if data[0] & 0x7f == 1:
+            return position - _FLAC_START
+        f.seek(position)
+
+
+def complete_tag_header(f: BinaryIO, ext: str, size: int) -> None:
+    """
+    Complete the header of a file after the decrypted audio data was
+    written behind the header. This only changes a few bytes in place.
+
+    For MP3 files, an ID3v2 tag at the beginning of the audio data is
+    replaced by padding of the tag in the header. For FLAC files, the
+    STREAMINFO block of the audio data is copied into the header, and the
+    VORBIS_COMMENT and PICTURE blocks of the audio data are replaced by
+    padding. Either way, the file contains only the tags of the header.
+
+    Args:
+        f: The file, opened for reading and writing in binary mode.
+        ext: The file extension that determines the tag format
+            (`.flac` or `.mp3`).
+        size: The size of the header.
+
+    Raises:
+        ValueError: The audio data is not a FLAC stream.
+    """
+    if ext == ".mp3":
+        f.seek(size)
+        length = _get_id3_size(f.read(10))
+        if length is None:
+            return
+        length = min(length, f.seek(0, io.SEEK_END) - size)
+        f.seek(size)
+        f.write(bytes(length))
+        f.seek(6)
+        f.write(_encode_syncsafe(size - 10 + length))
+        return
+
+    f.seek(size)
+    start = f.read(_FLAC_START)
+    if start[:4] != b"fLaC" or start[4] & 0x7f != 0:
+        raise ValueError("The audio data is not a FLAC stream.")
+    f.seek(size)
+    f.write(bytes(_FLAC_START))
+    f.seek(0)
+    f.write(start[:4] + bytes([start[4] & 0x7f]) + start[5:])
+    if start[4] & 0x80:
+        # The STREAMINFO block was the last block of the audio data.
+        f.seek(size - _FLAC_PADDING - 4)
+        f.write(bytes([0x81]))
+        return
+
+    position = size + _FLAC_START
+    while True:
+        f.seek(position)
+        data = f.read(4)
+        if len(data) < 4:
+            raise ValueError("The audio data is not a FLAC stream.")
+        length = int.from_bytes(data[1:], "big")
+        if data[0] & 0x7f in (4, 6):
+            f.seek(position)
+            f.write(bytes([data[0] & 0x80 | 1]) + data[1:])
+            f.write(bytes(length))
+        if data[0] & 0x80:
+            return
+        position += 4 + length
+
+
+class Tagger:
+    """
+    Writes tags in front of a decrypted track that is passed in chunks,
+    for streams that cannot be patched in place after they were written.
+
+    The output is the same as the header of
+    [get_tag_header()][deethon.utils.get_tag_header] followed by the
+    audio data and completed with
+    [complete_tag_header()][deethon.utils.complete_tag_header]. The
+    beginning of the stream is buffered until all metadata blocks of a
+    FLAC stream or an ID3v2 tag at the beginning of an MP3 stream are
+    available.
+
+    ```python
+    tagger = Tagger(get_tag_header(track, ext), ext)
+    for chunk in decrypt_file(chunks, track.id):
+        sink.write(tagger.update(chunk))
+    sink.write(tagger.finalize())
+    ```
+    """
+
+    def __init__(self, header: bytes, ext: str):
+        """
+        Create a new Tagger instance.
+
+        Args:
+            header: The header that was created by
+                [get_tag_header()][deethon.utils.get_tag_header].
+            ext: The file extension that determines the tag format
+                (`.flac` or `.mp3`).
+        """
+        self._ext = ext
+        self._size = len(header)
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._buffer.write(header)
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Tag the next chunk of the track.
+
+        Args:
+            data: The next chunk of the decrypted track.
+
+        Returns:
+            The tagged data, which may be empty while the beginning of
+            the track is buffered.
+
+        Raises:
+            ValueError: The track is not a FLAC stream.
+        """
+        if self._buffer is None:
+            return data
+        self._buffer.write(data)
+        has_metadata = _has_id3_tag if self._ext == ".mp3" \
+            else _has_flac_metadata
+        with self._buffer.getbuffer() as view, view[self._size:] as audio:
+            if not has_metadata(audio):
+                return b""
+        return self.finalize()
+
+    def finalize(self) -> bytes:
+        """
+        Finish the tagging.
+
+        Returns:
+            The remaining tagged data.
+
+        Raises:
+            ValueError: The track is not a FLAC stream.
+        """
+        if self._buffer is None:
+            return b""
+        complete_tag_header(self._buffer, self._ext, self._size)
+        data = self._buffer.getvalue()
+        self._buffer = None
+        return data
+
+
+_STREAMINFO_SIZE = 34
+_FLAC_START = 8 + _STREAMINFO_SIZE
+"""The size of the `fLaC` marker and the STREAMINFO block."""
+_FLAC_PADDING = 1024
+
+
+def _flac_block_header(block_type: int, length: Optional[int],
+                       data: bytes = b"") -> bytes:
+    if length is None:
+        length = len(data)
+    return bytes([block_type]) + length.to_bytes(3, "big") + data
+
+
+def _has_flac_metadata(data: memoryview) -> bool:
+    if len(data) < 4:
+        return False
+    if data[:4] != b"fLaC":
+        raise ValueError("The audio data is not a FLAC stream.")
+    position = 4
+    while position + 4 <= len(data):
+        length = int.from_bytes(data[position + 1:position + 4], "big")
+        if data[position] & 0x80:
+            return position + 4 + length <= len(data)
+        position += 4 + length
+    return False
+
+
+def _has_id3_tag(data: memoryview) -> bool:
+    # Whether the data starts with a complete ID3v2 tag or without one.
+    if len(data) < 10:
+        return False
+    size = _get_id3_size(bytes(data[:10]))
+    return size is None or size <= len(data)
+
+
+def _get_id3_size(data: bytes) -> Optional[int]:
+    # The size of an ID3v2 tag from its header or None without a tag.
+    if len(data) < 10 or data[:3] != b"ID3":
+        return None
+    size = 10 + _decode_syncsafe(data[6:10])
+    if data[5] & 0x10:
+        size += 10  # footer
+    return size
+
+
+def _decode_syncsafe(data: bytes) -> int:
+    size = 0
+    for byte in data:
+        size = size << 7 | byte & 0x7f
+    return size
+
+
+def _encode_syncsafe(size: int) -> bytes:
+    return bytes(size >> shift & 0x7f for shift in (21, 14, 7, 0))
+
+
+def _get_id3(track: Track) -> ID3:
+    from mutagen.id3 import ID3, Frames
+    tags = ID3()
+
+    tags.add(Frames["TALB"](encoding=3, text=track.album.title))
+    tags.add(Frames["TBPM"](encoding=3, text=str(track.bpm)))
+    tags.add(Frames["TCON"](encoding=3, text=track.album.genres))
+    tags.add(Frames["TCOP"](encoding=3, text=track.copyright))
+    tags.add(Frames["TDAT"](encoding=3,
+                            text=track.release_date.strftime("%d%m")))
+    tags.add(Frames["TIT2"](encoding=3, text=track.title))
+    tags.add(Frames["TPE1"](encoding=3, text=track.artist))
+    tags.add(Frames["TPE2"](encoding=3, text=track.album.artist))
+    tags.add(Frames["TPOS"](encoding=3, text=str(track.disk_number)))
+    tags.add(Frames["TPUB"](encoding=3, text=track.album.label))
+    tags.add(Frames["TRCK"](encoding=3,
+                            text=f"{track.number}/{track.album.total_tracks}"))
+    tags.add(Frames["TSRC"](encoding=3, text=track.isrc))
+    tags.add(Frames["TYER"](encoding=3, text=str(track.release_date.year)))
+
+    tags.add(Frames["TXXX"](encoding=3,
+                            desc="replaygain_track_gain",
+                            text=str(track.replaygain_track_gain)))
+
+    if track.lyrics:
+        tags.add(Frames["USLT"](encoding=3,
+                                text=track.lyrics))
+
+    tags.add(Frames["APIC"](encoding=3,
+                            mime="image/jpeg",
+                            type=3,
+                            desc="Cover",
+                            data=track.album.cover_xl))
+    return tags
+
+
+def _set_vorbis_comment(tags: VCFLACDict, track: Track) -> None:
+    tags["album"] = track.album.title
+    tags["albumartist"] = track.album.artist
+    tags["artist"] = track.artist
+    tags["bpm"] = str(track.bpm)
+    tags["copyright"] = track.copyright
+    tags["date"] = track.release_date.strftime("%Y-%m-%d")
+    tags["genre"] = track.album.genres
+    tags["isrc"] = track.isrc
+    if track.lyrics:
+        tags["lyrics"] = track.lyrics
+    tags["replaygain_track_gain"] = str(track.replaygain_track_gain)
+    tags["title"] = track.title
+    tags["tracknumber"] = str(track.number)
+    tags["year"] = str(track.release_date.year)
+
+
+def _get_cover(track: Track) -> Picture:
+    from mutagen.flac import Picture
+    cover = Picture()
+    cover.type = 3
+    cover.data = track.album.cover_xl
+    cover.width = 1000
+    cover.height = 1000
+    return cover
@@ -34,6 +34,7 @@
     classifiers=[
         'Development Status :: 3 - Alpha', 'Operating System :: OS Independent'
     ],
+    entry_points={"console_scripts": ["deethon = deethon.cli:main"]},
     packages=['deethon'],
     package_dir={"": "."},
     package_data={},
@@ -42,4 +43,5 @@
         'mutagen==1.*,>=1.44.0', 'pycryptodome==3.*,>=3.9.7',
         'requests==2.*,>=2.23.0'
     ],
+    extras_require={"async": ["aiohttp==3.*,>=3.6.0"]},
 )
@@ -0,0 +1,23 @@
+"""Shared fixtures for the tests."""
+import pytest
+
+from deethon import cache, types
+from deethon.fakeserver import FakeDeezer
+
+
+@pytest.fixture
+def deezer(monkeypatch, tmp_path):
+    """
+    A local stand-in of Deezer that deethon is pointed to. The instance
+    and cover caches are empty in each test.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "_metadata_cache", None)
+    monkeypatch.setattr(cache, "_cover_cache", cache.CoverCache())
+    for cls in (types.Track, types.Album, types.Playlist):
+        cls.cache.clear()
+    with FakeDeezer() as server:
+        server.patch(monkeypatch)
+        yield server
+    for cls in (types.Track, types.Album, types.Playlist):
+        cls.cache.clear()
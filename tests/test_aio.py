@@ -0,0 +1,66 @@
+"""This module contains tests for the [aio][deethon.aio] module."""
+import asyncio
+
+import deethon
+from deethon.aio import AsyncSession
+
+
+def test_download_track(deezer):
+    """Test if a track is downloaded and decrypted."""
+    deezer.add_album(1001, [2001])
+
+    async def download():
+        async with AsyncSession("arltoken") as session:
+            return await session.download("https://www.deezer.com/track/2001")
+
+    path = asyncio.run(download())
+    assert path.read_bytes()[:4] == b"fLaC"
+    assert path.read_bytes()[-4096:] == deezer.audio[(2001, "9")][-4096:]
+    assert deethon.types.Track(2001).md5_origin is not None
+
+
+def test_download_album(deezer):
+    """Test if all tracks of an album are downloaded concurrently."""
+    deezer.page_size = 2
+    deezer.add_album(1002, [2002, 2003, 2004])
+    del deezer.audio[(2003, "9")]
+
+    async def download():
+        async with AsyncSession("arltoken") as session:
+            album = await session.load_album(1002)
+            return await session.download_album(album, "FLAC", max_workers=3)
+
+    paths = asyncio.run(download())
+    assert [path.suffix for path in paths] == [".flac", ".mp3", ".flac"]
+    assert paths[0].read_bytes() != paths[2].read_bytes()
+    assert "/album/1002/tracks" in deezer.requests
+
+
+def test_download_album_failures(deezer):
+    """Test if a track that cannot be loaded does not stop the album."""
+    deezer.add_album(1003, list(range(2005, 2015)))
+    del deezer.tracks[2006]
+
+    async def download():
+        async with AsyncSession("arltoken") as session:
+            album = await session.load_album(1003)
+            return await session.download_album(album, "FLAC", max_workers=3,
+                                                prefetch=2)
+
+    paths = asyncio.run(download())
+    assert isinstance(paths[1], deethon.errors.DeezerApiError)
+    assert all(path.suffix == ".flac" for path in paths[:1] + paths[2:])
+
+
+def test_stream_track(deezer):
+    """Test if a track is streamed with tags."""
+    deezer.add_album(1003, [2005])
+
+    async def stream():
+        async with AsyncSession("arltoken") as session:
+            track = await session.load_track(2005)
+            return b"".join([data async for data in session.stream_track(track)])
+
+    data = asyncio.run(stream())
+    assert data[:4] == b"fLaC"
+    assert data[-4096:] == deezer.audio[(2005, "9")][-4096:]
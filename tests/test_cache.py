@@ -0,0 +1,114 @@
+"""This module contains tests for the [cache][deethon.cache] module."""
+import threading
+import time
+
+import deethon
+from deethon.cache import CoverCache, LRUCache, MetadataCache
+
+
+def test_lru_cache():
+    """Test the eviction and expiry of the [LRUCache][deethon.cache.LRUCache]."""
+    cache = LRUCache(maxsize=2, ttl=0.05)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"
+    cache.put(3, "c")
+    assert 2 not in cache
+    assert cache.get(1) == "a"
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    time.sleep(0.06)
+    assert cache.get(1) is None
+    assert cache.misses == 1
+
+
+def test_single_flight():
+    """Test if concurrent loads of the same key only call the loader once."""
+    cache = LRUCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_load, args=(1, loader))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.get_or_load(1, loader) == "value"
+    assert (cache.hits, cache.misses) == (5, 1)
+
+
+def test_metadata_cache(tmp_path):
+    """Test the expiry, eviction and invalidation of the metadata cache."""
+    cache = MetadataCache(tmp_path / "cache.sqlite3", ttls={"album": -1},
+                          max_size=1000)
+    cache.set("track", 1, {"id": 1})
+    cache.set("album", 1, {"id": 1})
+    assert cache.get("track", 1) == {"id": 1}
+    assert cache.get("album", 1) is None
+
+    cache.invalidate("track")
+    assert cache.get("track", 1) is None
+
+    for i in range(64):
+        cache.set("track", i, {"title": "x" * 100})
+    assert cache.get("track", 0) is None
+    assert cache.get("track", 63) is not None
+
+
+def test_persistent_metadata(deezer, tmp_path, monkeypatch):
+    """Test if the types read their metadata from the metadata cache."""
+    deezer.add_album(1301, [2301])
+    monkeypatch.setattr(deethon.cache, "_metadata_cache",
+                        MetadataCache(tmp_path / "cache.sqlite3"))
+
+    deethon.Track(2301)
+    deethon.Track.cache.invalidate(2301)
+    assert deethon.Track(2301).title == "Track 2301"
+    assert deezer.requests == ["/track/2301"]
+
+
+def test_uncached_gw_errors(deezer, tmp_path, monkeypatch):
+    """Test if empty responses of the unofficial API are not cached."""
+    deezer.add_album(1303, [2303])
+    monkeypatch.setattr(deethon.cache, "_metadata_cache",
+                        MetadataCache(tmp_path / "cache.sqlite3"))
+    session = deethon.Session("arltoken")
+    empty = f'{deethon.consts.METHOD_PAGE_TRACK} {{"sng_id": 2303}}'
+    deezer.recording["gw"][empty] = {"error": [], "results": {}}
+
+    method = deethon.consts.METHOD_PAGE_TRACK
+    assert session.get_api(method, {"sng_id": 2303}) == {}
+    del deezer.recording["gw"][empty]
+    assert session.get_api(method, {"sng_id": 2303})["DATA"]
+    assert session.get_api(method, {"sng_id": 2303})["DATA"]
+    assert deezer.requests.count(method) == 2
+
+
+def test_cover_cache(deezer, tmp_path, monkeypatch):
+    """Test if covers are shared between cover caches on the same directory."""
+    deezer.add_album(1302, [2302])
+    album = deethon.Album(1302)
+    monkeypatch.setattr(deethon.cache, "_cover_cache",
+                        CoverCache(tmp_path / "covers"))
+    assert album.cover_xl.startswith(b"\xff\xd8")
+    assert album.cover_xl == deethon.Album(1302).cover_xl
+    # Another process with an empty in-memory layer.
+    other = CoverCache(tmp_path / "covers", max_size=0)
+    assert other.get(album.cover_xl_link) == album.cover_xl
+    assert deezer.requests.count("/cover/1302/xl.jpg") == 1
+
+    for size in ("small", "medium", "big"):
+        other.get(getattr(album, f"cover_{size}_link"))
+    assert other.get(album.cover_xl_link) == album.cover_xl
+    # The files are evicted after every 16th download.
+    for _ in range(13):
+        other.invalidate(album.cover_small_link)
+        other.get(album.cover_small_link)
+    assert not list((tmp_path / "covers").glob("*.jpg"))
@@ -0,0 +1,67 @@
+"""This module contains tests for the [cli][deethon.cli] module."""
+import json
+
+import deethon
+from deethon import cli
+
+
+def test_cli(deezer, tmp_path, capsys):
+    """Test a job with duplicate tracks, a failure and a resumed run."""
+    deezer.page_size = 2
+    deezer.add_album(1811, [2811, 2812, 2813])
+    deezer.add_playlist(3811, [2813, 2814])
+    deezer.add_track(2814, 1811, 4)
+    del deezer.audio[(2812, "9")], deezer.audio[(2812, "3")], \
+        deezer.audio[(2812, "5")], deezer.audio[(2812, "1")]
+    urls = tmp_path / "urls.txt"
+    urls.write_text("# job\nhttps://www.deezer.com/album/1811\n\n"
+                    "https://www.deezer.com/playlist/3811\n"
+                    "https://www.deezer.com/track/2811\n"
+                    "https://www.deezer.com/artist/1\n")
+    journal = tmp_path / "job.journal"
+    report = tmp_path / "report.json"
+    args = ["--arl", "arltoken", "-i", str(urls), "-w", "2", "-q",
+            "-j", str(journal), "-r", str(report)]
+
+    assert cli.main(args) == 1
+    data = json.loads(report.read_text())
+    assert data["summary"] == {"urls": 4, "failed_urls": 1, "tracks": 4,
+                               "done": 3, "skipped": 0, "failed": 1}
+    assert [item["track_ids"] for item in data["items"]] == \
+        [[2811, 2812, 2813], [2813, 2814], [2811], []]
+    assert [track["track_id"] for track in data["tracks"]] == \
+        [2811, 2812, 2813, 2814]
+    assert data["tracks"][1]["status"] == "failed"
+    assert "3 downloaded, 0 skipped, 1 failed, 1 invalid URLs" in \
+        capsys.readouterr().err
+
+    cdn = len([r for r in deezer.requests if r.startswith("/cdn/")])
+    assert cdn == 3
+    assert cli.main(args) == 1
+    data = json.loads(report.read_text())
+    assert data["summary"]["skipped"] == 3
+    assert data["summary"]["failed"] == 1
+    assert len([r for r in deezer.requests if r.startswith("/cdn/")]) == cdn
+    assert len(journal.read_text().splitlines()) == 5
+
+
+def test_cli_errors(deezer, tmp_path, capsys):
+    """Test if failed tags are journaled and fatal errors stop the job."""
+    deezer.add_album(1812, [2815, 2816])
+    method = deethon.consts.METHOD_GET_LIST_DATA
+    batch = f'{method} {{"sng_ids": [2815, 2816]}}'
+    deezer.recording["gw"][batch] = {"error": {"DATA_ERROR": "No data"},
+                                     "results": {}}
+    journal = tmp_path / "job.journal"
+    args = ["--arl", "arltoken", "-q", "-j", str(journal),
+            "https://www.deezer.com/album/1812"]
+    assert cli.main(args) == 1
+    entries = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert [(e["track_id"], e["status"]) for e in entries] == \
+        [(2815, "failed"), (2816, "failed")]
+    assert "DATA_ERROR" in entries[0]["error"]
+    capsys.readouterr()
+
+    args[4] = str(tmp_path)
+    assert cli.main(args) == 2
+    assert capsys.readouterr().err.startswith("deethon: ")
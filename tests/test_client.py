@@ -0,0 +1,33 @@
+"""This module contains tests for the [client][deethon.client] module."""
+import deethon
+from deethon.client import HTTPClient
+
+
+def test_retries(deezer):
+    """Test if server errors are retried with backoff."""
+    deezer.add_album(1901, [2901])
+    client = HTTPClient(backoff=0.01, retries=2)
+
+    deezer.server_errors = 2
+    r = client.get(f"{deezer.url}/track/2901")
+    assert r.json()["id"] == 2901
+    assert deezer.requests.count("/track/2901") == 3
+
+    deezer.server_errors = 3
+    assert client.get(f"{deezer.url}/track/2901").status_code == 500
+
+
+def test_shared_client(deezer, monkeypatch):
+    """Test if sessions share the client but not their cookies."""
+    deezer.add_album(1902, [2902])
+    client = HTTPClient()
+    monkeypatch.setattr(deethon.client, "_client", client)
+    first = deethon.Session("first")
+    second = deethon.Session("second")
+    assert first.client is second.client is client
+
+    first.get_api(deethon.consts.METHOD_PAGE_TRACK, {"sng_id": 2902})
+    second.get_api(deethon.consts.METHOD_PAGE_TRACK, {"sng_id": 2902})
+    assert deezer.cookies == ["arl=first", "arl=first; sid=1",
+                              "arl=second", "arl=second; sid=2"]
+    assert not client.session.cookies
@@ -0,0 +1,74 @@
+"""This module contains tests for the [fakeserver][deethon.fakeserver] module."""
+import time
+
+import deethon
+from deethon.client import HTTPClient
+from deethon.fakeserver import FakeDeezer, Recorder
+
+
+def test_faults(deezer):
+    """Test the latency, the bandwidth limit and the random errors."""
+    deezer.add_album(1061, [2061])
+    client = HTTPClient(retries=0)
+
+    deezer.latency = 0.2
+    start = time.perf_counter()
+    assert client.get(f"{deezer.url}/track/2061").json()["id"] == 2061
+    assert time.perf_counter() - start >= 0.2
+
+    deezer.latency = 0
+    deezer.bandwidth = 2000
+    start = time.perf_counter()
+    size = len(client.get(f"{deezer.url}/track/2061").content)
+    assert time.perf_counter() - start >= size / 2000
+    deezer.bandwidth = None
+
+    deezer.error_rate = 1
+    assert client.get(f"{deezer.url}/track/2061").status_code == 500
+    deezer.error_rate = 0
+    deezer.quota_rate = 1
+    assert client.get(f"{deezer.url}/track/2061").json()["error"]["code"] == 4
+    deezer.quota_rate = 0.5
+    deezer._random.seed(1)
+    errors = [client.get(f"{deezer.url}/track/2061").json().get("error")
+              for _ in range(20)]
+    assert 0 < sum(error is not None for error in errors) < 20
+
+
+def test_record_replay(deezer, monkeypatch, tmp_path):
+    """Test if recorded responses are replayed with synthetic audio."""
+    deezer.add_album(1062, [2062, 2063])
+    recorder = Recorder()
+    monkeypatch.setattr(deethon.client, "_client", recorder)
+    album = deethon.Album(1062)
+    deethon.Session("arltoken").add_more_tags_bulk(album.tracks)
+    assert set(recorder.recording["api"]) == {
+        "album/1062", "track/2062", "track/2063"}
+    assert [key.split()[0] for key in recorder.recording["gw"]] == \
+        [deethon.consts.METHOD_GET_LIST_DATA, deethon.consts.METHOD_GET_LYRICS]
+    recording = tmp_path / "recording.json"
+    recorder.save(str(recording))
+    # Replace the links to the recorded server with those of Deezer.
+    recording.write_text(recording.read_text().replace(
+        f"{deezer.url}/cover/", "https://e-cdns-images.dzcdn.net/images/"))
+
+    requests = len(deezer.requests)
+    with FakeDeezer() as replay:
+        replay.patch(monkeypatch)
+        replay.load_recording(str(recording), audio_size=20000)
+        monkeypatch.setattr(deethon.client, "_client", HTTPClient())
+        session = deethon.Session("arltoken")
+        album = deethon.Album.from_json(
+            session.client.get(f"{replay.url}/album/1062").json())
+        track = deethon.Track.from_json(
+            session.client.get(f"{replay.url}/track/2063").json())
+        session.add_more_tags_bulk([track])
+        assert track.composer == ["Composer"]
+        assert track.lyrics == "Lyrics"
+        assert album.cover_xl_link == f"{replay.url}/cover/1062/xl.jpg"
+        assert session.download_track(track).stat().st_size > 20000
+        assert replay.requests[:5] == ["/album/1062", "/track/2063",
+                                       deethon.consts.METHOD_GET_USER,
+                                       deethon.consts.METHOD_GET_LIST_DATA,
+                                       deethon.consts.METHOD_GET_LYRICS]
+        assert len(deezer.requests) == requests
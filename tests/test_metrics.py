@@ -0,0 +1,81 @@
+"""This module contains tests for the [metrics][deethon.metrics] module."""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import deethon
+from deethon import metrics
+
+
+def test_metrics():
+    """Test the aggregation and the exporters."""
+    sink = metrics.Metrics()
+    metrics.count("requests", endpoint="api")
+    metrics.add_sink(sink)
+    try:
+        metrics.count("requests", endpoint="api")
+        metrics.count("requests", 2, endpoint="cdn")
+        metrics.observe("transfer", 0.5, track_id=1)
+        metrics.observe("transfer", 1.5, track_id=2)
+        with metrics.timed("cover"):
+            pass
+    finally:
+        metrics.remove_sink(sink)
+    metrics.count("requests", endpoint="api")
+
+    data = json.loads(sink.to_json())
+    assert data["counters"] == [
+        {"name": "requests", "labels": {"endpoint": "api"}, "value": 1},
+        {"name": "requests", "labels": {"endpoint": "cdn"}, "value": 2}]
+    assert data["timings"][1] == {"name": "transfer", "labels": {},
+                                  "count": 2, "sum": 2.0, "max": 1.5}
+    text = sink.to_prometheus()
+    assert "# TYPE deethon_transfer_seconds summary\n" in text
+    assert "deethon_transfer_seconds_sum 2.0\n" in text
+    assert 'deethon_requests_total{endpoint="cdn"} 2\n' in text
+
+
+def test_download_metrics(deezer):
+    """Test if the stages of a download are recorded."""
+    deezer.add_album(1611, [2611])
+    sink = metrics.Metrics()
+    metrics.add_sink(sink)
+    try:
+        session = deethon.Session('arltoken')
+        session.download_track(deethon.Track(2611))
+    finally:
+        metrics.remove_sink(sink)
+
+    data = sink.to_dict()
+    stages = {timing["name"] for timing in data["timings"]}
+    assert stages >= {"metadata", "add_more_tags", "stream_url", "cdn_ttfb",
+                      "transfer", "decrypt", "write", "cover", "tag"}
+    counters = {(c["name"], tuple(c["labels"].values())): c["value"]
+                for c in data["counters"]}
+    assert counters[("bytes", ())] == len(deezer.audio[(2611, "9")])
+    assert counters[("requests", ("cdn",))] == 6
+
+
+def test_parallel_download_metrics(deezer):
+    """Test the stages of segmented downloads and of a decrypt executor."""
+    deezer.add_album(1612, [2612, 2613])
+    deezer.add_track(2612, 1612, size=1000000)
+    deezer.add_track(2613, 1612, size=1000000)
+    sink = metrics.Metrics()
+    metrics.add_sink(sink)
+    try:
+        session = deethon.Session('arltoken')
+        session.download_track(deethon.Track(2612), segments=4)
+        with ThreadPoolExecutor(2) as executor:
+            session = deethon.Session('arltoken', decrypt_executor=executor)
+            session.download_track(deethon.Track(2613))
+    finally:
+        metrics.remove_sink(sink)
+
+    timings = {timing["name"]: timing for timing in sink.to_dict()["timings"]}
+    # One decrypt and write stage per range and one for the executor.
+    assert timings["decrypt"]["count"] == timings["write"]["count"] == 5
+    assert timings["cdn_ttfb"]["count"] == 6
+    counters = {c["name"]: c["value"] for c in sink.to_dict()["counters"]
+                if not c["labels"]}
+    assert counters["bytes"] == len(deezer.audio[(2612, "9")]) + \
+        len(deezer.audio[(2613, "9")])
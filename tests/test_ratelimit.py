@@ -0,0 +1,116 @@
+"""This module contains tests for the [ratelimit][deethon.ratelimit] module."""
+import asyncio
+import gc
+import io
+import threading
+
+import pytest
+import requests
+
+import deethon
+from deethon.ratelimit import AdaptiveConcurrency, RateLimiter, TokenBucket
+
+
+def test_token_bucket():
+    """Test if the bucket allows bursts and then limits the rate."""
+    bucket = TokenBucket(rate=100, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.005 < bucket.reserve() <= 0.01
+    bucket.drain(1)
+    assert bucket.reserve() > 1
+
+
+def test_adaptive_concurrency():
+    """Test if the limit is halved on overload and grows on success."""
+    concurrency = AdaptiveConcurrency(maximum=8)
+    for _ in range(8):
+        assert concurrency.try_acquire()
+    assert not concurrency.try_acquire()
+    concurrency.release(overloaded=True)
+    concurrency.release(overloaded=True)  # within the cooldown
+    assert concurrency.limit == 4
+    for _ in range(6):
+        concurrency.release()
+    assert 5 < concurrency.limit < 6
+
+
+def test_acquire_async():
+    """Test if coroutines wait for a released slot without polling."""
+    concurrency = AdaptiveConcurrency(maximum=1)
+
+    async def main():
+        await concurrency.acquire_async()
+        waiting = asyncio.ensure_future(concurrency.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiting.done() and len(concurrency._waiters) == 1
+        threading.Timer(0.05, concurrency.release).start()
+        await asyncio.wait_for(waiting, 1)
+        assert concurrency.active == 1 and not concurrency._waiters
+
+    asyncio.run(main())
+
+
+def test_streamed_response():
+    """Test if a streamed response holds its slot until it is closed."""
+    rate_limiter = RateLimiter(concurrency={"cdn": 2})
+    concurrency = rate_limiter.concurrency["cdn"]
+
+    def send():
+        r = requests.Response()
+        r.raw = io.BytesIO(b"body")
+        return r
+
+    response = rate_limiter.call("cdn", send, lambda r: False,
+                                 stream=True)
+    assert concurrency.active == 1
+    with response:
+        pass
+    assert concurrency.active == 0
+    response.close()
+    assert concurrency.active == 0
+
+    rate_limiter.call("cdn", send, lambda r: False, stream=True)
+    gc.collect()
+    assert concurrency.active == 0
+    rate_limiter.call("cdn", send, lambda r: False)
+    assert concurrency.active == 0
+
+
+def test_quota_errors(deezer, monkeypatch):
+    """Test if requests are retried after quota errors."""
+    deezer.add_album(1801, [2801])
+    rate_limiter = RateLimiter(backoff=0.01)
+    monkeypatch.setattr(deethon.ratelimit, "_rate_limiter", rate_limiter)
+
+    deezer.quota_errors = 2
+    assert deethon.Track(2801).title == "Track 2801"
+    assert deezer.requests.count("/track/2801") == 3
+    assert rate_limiter.concurrency["api"].limit < 16
+
+    deezer.too_many_requests = 1
+    session = deethon.Session("arltoken")
+    assert session.download_track(deethon.Track(2801)).exists()
+
+    deezer.quota_errors = 10
+    with pytest.raises(deethon.errors.RateLimitError):
+        deethon.Album(1802)
+
+
+def test_gw_quota_errors(deezer, monkeypatch):
+    """Test if quota errors of the unofficial API are retried."""
+    deezer.add_album(1803, [2803])
+    rate_limiter = RateLimiter(backoff=0.01)
+    monkeypatch.setattr(deethon.ratelimit, "_rate_limiter", rate_limiter)
+    session = deethon.Session("arltoken")
+    method = deethon.consts.METHOD_PAGE_TRACK
+
+    session.get_api(method, {"sng_id": 2803})
+    deezer.gw_quota_errors = 2
+    assert session.get_api(method, {"sng_id": 2803})["DATA"]
+    assert deezer.requests.count(method) == 4
+    assert rate_limiter.concurrency["gw"].limit < 16
+
+    deezer.gw_quota_errors = 10
+    with pytest.raises(deethon.errors.RateLimitError):
+        session.get_api(method, {"sng_id": 2803})
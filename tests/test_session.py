@@ -1,36 +1,375 @@
 """This module contains tests for the [session][deethon.session] module."""
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
+import requests
 
 import deethon
 
 
-def test_session():
+def test_session(deezer):
     """
     Test if the [Session][deethon.session.Session] class raises a
     [DeezerLoginError][deethon.types.DeezerLoginError] when an invalid
     arl token is passed.
     """
+    deezer.arl_tokens = ["arltoken"]
     with pytest.raises(deethon.errors.DeezerLoginError):
         session = deethon.Session('wrongarltoken')
         session._refresh_session()
 
 
-def test_download():
+def test_download(deezer):
     """Test if the download method returns a Path object."""
-    deezer = deethon.Session(
-        '25e67e8e8100407765315a67e0d132fb88a436ffe244813b62ce7086c2efe01b3152041e4308dae45b14f22161adf525ede64cfa18eb9db01b02ec4ccac8869a7e726f372db54c313d4f5705637989ea1e20953a3ea60b5c0179ca95ddfe0516')
+    deezer.add_album(1053, [2104162])
+    deezer.add_track(101399924, 1053, 2, qualities=())
+    session = deethon.Session('arltoken')
     assert isinstance(
-        deezer.download('https://www.deezer.com/track/2104162', 'MP3_320'), Path)
+        session.download('https://www.deezer.com/track/2104162', 'MP3_320'), Path)
     assert isinstance(
-        deezer.download('https://www.deezer.com/track/2104162'), Path)
+        session.download('https://www.deezer.com/track/2104162'), Path)
 
     with pytest.raises(deethon.errors.InvalidUrlError):
-        deezer.download('https://www.google.com')
+        session.download('https://www.google.com')
 
     with pytest.raises(deethon.errors.ActionNotSupported):
-        deezer.download('https://www.deezer.com/unsuppoted/123456')
+        session.download('https://www.deezer.com/unsuppoted/123456')
 
     with pytest.raises(deethon.errors.DownloadError):
-        deezer.download('https://www.deezer.com/track/101399924')
+        session.download('https://www.deezer.com/track/101399924')
+
+
+def test_download_tracks_concurrently(deezer, monkeypatch):
+    """
+    Test if concurrent downloads keep the track order and return
+    exceptions of failed tracks instead of stopping the batch.
+    """
+    def download_track(track, bitrate="FLAC", progress_callback=None):
+        if track.id == 2132:
+            raise deethon.errors.DownloadError(track.id)
+        return Path(str(track.id))
+
+    deezer.add_album(1108, list(range(2130, 2135)))
+    session = deethon.Session('arltoken')
+    monkeypatch.setattr(session, "download_track", download_track)
+    tracks = [deethon.Track(i) for i in range(2130, 2135)]
+
+    paths = session.download_tracks(tracks, max_workers=3)
+    assert paths[:2] == (Path('2130'), Path('2131'))
+    assert isinstance(paths[2], deethon.errors.DownloadError)
+    assert paths[3:] == (Path('2133'), Path('2134'))
+
+    streamed = session.download_tracks(tracks, max_workers=3, stream=True)
+    assert len(list(streamed)) == 5
+
+
+def test_download_album_failures(deezer):
+    """
+    Test if tracks whose metadata or additional tags cannot be loaded
+    are reported without stopping the album.
+    """
+    deezer.add_album(1109, list(range(2140, 2150)))
+    del deezer.tracks[2141]
+    session = deethon.Session('arltoken')
+
+    paths = session.download_album(deethon.Album(1109), max_workers=2)
+    assert isinstance(paths[1], deethon.errors.DeezerApiError)
+    assert all(isinstance(path, Path) for path in paths[:1] + paths[2:])
+
+    # The first batch of additional tags fails.
+    deezer.add_album(1110, list(range(2150, 2160)))
+    method = deethon.consts.METHOD_GET_LIST_DATA
+    batch = f'{method} {{"sng_ids": {list(range(2150, 2158))}}}'
+    deezer.recording["gw"][batch] = {"error": {"DATA_ERROR": "No data"},
+                                     "results": {}}
+    paths = session.download_album(deethon.Album(1110), max_workers=2)
+    assert all(isinstance(path, deethon.errors.DeezerGatewayError)
+               for path in paths[:8])
+    assert all(isinstance(path, Path) for path in paths[8:])
+
+
+def test_download_offline(deezer):
+    """Test a complete download against a local stand-in of Deezer."""
+    deezer.add_album(1101, [2101, 2102])
+    del deezer.audio[(2102, "9")]
+    session = deethon.Session('arltoken')
+
+    flac, mp3 = session.download('https://www.deezer.com/album/1101')
+    assert flac.read_bytes()[-4096:] == deezer.audio[(2101, "9")][-4096:]
+    assert mp3.suffix == ".mp3"
+    assert mp3.read_bytes()[-4096:] == deezer.audio[(2102, "3")][-4096:]
+
+
+def test_probe_bitrates(deezer):
+    """Test if the best available bitrate is probed and downloaded directly."""
+    deezer.add_album(1102, [2103])
+    deezer.add_track(2103, 1102, qualities=("1",))
+    del deezer.audio[(2103, "9")], deezer.audio[(2103, "3")], \
+        deezer.audio[(2103, "5")]
+    session = deethon.Session('arltoken')
+    track = deethon.Track(2103)
+
+    assert list(session.get_available_bitrates(track)) == ["MP3_128"]
+    path = session.download_track(track, "FLAC")
+    assert path.read_bytes()[-4096:] == deezer.audio[(2103, "1")][-4096:]
+    cdn = [r for r in deezer.requests if "/cdn/" in r]
+    assert len(cdn) == 5
+    assert all(r.startswith("HEAD ") for r in cdn[:4])
+
+    del deezer.audio[(2103, "1")]
+    session.availability_cache.clear()
+    with pytest.raises(deethon.errors.DownloadError):
+        session.download_track(track)
+
+
+def test_lazy_lyrics(deezer):
+    """Test if lyrics are requested only when the tracks are downloaded."""
+    # All tracks with odd IDs have lyrics.
+    deezer.add_album(1111, list(range(2161, 2181, 2)))
+    session = deethon.Session('arltoken')
+
+    tracks = list(session.prepare_tracks(deethon.Album(1111).iter_tracks()))
+    assert deezer.requests.count(deethon.consts.METHOD_GET_LIST_DATA) == 2
+    assert deethon.consts.METHOD_GET_LYRICS not in deezer.requests
+    assert all(track.lyrics is None for track in tracks)
+
+    session.download_tracks(tracks, max_workers=2)
+    assert deezer.requests.count(deethon.consts.METHOD_GET_LYRICS) == 10
+    assert all(track.lyrics == "Lyrics" for track in tracks)
+    session.download_tracks(tracks, max_workers=2)
+    assert deezer.requests.count(deethon.consts.METHOD_GET_LYRICS) == 10
+
+
+def test_probe_errors(deezer, monkeypatch):
+    """Test if failed probes are not cached as unavailable bitrates."""
+    deezer.add_album(1103, [2104])
+    session = deethon.Session('arltoken')
+    track = deethon.Track(2104)
+
+    def forbidden(url, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 403
+        return response
+
+    head = session.client.head
+    monkeypatch.setattr(session.client, "head", forbidden)
+    assert session.get_available_bitrates(track) == {}
+    monkeypatch.setattr(session.client, "head", head)
+    assert list(session.get_available_bitrates(track)) == \
+        ["FLAC", "MP3_320", "MP3_256", "MP3_128"]
+
+
+def test_prefetch(deezer, monkeypatch):
+    """Test if the next tracks are prepared while a track is downloaded."""
+    deezer.add_album(1107, [2120, 2121, 2122, 2123, 2124])
+    session = deethon.Session('arltoken')
+    prefetch = session._prefetch
+    prefetched = []
+    prepared = threading.Event()
+
+    def prefetch_and_count(track, bitrate):
+        prefetch(track, bitrate)
+        prefetched.append(track.id)
+        if len(prefetched) == 3:
+            prepared.set()
+
+    monkeypatch.setattr(session, "_prefetch", prefetch_and_count)
+    paths = session.download_album(deethon.Album(1107), "FLAC", stream=True,
+                                   prefetch=2)
+
+    assert next(paths).name == "01 Track 2120.flac"
+    assert prepared.wait(5)
+    cdn = [r.split("/")[0] for r in deezer.requests if "/cdn/" in r]
+    # The bitrates of the next two tracks were probed ahead.
+    assert cdn.count("HEAD ") == 12 and cdn.count("") == 1
+    assert len(list(paths)) == 4
+
+
+def test_manifest(deezer, tmp_path):
+    """Test if unchanged tracks are skipped and modified files are detected."""
+    deezer.add_album(1103, [2104, 2105])
+    manifest = deethon.manifest.Manifest(tmp_path / "manifest.sqlite3")
+    session = deethon.Session('arltoken', manifest=manifest)
+
+    paths = session.download_album(deethon.Album(1103), "FLAC")
+    cdn = len([r for r in deezer.requests if "/cdn/" in r])
+    assert session.download_album(deethon.Album(1103), "FLAC") == paths
+    assert len([r for r in deezer.requests if "/cdn/" in r]) == cdn
+    assert not manifest.verify(checksums=True)
+
+    paths[0].write_bytes(b"modified")
+    paths[1].unlink()
+    assert {e.path for e in manifest.verify(remove=True)} == set(paths)
+    assert len(manifest) == 0
+    session.download_album(deethon.Album(1103), "FLAC")
+    assert paths[0].read_bytes()[-4096:] == deezer.audio[(2104, "9")][-4096:]
+
+
+def test_stream_track(deezer):
+    """Test if a streamed track is identical to a downloaded track."""
+    deezer.add_album(1104, [2106, 2107])
+    for number, track_id in enumerate((2106, 2107), 1):
+        deezer.add_track(track_id, 1104, number, size=400000)
+    del deezer.audio[(2107, "9")]
+    session = deethon.Session('arltoken')
+
+    for track_id in (2106, 2107):
+        path = session.download_track(deethon.Track(track_id))
+        deezer.drops = [300000]
+        sink = io.BytesIO()
+        bitrate = session.download_track_to(deethon.Track(track_id), sink)
+        assert bitrate == ("FLAC" if track_id == 2106 else "MP3_320")
+        assert sink.getvalue() == path.read_bytes()
+        assert deezer.ranges[-1] == "bytes=196608-"
+
+    data = b"".join(session.stream_track(deethon.Track(2106), tags=False))
+    assert data == deezer.audio[(2106, "9")]
+
+
+def test_add_more_tags_bulk(deezer):
+    """Test if the additional tags of an album are requested in bulk."""
+    track_ids = list(range(2401, 2405))
+    deezer.add_album(1401, track_ids)
+    session = deethon.Session('arltoken')
+
+    session.download_album(deethon.Album(1401), "FLAC")
+    methods = [r for r in deezer.requests if not r.startswith("/")]
+    assert methods.count(deethon.consts.METHOD_GET_LIST_DATA) == 1
+    assert methods.count(deethon.consts.METHOD_GET_LYRICS) == 2
+    assert deethon.consts.METHOD_PAGE_TRACK not in methods
+    assert deethon.Track(2401).lyrics == "Lyrics"
+    assert deethon.Track(2402).lyrics is None
+
+
+def test_resume_download(deezer):
+    """Test if interrupted downloads are resumed from a stripe boundary."""
+    deezer.add_album(1501, [2501])
+    deezer.add_track(2501, 1501, size=1000000)
+    deezer.drops = [300000]
+    session = deethon.Session('arltoken')
+
+    path = session.download_track(deethon.Track(2501), retries=1)
+    assert path.read_bytes()[-4096:] == deezer.audio[(2501, "9")][-4096:]
+    assert deezer.ranges == [None, "bytes=196608-"]
+    assert not list(path.parent.glob("*.part"))
+
+    deezer.drops = [300000, 300000]
+    with pytest.raises(IOError):
+        session.download_track(deethon.Track(2501), retries=1)
+    assert list(path.parent.glob("*.part"))
+
+    session.download_track(deethon.Track(2501))
+    assert deezer.ranges[2:] == [None, "bytes=196608-", "bytes=393216-"]
+    assert path.read_bytes()[-4096:] == deezer.audio[(2501, "9")][-4096:]
+
+
+def test_decrypt_executor(deezer):
+    """Test if tracks are decrypted and written in a process pool."""
+    deezer.add_album(1502, [2502])
+    deezer.add_track(2502, 1502, size=1000000)
+    deezer.drops = [700000]
+    progress = []
+    with ProcessPoolExecutor(2) as executor:
+        session = deethon.Session('arltoken', decrypt_executor=executor)
+        path = session.download_track(
+            deethon.Track(2502), "FLAC",
+            lambda current, total: progress.append(current))
+
+    assert deezer.ranges == [None, "bytes=589824-"]
+    assert progress[-1] == len(deezer.audio[(2502, "9")])
+    data = path.read_bytes()
+    audio = deezer.audio[(2502, "9")]
+    assert data[-len(audio) + 42:] == audio[42:]
+    assert not list(path.parent.glob("*.part"))
+
+
+def test_segmented_download(deezer):
+    """Test if a track is downloaded in several parallel byte ranges."""
+    deezer.add_album(1601, [2601])
+    deezer.add_track(2601, 1601, size=1000000)
+    deezer.drops = [0, 100000]
+    session = deethon.Session('arltoken')
+
+    path = session.download_track(deethon.Track(2601), segments=4)
+    assert path.read_bytes()[-900000:] == deezer.audio[(2601, "9")][-900000:]
+    ranges = [r for r in deezer.ranges if r]
+    assert len(ranges) == 5
+    assert set(ranges) == {"bytes=0-251903", "bytes=251904-503807",
+                           "bytes=503808-755711", "bytes=755712-1000600"}
+
+
+def test_segmented_download_short_ranges(deezer):
+    """Test if ranges that end early are resumed and retried."""
+    deezer.add_album(1602, [2602])
+    deezer.add_track(2602, 1602, size=1000000)
+    session = deethon.Session('arltoken')
+
+    deezer.short_ranges = [100001, 100001, 100001, 100001]
+    path = session.download_track(deethon.Track(2602), segments=4)
+    assert path.read_bytes()[-900000:] == deezer.audio[(2602, "9")][-900000:]
+    assert "bytes=98304-251903" in deezer.ranges
+
+    path.unlink()
+    deezer.short_ranges = [0] * 16
+    with pytest.raises(deethon.errors.DownloadError):
+        session.download_track(deethon.Track(2602), segments=4, retries=2)
+    assert not list(path.parent.glob("*.part"))
+
+
+def test_token_manager(deezer):
+    """
+    Test if the CSRF token is cached, shared between threads and
+    refreshed after it was rejected.
+    """
+    deezer.add_album(1701, list(range(2701, 2711)))
+    session = deethon.Session('arltoken')
+    tracks = [deethon.Track(i) for i in range(2701, 2711)]
+
+    with ThreadPoolExecutor(10) as executor:
+        list(executor.map(lambda track: track.add_more_tags(session), tracks))
+    assert deezer.requests.count(deethon.consts.METHOD_GET_USER) == 1
+
+    deezer.token_version += 1
+    tracks[0].add_more_tags(session)
+    assert session.token_manager.refresh_count == 2
+    assert deezer.requests.count(deethon.consts.METHOD_PAGE_TRACK) == 12
+
+
+def test_token_background_refresh():
+    """Test if concurrent callers near expiry start a single refresh."""
+    fetched = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(None)
+        fetched.wait(1)
+        return f"token{len(calls)}"
+
+    token_manager = deethon.session.TokenManager(fetch, lifetime=10, margin=10)
+    fetched.set()
+    assert token_manager.get() == "token1"
+    fetched.clear()
+    with ThreadPoolExecutor(10) as executor:
+        tokens = list(executor.map(lambda _: token_manager.get(), range(50)))
+    assert set(tokens) == {"token1"}
+    fetched.set()
+    token_manager.refresh("token1")
+    assert len(calls) == 2 and token_manager.get() == "token2"
+
+
+def test_gw_errors(deezer):
+    """Test if errors of the unofficial API raise a DeezerGatewayError."""
+    deezer.add_album(1702, [2712])
+    session = deethon.Session('arltoken')
+    method = deethon.consts.METHOD_PAGE_TRACK
+    deezer.recording["gw"][f'{method} {{"sng_id": 2712}}'] = {
+        "error": {"DATA_ERROR": "No data"}, "results": {}}
+
+    with pytest.raises(deethon.errors.DeezerGatewayError) as exc_info:
+        session.get_api(method, {"sng_id": 2712})
+    assert exc_info.value.method == method
+    assert exc_info.value.error == "DATA_ERROR"
+    assert isinstance(exc_info.value, deethon.errors.DeezerApiError)
@@ -4,23 +4,25 @@
 import deethon
 
 
-def test_track():
+def test_track(deezer):
     """
     Test if the [Track][deethon.types.Track] class raises a
     [DeezerApiError][deethon.errors.DeezerApiError] when an invalid
     track ID is passed.
     """
+    deezer.add_album(1051, [95813354])
     assert deethon.Track(95813354).id == 95813354
     with pytest.raises(deethon.errors.DeezerApiError):
         deethon.Track(1234567890)
 
 
-def test_album():
+def test_album(deezer):
     """
     Test if the [Album][deethon.types.Album] class raises a
     [DeezerApiError][deethon.errors.DeezerApiError] when an invalid
     album ID is passed.
     """
+    deezer.add_album(103248, [1052])
     album = deethon.Album(103248)
     assert album.id == 103248
 
@@ -36,3 +38,48 @@ def test_album():
     # Test errors
     with pytest.raises(deethon.errors.DeezerApiError):
         deethon.Album(1234567890)
+
+
+def test_cached_instances(deezer):
+    """Test if cached instances are returned without a new request."""
+    deezer.add_album(1201, [2201])
+    track = deethon.Track(2201)
+    for _ in range(3):
+        assert track.album is deethon.Album(1201)
+    assert deezer.requests == ["/track/2201", "/album/1201"]
+    assert deethon.Track(2201) is track
+
+
+def test_iter_tracks(deezer):
+    """Test if all pages of a large playlist are iterated lazily."""
+    deezer.page_size = 10
+    deezer.add_album(1202, list(range(2300, 2330)))
+    deezer.add_playlist(3201, list(range(2300, 2330)))
+    playlist = deethon.Playlist(3201)
+    assert len(playlist.track_ids) == 10
+    tracks = playlist.iter_tracks(prefetch=2)
+    assert next(tracks).id == 2300
+    assert "/playlist/3201/tracks" not in deezer.requests
+    assert [track.id for track in tracks] == list(range(2301, 2330))
+    assert deezer.requests.count("/playlist/3201/tracks") == 1
+    assert [track.id for track in deethon.Album(1202).tracks] == \
+        list(range(2300, 2330))
+
+
+def test_compact_instances(deezer):
+    """Test if the instances use slots and share repeated values."""
+    deezer.add_album(1203, [2331, 2332])
+    first, second = deethon.Track(2331), deethon.Track(2332)
+    assert not hasattr(first, "__dict__")
+    assert first.md5_origin is None
+    assert first.link == "https://www.deezer.com/track/2331"
+    assert first.replaygain_track_gain == "-10.40 dB"
+    assert first.artist is second.artist
+    assert first.release_date is second.release_date
+    with pytest.raises(AttributeError):
+        first.unknown = 1
+
+    album = first.album
+    assert list(album.track_ids) == [2331, 2332]
+    assert album.basic_tracks_data == [{"id": 2331}, {"id": 2332}]
+    assert album.link == "https://www.deezer.com/album/1203"
@@ -0,0 +1,132 @@
+"""This module contains tests for the [utils][deethon.utils] module."""
+import io
+import os
+import random
+import subprocess
+import sys
+from binascii import a2b_hex
+
+from Crypto.Cipher import Blowfish
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3, TIT2
+
+import deethon
+from deethon import utils
+from deethon.fakeserver import encrypt, make_flac, make_mp3
+
+
+def reference_decrypt(data: bytes, track_id: int) -> bytes:
+    """Decrypt a track segment by segment like Deezer's own clients do."""
+    key = utils.get_blowfish_key(track_id)
+    out = bytearray()
+    for seg, i in enumerate(range(0, len(data), 2048)):
+        chunk = data[i:i + 2048]
+        if seg % 3 == 0 and len(chunk) == 2048:
+            chunk = Blowfish.new(key, Blowfish.MODE_CBC,
+                                 a2b_hex("0001020304050607")).decrypt(chunk)
+        out += chunk
+    return bytes(out)
+
+
+def chunked(data: bytes, sizes):
+    i = 0
+    while i < len(data):
+        size = next(sizes)
+        yield data[i:i + size]
+        i += size
+
+
+def test_decrypt_file():
+    """Test if chunks of any size are decrypted like 2048 bytes chunks."""
+    rng = random.Random(0)
+    for size in (0, 100, 2048, 6144, 6144 * 10 + 2048, 123457):
+        plain = os.urandom(size)
+        data = encrypt(plain, 3135556)
+        assert reference_decrypt(data, 3135556) == plain
+        for sizes in (iter(lambda: 2048, 0), iter(lambda: 196608, 0),
+                      iter(lambda: rng.randint(1, 10000), 0)):
+            chunks = chunked(data, sizes)
+            assert b"".join(utils.decrypt_file(chunks, 3135556)) == plain
+
+
+def test_decrypter_offset():
+    """Test if a track can be decrypted from a segment boundary."""
+    plain = os.urandom(50000)
+    data = encrypt(plain, 42)
+    for offset in (2048, 4096, 6144, 12288):
+        decrypter = utils.Decrypter(42, offset)
+        result = decrypter.update(data[offset:]) + decrypter.finalize()
+        assert result == plain[offset:]
+
+
+def test_tag_header(deezer):
+    """Test if tags written in front of the audio data are valid."""
+    deezer.add_album(1721, [2721])
+    track = deethon.Track(2721)
+    track.add_more_tags(deethon.Session("arltoken"))
+    flac = make_flac(20000)
+    # Add a VORBIS_COMMENT block behind the STREAMINFO block.
+    comment = b"\x00\x00\x00\x00\x00\x00\x00\x00"
+    flac = flac[:4] + bytes([flac[4] & 0x7f]) + flac[5:42] + \
+        bytes([0x84, 0, 0, len(comment)]) + comment + flac[42:]
+
+    for ext, audio, audio_start in ((".mp3", make_mp3(20000), 0),
+                                    (".flac", make_flac(20000), 42),
+                                    (".flac", flac, 42 + 4 + len(comment))):
+        header = utils.get_tag_header(track, ext)
+        f = io.BytesIO(header + audio)
+        assert utils.read_tag_header_size(f, ext) == len(header)
+        utils.complete_tag_header(f, ext, len(header))
+        f.seek(0)
+        tags = (ID3 if ext == ".mp3" else FLAC)(f)
+        if ext == ".mp3":
+            assert tags["TIT2"].text == ["Track 2721"]
+            assert tags["APIC:Cover"].data == track.album.cover_xl
+        else:
+            assert tags["title"] == ["Track 2721"]
+            assert tags.pictures[0].data == track.album.cover_xl
+            assert tags.info.sample_rate == 44100
+            # The VORBIS_COMMENT block of the audio data became padding.
+            assert len(tags.metadata_blocks) == (5 if audio is flac else 4)
+        assert f.getvalue()[-len(audio) + audio_start:] == audio[audio_start:]
+
+
+def test_tag_header_id3(deezer):
+    """Test if an ID3 tag at the beginning of MP3 audio data is replaced."""
+    deezer.add_album(1722, [2722])
+    track = deethon.Track(2722)
+    track.add_more_tags(deethon.Session("arltoken"))
+    stream_tag = io.BytesIO()
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Stream"))
+    tags.save(stream_tag, v2_version=4)
+    mp3 = make_mp3(20000)
+    audio = stream_tag.getvalue() + mp3
+
+    header = utils.get_tag_header(track, ".mp3")
+    f = io.BytesIO(header + audio)
+    utils.complete_tag_header(f, ".mp3", len(header))
+    data = f.getvalue()
+    assert data.count(b"ID3") == 1
+    assert b"Stream" not in data
+    assert data.endswith(mp3)
+    f.seek(0)
+    assert ID3(f)["TIT2"].text == ["Track 2722"]
+
+    tagger = utils.Tagger(header, ".mp3")
+    tagged = b"".join(tagger.update(chunk)
+                      for chunk in chunked(audio, iter(lambda: 7, None)))
+    assert tagged + tagger.finalize() == data
+
+
+def test_lazy_imports():
+    """Test if the crypto and tagging libraries are imported on first use."""
+    code = ("import sys, deethon\n"
+            "print(' '.join(sys.modules))\n"
+            "print(deethon.__version__)")
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    modules, version = out.stdout.splitlines()
+    modules = {name.split(".")[0] for name in modules.split()}
+    assert not modules & {"Crypto", "mutagen", "asyncio"}
+    assert version == deethon.__version__